@@ -1,12 +1,16 @@
 import logging
-from flask import Flask
 from app.settings import (LOGS_DIR, APP_NAME, APP_VER, AUTHORIZE,
-                         DEBUG, PORT, HOST)
+                         DEBUG, PORT, HOST, WARMUP)
+from app.utils.startup import startup # startup phases are measured from here (after logging is set up)
+from flask import Flask
 from app.routes.common.error_handlers import register_error_handlers
 from app.routes.root import root_blueprint
 from app.routes.logs import logs_blueprint
-from app.routes.translate import translate_blueprint
-from app.middleware import check_authorization
+from app.routes.translate import translate_blueprint, warm_up
+from app.routes.health import health_blueprint
+from app.routes.jobs import jobs_blueprint
+from app.routes.metrics import metrics_blueprint
+from app.middleware import check_authorization, check_admission, release_admission
 
 app = Flask(__name__)
 
@@ -27,8 +31,19 @@ register_error_handlers(app) # Register error handlers
 app.register_blueprint(root_blueprint)
 app.register_blueprint(logs_blueprint)
 app.register_blueprint(translate_blueprint)
+app.register_blueprint(health_blueprint)
+app.register_blueprint(jobs_blueprint)
+app.register_blueprint(metrics_blueprint)
 
 app.before_request(check_authorization) # Register the middleware function globally
+app.before_request(check_admission) # Translation requests wait for a free slot (after authorization)
+app.teardown_request(release_admission)
+
+startup.record('imports')
+if WARMUP:
+    startup.warm_up(warm_up) # the server binds its port while the detector and the model are loaded
+else:
+    startup.finish()
 
 if __name__ == '__main__':
     app.run(debug=DEBUG, port=PORT, host=HOST)
@@ -0,0 +1,242 @@
+"""
+ASGI entry point: serves the same application on an asyncio server, e.g.
+
+    uvicorn app.asgi:app --host 127.0.0.1 --port 5000
+
+/translate parses the request and queues its texts in a worker thread, then awaits the batch futures
+on the event loop, so a request waiting for the model holds no thread. All other endpoints
+(/, /languages, /detect, /logs, ...) run the Flask application in a bounded thread pool. Translation
+requests (which may wait for admission) have a pool of their own, so a burst of them never holds
+the threads of the other endpoints.
+Authorization, admission control, metrics and ResponseMessages errors work as under waitress.
+"""
+print('---> ASGI is starting ... ')
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+import contextvars
+import io
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from app.app import app as flask_app
+from app.routes.common.responses import ResponseMessages
+from app.routes.translate import begin_translate
+from app.middleware import admission_endpoints
+from app.utils.decoding_policy import DeadlineExceededError, RequestCancelledError
+from app.settings import ASGI_THREADS, ADMISSION_MAX_IN_FLIGHT, ADMISSION_MAX_WAITING
+
+import logging
+
+logger = logging.getLogger(__name__) # getting root logger
+if not logging.getLogger().hasHandlers():
+    print("ERROR: Root logger had no handlers. Logging unavailable.")
+
+# Threads of all endpoints except translation ones
+_executor = ThreadPoolExecutor(ASGI_THREADS, thread_name_prefix='asgi')
+
+# Threads of translation requests: admission wait, parsing, caches, detection (not the wait for the model).
+# With admission control at most max_in_flight + max_waiting of them hold a thread, one more thread
+# answers 429 to the next ones at once
+_translate_threads = ADMISSION_MAX_IN_FLIGHT + ADMISSION_MAX_WAITING + 1 if ADMISSION_MAX_IN_FLIGHT > 0 else ASGI_THREADS
+_translate_executor = ThreadPoolExecutor(_translate_threads, thread_name_prefix='asgi-translate')
+
+# Endpoints which await the model on the event loop, the others run in _executor from start to end
+_async_endpoints = {('POST', '/translate')}
+
+_END = object()
+
+
+def _environ(scope, body: bytes, disconnected: threading.Event) -> dict:
+    # WSGI environ of an ASGI http scope
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.input_terminated': True, # the body was read completely, whatever the headers say
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+        'waitress.client_disconnected': disconnected.is_set, # same key as waitress, routes check it the same way
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        key = name if name in ('CONTENT_TYPE', 'CONTENT_LENGTH') else f'HTTP_{name}'
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    environ['CONTENT_LENGTH'] = str(len(body)) # also for chunked requests
+    return environ
+
+
+async def _read_body(receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            raise RequestCancelledError("Client disconnected")
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body', False):
+            return b''.join(chunks)
+
+
+async def _watch_disconnect(receive, disconnected: threading.Event, gone: asyncio.Event):
+    # disconnected is checked by request threads, gone by the event loop
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            disconnected.set()
+            gone.set()
+            return
+
+
+class _Request:
+    """
+    One request handled in pieces on threads of its executor. All pieces run in the same contextvars context,
+    so the Flask request context pushed by the first piece is still active in the later ones.
+    """
+
+    def __init__(self, environ: dict, executor: ThreadPoolExecutor):
+        self.environ = environ
+        self.executor = executor
+        self.context = contextvars.Context()
+        self.flask_context = None
+        self.status = None
+        self.headers = []
+
+    async def run(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self.context.run, function, *args)
+
+    def start_response(self, status, headers, exc_info=None):
+        self.status = int(status.split(' ', 1)[0])
+        self.headers = [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+
+
+async def _send_wsgi_response(send, request: _Request, iterable):
+    # Body of a WSGI response, chunk by chunk (streamed responses and files as well)
+    iterator = iter(iterable)
+    try:
+        chunk = await request.run(next, iterator, _END)
+        await send({'type': 'http.response.start', 'status': request.status, 'headers': request.headers})
+        while chunk is not _END:
+            if chunk:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            chunk = await request.run(next, iterator, _END)
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        if hasattr(iterable, 'close'):
+            await request.run(iterable.close)
+
+
+def _begin(request: _Request):
+    # Request context, before_request hooks (authorization, admission) and the first half of /translate
+    request.flask_context = flask_app.request_context(request.environ)
+    request.flask_context.push()
+    try:
+        response = flask_app.preprocess_request()
+        if response is not None:
+            return response, None
+        return begin_translate()
+    except Exception as e:
+        return ResponseMessages.error_500(str(e)), None
+
+
+def _finish(request: _Request, response):
+    # after_request hooks, WSGI response; teardown (admission release) runs when the response is closed
+    try:
+        response = flask_app.finalize_request(response)
+    except Exception as e:
+        response = flask_app.finalize_request(ResponseMessages.error_500(str(e)), from_error_handler=True)
+    response.call_on_close(lambda: _pop_context(request))
+    return response(request.environ, request.start_response)
+
+
+def _pop_context(request: _Request):
+    if request.flask_context is not None:
+        request.flask_context.pop()
+        request.flask_context = None
+
+
+async def _await_results(pending, gone: asyncio.Event):
+    # Results of the queued texts, no longer than the deadline of the request or until its client has gone
+    futures = [asyncio.wrap_future(future) for future in pending.futures]
+    if not futures:
+        return []
+    gathered = asyncio.gather(*futures)
+    disconnect = asyncio.ensure_future(gone.wait())
+    try:
+        remaining = pending.budget.remaining()
+        done, _ = await asyncio.wait({gathered, disconnect}, timeout=None if remaining is None else max(0.0, remaining),
+                                     return_when=asyncio.FIRST_COMPLETED)
+        if gathered in done:
+            return gathered.result()
+        for future in pending.futures:
+            future.cancel()
+        gathered.cancel()
+        if disconnect in done:
+            raise RequestCancelledError("Client disconnected")
+        raise DeadlineExceededError("Deadline exceeded before the translation was finished")
+    finally:
+        disconnect.cancel()
+
+
+async def _http(scope, receive, send):
+    try:
+        body = await _read_body(receive)
+    except RequestCancelledError:
+        return
+    disconnected, gone = threading.Event(), asyncio.Event()
+    executor = _translate_executor if scope['path'] in admission_endpoints else _executor
+    request = _Request(_environ(scope, body, disconnected), executor)
+    watcher = asyncio.ensure_future(_watch_disconnect(receive, disconnected, gone))
+    try:
+        if (scope['method'], scope['path']) not in _async_endpoints:
+            iterable = await request.run(flask_app, request.environ, request.start_response)
+            await _send_wsgi_response(send, request, iterable)
+            return
+
+        response, pending = await request.run(_begin, request)
+        if pending is not None:
+            try:
+                results = await _await_results(pending, gone)
+                response = await request.run(pending.complete, results)
+            except Exception as e:
+                response = await request.run(pending.fail, e)
+        iterable = await request.run(_finish, request, response)
+        await _send_wsgi_response(send, request, iterable)
+    finally:
+        watcher.cancel()
+        await request.run(_pop_context, request) # if the response was never sent
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            _executor.shutdown(wait=False)
+            _translate_executor.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    """ASGI application"""
+    if scope['type'] == 'http':
+        await _http(scope, receive, send)
+    elif scope['type'] == 'lifespan':
+        await _lifespan(receive, send)
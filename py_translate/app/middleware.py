@@ -1,5 +1,9 @@
-from flask import request, make_response
+import time
+from flask import request, make_response, g
 from app.routes.common.responses import ResponseMessages
+from app.utils.admission import AdmissionController, AdmissionRejected
+from app.utils.metrics import registry as metrics_registry
+from app.settings import ADMISSION_MAX_IN_FLIGHT, ADMISSION_MAX_WAITING, ADMISSION_MAX_WAIT_SECONDS
 #from app.settings import AUTHORIZE
 
 import logging
@@ -8,7 +12,7 @@ if not logging.getLogger().hasHandlers():
     print("ERROR: Root logger had no handlers. Logging unavailable.")
 
 # Define a list of public endpoints
-public_endpoints = ['/']
+public_endpoints = ['/', '/ready']
 
 def check_authorization():
     # Check if the endpoint requires authorization
@@ -31,3 +35,42 @@ def check_authorization():
 
     except Exception as e:
         return ResponseMessages.error_500(f"Middleware error on path {request.path}: {str(e)}")
+
+
+# Endpoints which run the models; all others (/, /languages, /detect, /ready ...) are never queued
+admission_endpoints = ['/translate', '/translate/stream']
+
+admission = None
+if ADMISSION_MAX_IN_FLIGHT > 0:
+    admission = AdmissionController(ADMISSION_MAX_IN_FLIGHT, ADMISSION_MAX_WAITING, ADMISSION_MAX_WAIT_SECONDS)
+    metrics_registry.gauge('admission_requests', 'Translation requests in flight and waiting for admission', ('state',),
+                           callback=lambda: {("in_flight",): admission.in_flight, ("waiting",): admission.waiting})
+
+def check_admission():
+    # Bounds the number of translation requests in flight, the others wait in a bounded queue or get 429/503 early
+    if admission is None or request.path not in admission_endpoints:
+        return None
+    try:
+        deadline_ms = request.headers.get('X-Deadline-Ms')
+        try:
+            timeout = float(deadline_ms) / 1000 if deadline_ms else None
+        except ValueError:
+            timeout = None # the endpoint itself rejects the header
+
+        if not admission.acquire(timeout, request.environ.get('waitress.client_disconnected')):
+            logger.info(f'Request to "{request.path}" cancelled while waiting for admission: client disconnected')
+            return ResponseMessages.error_503("Client disconnected")
+        g.admission_started = time.monotonic()
+
+    except AdmissionRejected as e:
+        if e.status == 429:
+            return ResponseMessages.error_429(str(e), retry_after=e.retry_after)
+        return ResponseMessages.error_503(str(e), retry_after=e.retry_after)
+    except Exception as e:
+        return ResponseMessages.error_500(f"Middleware error on path {request.path}: {str(e)}")
+
+def release_admission(exception=None):
+    # Runs when the request context ends, for a streamed response after the last event
+    started = g.pop('admission_started', None)
+    if started is not None:
+        admission.release(time.monotonic() - started)
@@ -3,6 +3,7 @@ import json
 from flask import make_response, Response, jsonify
 import logging
 from typing import Dict, Any #, Optional
+from app.utils.metrics import ERRORS
 
 logger = logging.getLogger(__name__)
 
@@ -13,7 +14,10 @@ class ResponseMessages:
     ERROR_401 = {"code": 401, "title": "Unauthorized"}
     ERROR_403 = {"code": 403, "title": "Forbidden"}
     ERROR_404 = {"code": 404, "title": "Not found"}
+    ERROR_429 = {"code": 429, "title": "Too many requests"}
     ERROR_500 = {"code": 500, "title": "Internal server error"}
+    ERROR_503 = {"code": 503, "title": "Service unavailable"}
+    ERROR_504 = {"code": 504, "title": "Gateway timeout"}
 
     _debug = True
     _default_format = 'json'  # may be 'text' or 'json'
@@ -38,7 +42,10 @@ class ResponseMessages:
             401: "UNAUTHENTICATED",
             403: "PERMISSION_DENIED",
             404: "NOT_FOUND",
+            429: "RESOURCE_EXHAUSTED",
             500: "INTERNAL",
+            503: "UNAVAILABLE",
+            504: "DEADLINE_EXCEEDED",
         }.get(code, "UNKNOWN")
 
     @staticmethod
@@ -79,6 +86,8 @@ class ResponseMessages:
     ) -> Response:
         fmt = response_format or ResponseMessages._default_format
 
+        ERRORS.inc(str(error_data["code"]))
+
         # Logging
         log_msg = f"Error {error_data['code']}: {error_data['title']} - {details}"
         if error_data["code"] == 404:
@@ -121,11 +130,34 @@ class ResponseMessages:
         return ResponseMessages._create_error_response(
             ResponseMessages.ERROR_404, details, debug_details, response_format)
 
+    @staticmethod
+    def error_429(details: str = '', debug_details: str = '', response_format: str = None,
+                  retry_after: int = None) -> Response:
+        response = ResponseMessages._create_error_response(
+            ResponseMessages.ERROR_429, details, debug_details, response_format)
+        if retry_after is not None:
+            response.headers['Retry-After'] = str(retry_after) # seconds until the client may try again
+        return response
+
     @staticmethod
     def error_500(details: str = '', debug_details: str = '', response_format: str = None) -> Response:
         return ResponseMessages._create_error_response(
             ResponseMessages.ERROR_500, details, debug_details, response_format)
 
+    @staticmethod
+    def error_503(details: str = '', debug_details: str = '', response_format: str = None,
+                  retry_after: int = None) -> Response:
+        response = ResponseMessages._create_error_response(
+            ResponseMessages.ERROR_503, details, debug_details, response_format)
+        if retry_after is not None:
+            response.headers['Retry-After'] = str(retry_after) # seconds until the client may try again
+        return response
+
+    @staticmethod
+    def error_504(details: str = '', debug_details: str = '', response_format: str = None) -> Response:
+        return ResponseMessages._create_error_response(
+            ResponseMessages.ERROR_504, details, debug_details, response_format)
+
     # Success methods
     @staticmethod
     def success(message: str = '', data: dict = None, status_code: int = 200) -> Response:
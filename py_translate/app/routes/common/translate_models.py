@@ -1,4 +1,10 @@
-from app.settings import SELECTED_MODEL, M2M100_418, M2M100_1200
+from app.settings import (SELECTED_MODEL, M2M100_418, M2M100_1200, MODEL_ALIASES, MODELS_CACHE_DIR,
+                          MODELS_MAX_RESIDENT, MODELS_MEMORY_BUDGET_BYTES,
+                          INFERENCE_WORKERS, INFERENCE_THREADS_PER_WORKER, ENGINE_MODE, ENGINE_COMPILE,
+                          WEIGHTS_MMAP)
+from app.utils.model_registry import ModelRegistry
+from app.utils.inference_pool import InferencePool
+import multiprocessing
 
 # Language codes matching langid → M2M100
 LANGID_TO_M2M100 = {
@@ -84,3 +90,21 @@ SUPPORTED_LANGUAGES = {
     M2M100_418: SUPPORTED_LANGUAGES_M2M100,
     M2M100_1200: SUPPORTED_LANGUAGES_M2M100,  # equal with "base"
 }
+
+# Models are loaded on first use, least recently used ones are unloaded
+model_registry = ModelRegistry(MODELS_CACHE_DIR, SELECTED_MODEL,
+                               max_resident=MODELS_MAX_RESIDENT,
+                               memory_budget_bytes=MODELS_MEMORY_BUDGET_BYTES,
+                               engine_mode=ENGINE_MODE,
+                               engine_compile=ENGINE_COMPILE,
+                               weights_mmap=WEIGHTS_MMAP)
+for _model_name, _languages in SUPPORTED_LANGUAGES.items():
+    model_registry.register(_model_name, languages=_languages,
+                            aliases=[alias for alias, name in MODEL_ALIASES.items() if name == _model_name])
+
+# Worker processes with their own copies of the models (None - models run inside the web process).
+# Workers import this module too, but only the top process starts the pool.
+inference_pool = None
+if INFERENCE_WORKERS > 0 and multiprocessing.parent_process() is None:
+    inference_pool = InferencePool(INFERENCE_WORKERS, INFERENCE_THREADS_PER_WORKER)
+    inference_pool.start()
@@ -0,0 +1,61 @@
+import os
+from flask import Blueprint, jsonify
+from app.routes.common.responses import ResponseMessages
+from app.routes.common.translate_models import model_registry, inference_pool
+from app.middleware import admission
+from app.utils.inference import padding_stats, bucket_boundaries, encoded_cache, decoding_policy
+from app.utils.startup import startup
+from app.utils.memory import process_memory
+from app.utils.engine import mmap_root
+from app.settings import MODELS_CACHE_DIR
+
+health_blueprint = Blueprint('health_blueprint', __name__)
+
+# ------------------------------------------------------/ready----------------------------------------------------------
+@health_blueprint.route('/ready', methods=['GET'])
+def ready():
+    """Reports load state of models (and workers) and startup phases. 503 until the default model is loaded and warmed up (for readiness probes)"""
+    try:
+        status = model_registry.status()
+        if inference_pool is not None: # models are loaded by worker processes
+            status["inference_pool"] = inference_pool.status()
+            is_ready = inference_pool.is_ready()
+        else:
+            is_ready = model_registry.is_loaded()
+        status["startup"] = startup.status()
+        is_ready = is_ready and not startup.is_warming_up()
+        status["status"] = "ready" if is_ready else "not_ready"
+        return jsonify({"data": status}), 200 if is_ready else 503
+    except Exception as e:
+        return ResponseMessages.error_500(f"{e}")
+
+# ------------------------------------------------------/stats/inference------------------------------------------------
+@health_blueprint.route('/stats/inference', methods=['GET'])
+def inference_stats():
+    """Padding efficiency of batched generation, length buckets, token ids cache, decoding policy and admission"""
+    try:
+        data = {"padding": padding_stats.snapshot(), "decoding": decoding_policy.status()}
+        if admission is not None:
+            data["admission"] = admission.status()
+        if inference_pool is None: # with worker processes the boundaries and the cache live in every worker
+            data["length_buckets"] = bucket_boundaries()
+            data["encode_cache"] = encoded_cache.stats()
+        return jsonify({"data": data})
+    except Exception as e:
+        return ResponseMessages.error_500(f"{e}")
+
+# ------------------------------------------------------/stats/memory---------------------------------------------------
+@health_blueprint.route('/stats/memory', methods=['GET'])
+def memory_stats():
+    """Resident memory of the web process and of the inference workers: unique vs shared, mapped model weights"""
+    try:
+        mapped_dir = mmap_root(MODELS_CACHE_DIR)
+        processes = [{"process": "web", "pid": os.getpid(), **(process_memory(mapped_dir=mapped_dir) or {})}]
+        if inference_pool is not None:
+            for worker in inference_pool.status()["workers"]:
+                if worker["pid"] is not None:
+                    processes.append({"process": f"worker-{worker['index']}", "pid": worker["pid"],
+                                      **(process_memory(worker["pid"], mapped_dir) or {})})
+        return jsonify({"data": {"weights_mmap": model_registry.weights_mmap, "processes": processes}})
+    except Exception as e:
+        return ResponseMessages.error_500(f"{e}")
@@ -0,0 +1,141 @@
+import inspect
+import json
+import os
+import time
+from flask import Blueprint, request, jsonify, Response, stream_with_context
+from werkzeug.utils import secure_filename
+from app.settings import UPLOAD_DIR, MAX_TEXT_LENGTH, MAX_JOB_TEXTS, BATCH_MAX_SIZE
+from app.routes.common.responses import ResponseMessages
+from app.routes.common.translate_models import model_registry
+from app.routes.translate import detect_languages, translate_texts, to_google_lang_code
+from app.utils.batcher import QueueFullError, BULK
+from app.utils.job_manager import JobManager, JobNotFoundError
+from app.utils.model_registry import ModelNotFoundError
+
+import logging
+
+logger = logging.getLogger(__name__) # getting root logger
+if not logging.getLogger().hasHandlers():
+    print("ERROR: Root logger had no handlers. Logging unavailable.")
+
+jobs_blueprint = Blueprint('jobs_blueprint', __name__)
+
+
+def _translate_job_chunk(texts, target_lang, model_name):
+    """Translates a chunk of job texts in the bulk lane, so interactive requests always go first"""
+    supported_languages = model_registry.languages(model_name)
+    detected_langs = [lang for lang, _ in detect_languages(texts)]
+    results = [{"error": "Unsupported language pair", "detectedSourceLanguage": to_google_lang_code(detected_lang)}
+               for detected_lang in detected_langs]
+    supported = [index for index, detected_lang in enumerate(detected_langs)
+                 if detected_lang in supported_languages and target_lang in supported_languages]
+
+    while True:
+        try:
+            translated_texts = translate_texts([texts[index] for index in supported],
+                                               [detected_langs[index] for index in supported],
+                                               target_lang, model_name, lane=BULK)
+            break
+        except QueueFullError:
+            time.sleep(1) # interactive traffic has filled the queue, the job waits
+
+    for index, translated_text in zip(supported, translated_texts):
+        results[index] = {"translatedText": translated_text,
+                          "detectedSourceLanguage": to_google_lang_code(detected_langs[index])}
+    return results
+
+
+_jobs = JobManager(os.path.join(UPLOAD_DIR, 'jobs'), _translate_job_chunk, chunk_size=BATCH_MAX_SIZE * 4)
+
+
+def _read_ndjson_upload():
+    # Texts of an NDJSON upload (multipart "file" or raw body): every line is a JSON string or {"q": "..."}
+    upload = request.files.get('file')
+    filename = secure_filename(upload.filename or '') if upload else ''
+    upload_path = os.path.join(UPLOAD_DIR, f"{int(time.time() * 1000)}_{filename or 'upload.ndjson'}")
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    if upload:
+        upload.save(upload_path)
+    else:
+        with open(upload_path, 'wb') as file:
+            file.write(request.get_data())
+
+    texts, number = [], 0
+    try:
+        with open(upload_path, 'r', encoding='utf-8') as file:
+            for number, line in enumerate(file, start=1):
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                texts.append(item.get("q") if isinstance(item, dict) else item)
+    except ValueError as e:
+        raise ValueError(f"Invalid NDJSON at line {number}: {e}")
+    finally:
+        os.remove(upload_path)
+    return texts
+
+# ------------------------------------------------------/jobs-----------------------------------------------------------
+@jobs_blueprint.route("/jobs", methods=["POST"])
+def create_job():
+    """
+    Creates a bulk translation job. Body is JSON {"q": [...], "target": ..., "model": ...}
+    or NDJSON (multipart "file" or application/x-ndjson body) with target/model as form or query parameters.
+    """
+    func_name = inspect.currentframe().f_code.co_name
+
+    try:
+        if request.files or request.mimetype == 'application/x-ndjson':
+            params = request.form if request.form else request.args
+            texts = _read_ndjson_upload()
+        else:
+            params = request.get_json(force=True) or {}
+            texts = params.get("q")
+    except Exception as e:
+        error_type = type(e).__name__
+        error_string = f'Error in {func_name}: {error_type}: {e}'
+        return ResponseMessages.error_400(str(error_string))
+
+    try:
+        target_lang = params.get("target")
+        if not target_lang:
+            return ResponseMessages.error_400("Error: target is not defined in the request.")
+        try:
+            model_name = model_registry.resolve(params.get("model"))
+        except ModelNotFoundError as e:
+            return ResponseMessages.error_400(str(e))
+        if target_lang not in model_registry.languages(model_name):
+            return ResponseMessages.error_400(f"Unsupported target language: {target_lang}")
+
+        if not isinstance(texts, list) or not texts or not all(isinstance(text, str) for text in texts):
+            return ResponseMessages.error_400("Input texts (q) must be a non-empty list of strings.")
+        if len(texts) > MAX_JOB_TEXTS:
+            return ResponseMessages.error_400(f"Too many texts for a job: {len(texts)}. Maximum is {MAX_JOB_TEXTS}.")
+        for index, text in enumerate(texts):
+            if len(text) > MAX_TEXT_LENGTH:
+                return ResponseMessages.error_400(f"Input text #{index} for translation is more then {MAX_TEXT_LENGTH} symbols. Current length is {len(text)} symbols.")
+
+        job = _jobs.create(texts, target_lang, model_name)
+        return jsonify({"data": job.status()}), 202
+
+    except Exception as e:
+        return ResponseMessages.error_500(str(e))
+
+@jobs_blueprint.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    try:
+        return jsonify({"data": _jobs.get(job_id).status()})
+    except JobNotFoundError as e:
+        return ResponseMessages.error_404(str(e))
+    except Exception as e:
+        return ResponseMessages.error_500(str(e))
+
+@jobs_blueprint.route("/jobs/<job_id>/results", methods=["GET"])
+def job_results(job_id):
+    """Streams results as NDJSON lines {"index", "translatedText", "detectedSourceLanguage"} while the job runs"""
+    try:
+        job = _jobs.get(job_id)
+        return Response(stream_with_context(_jobs.stream_results(job)), mimetype='application/x-ndjson')
+    except JobNotFoundError as e:
+        return ResponseMessages.error_404(str(e))
+    except Exception as e:
+        return ResponseMessages.error_500(str(e))
@@ -1,7 +1,9 @@
 import os
-from flask import Flask, request, Blueprint, make_response, send_from_directory
+from collections import deque
+from flask import request, Blueprint, Response, send_file, stream_with_context
 from app.settings import LOGS_DIR, APP_NAME
 from app.routes.common.responses import ResponseMessages
+from app.utils.log_index import LEVELS, get_index, parse_time_of_day
 
 import logging
 
@@ -37,11 +39,33 @@ def get_logs():
     if not os.path.isfile(log_filepath):
         return ResponseMessages.error_400(f"Log file {log_filename} not found.")
 
+    # Optional filters: level (this level and above), logger (name or package), since/until (HH:MM[:SS]),
+    # q (substring), tail (last N matching records)
+    level = (request.args.get('level') or '').upper()
+    logger_prefix = request.args.get('logger') or ''
+    substring = request.args.get('q') or ''
     try:
-        with open(log_filepath, 'r') as file:
-            log_content = file.read()
-        response = make_response(log_content, 200)
-        response.mimetype = "text/plain"
-        return response
+        if level and level not in LEVELS:
+            raise ValueError(f"Invalid level {level}, expected one of {', '.join(LEVELS)}")
+        since = parse_time_of_day(request.args.get('since'))
+        until = parse_time_of_day(request.args.get('until'))
+        tail = int(request.args.get('tail') or 0)
+        if tail < 0:
+            raise ValueError("tail must be a positive integer")
+    except ValueError as e:
+        return ResponseMessages.error_400(f"Invalid query parameters: {e}")
+
+    try:
+        if not (level or logger_prefix or substring or since is not None or until is not None or tail):
+            # Whole file: streamed from disk, HTTP Range and conditional requests are supported
+            return send_file(log_filepath, mimetype="text/plain", conditional=True, max_age=0)
+
+        index = get_index(log_filepath)
+        records = index.select(min_level=LEVELS.get(level, 0), logger_prefix=logger_prefix,
+                               since=since, until=until, tail=tail if not substring else 0)
+        texts = index.read(records, substring.encode('utf-8'))
+        if tail and substring: # substring needs the text, the last N matches are kept while reading
+            texts = iter(deque(texts, maxlen=tail))
+        return Response(stream_with_context(texts), mimetype="text/plain")
     except Exception as e:
-        return ResponseMessages.error_500(f"Error reading file: {str(e)}")
\ No newline at end of file
+        return ResponseMessages.error_500(f"Error reading file: {str(e)}")
@@ -0,0 +1,37 @@
+import time
+from flask import Blueprint, Response, g, request
+from app.routes.common.responses import ResponseMessages
+from app.routes.common.translate_models import inference_pool
+from app.utils.metrics import registry, REQUESTS, REQUEST_SECONDS
+
+metrics_blueprint = Blueprint('metrics_blueprint', __name__)
+
+if inference_pool is not None:
+    registry.gauge('inference_worker_in_flight', 'Batches sent to an inference worker and not finished yet', ('worker',),
+                   callback=lambda: {(str(worker["index"]),): worker["in_flight"]
+                                     for worker in inference_pool.status()["workers"]})
+
+
+@metrics_blueprint.before_app_request
+def _start_timer():
+    g.metrics_started = time.perf_counter()
+
+
+@metrics_blueprint.after_app_request
+def _count_request(response):
+    # Endpoint is the URL rule (not the path), so job ids etc. do not create new series
+    endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    REQUESTS.inc(endpoint, str(response.status_code))
+    started = g.get('metrics_started')
+    if started is not None:
+        REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint)
+    return response
+
+# ------------------------------------------------------/metrics--------------------------------------------------------
+@metrics_blueprint.route('/metrics', methods=['GET'])
+def metrics():
+    """Metrics in Prometheus text exposition format"""
+    try:
+        return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+    except Exception as e:
+        return ResponseMessages.error_500(f"{e}")
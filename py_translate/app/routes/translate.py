@@ -1,12 +1,34 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 from app.routes.common.responses import ResponseMessages
-from app.routes.common.translate_models import SUPPORTED_LANGUAGES, LANGID_TO_M2M100
+from app.routes.common.translate_models import LANGID_TO_M2M100, SUPPORTED_LANGUAGES, model_registry, inference_pool
+from app.utils.model_registry import ModelNotFoundError
 from app.utils.request_check import request_body_none_check
-from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
-from app.settings import MAX_TEXT_LENGTH, MODELS_CACHE_DIR, SELECTED_MODEL
+from app.utils.batcher import MicroBatcher, QueueFullError, INTERACTIVE
+from app.utils.result_cache import ResultCache, translation_key
+from app.utils.translation_memory import TranslationMemory
+from app.utils.segmenter import split_text, join_text, target_separators
+from app.utils.inference import translate_batch, stream_translate, decoding_policy, warm_up_model
+from app.utils.decoding_policy import Budget, DeadlineExceededError, RequestCancelledError
+from app.utils.language_detector import LanguageDetector
+from app.utils.glossary import GlossaryStore, GlossaryError, Protector
+from app.utils.markup import parse_html
+from app.utils.metrics import registry as metrics_registry, stage
+from app.utils.startup import startup
+from app.utils.memory import log_process_memory
+from app.utils.engine import mmap_root
+from app.settings import (MAX_TEXT_LENGTH, MAX_TEXT_SEGMENTS, MAX_TARGET_LANGUAGES, MAX_SEGMENT_LENGTH,
+                          SELECTED_MODEL, DETECT_MAX_CHARS, DEBUG,
+                          BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS, BATCH_QUEUE_SIZE,
+                          CACHE_MAX_ENTRIES, CACHE_MAX_BYTES, CACHE_TTL_SECONDS,
+                          TM_ENABLED, TM_DB_PATH, TM_MAX_ENTRIES, MODELS_CACHE_DIR,
+                          GLOSSARIES_DIR, GLOSSARY_CACHE_ENTRIES, GLOSSARY_MAX_TERMS,
+                          INFERENCE_TIMEOUT_SECONDS, INFERENCE_TIMEOUT_MARGIN_SECONDS)
+from collections import defaultdict
+from concurrent.futures import TimeoutError as FutureTimeoutError
 import inspect
-import langid
-import torch
+import json
+import threading
+import time
 
 import logging
 
@@ -16,28 +38,576 @@ if not logging.getLogger().hasHandlers():
 
 translate_blueprint = Blueprint('translate_blueprint', __name__)
 
-_device = "cuda" if torch.cuda.is_available() else "cpu"
-logger.info(f"Device type: {_device.upper()}")
-_tokenizer = AutoTokenizer.from_pretrained(SELECTED_MODEL, cache_dir=MODELS_CACHE_DIR)
-_model = AutoModelForSeq2SeqLM.from_pretrained(SELECTED_MODEL, cache_dir=MODELS_CACHE_DIR).to(_device)
+
+def _translate_batch(key, items):
+    """
+    Translates a group of (text, source language, Budget or None) items with a single generate call.
+    key is (model name, target language) or (model name, tuple of target languages) for fan-out.
+    Beam width and time limit come from the decoding policy (queue pressure and deadlines of the items),
+    texts whose deadline has already passed or whose client has gone are not translated.
+    The batch goes to the inference worker processes if they are enabled, otherwise it runs in the batcher thread.
+    """
+    results = [None] * len(items)
+    live = []
+    for index, (_, _, budget) in enumerate(items):
+        if budget is not None and budget.expired():
+            results[index] = DeadlineExceededError("Deadline exceeded while waiting in the translation queue")
+        elif budget is not None and budget.cancelled():
+            results[index] = RequestCancelledError("Client disconnected")
+        else:
+            live.append(index)
+    if not live:
+        return results
+
+    pairs = [items[index][:2] for index in live]
+    budgets = [items[index][2] for index in live]
+    longest = max(len(text) for text, _ in pairs)
+    plan = decoding_policy.plan([budget.remaining() if budget is not None else None for budget in budgets],
+                                _batcher.pressure(), longest)
+
+    started = time.monotonic()
+    model_name, target_lang = key
+    if inference_pool is not None:
+        timeout = INFERENCE_TIMEOUT_SECONDS if plan.max_time is None else min(
+            INFERENCE_TIMEOUT_SECONDS, plan.max_time + INFERENCE_TIMEOUT_MARGIN_SECONDS) # a hung worker is restarted
+        translations = inference_pool.run(key, pairs, plan, timeout)
+    else:
+        loaded = model_registry.get(model_name) # loads the model on first use
+        translations = translate_batch(loaded, target_lang, pairs, plan=plan)
+    decoding_policy.observe(time.monotonic() - started, longest, plan.num_beams)
+
+    for index, translation in zip(live, translations):
+        results[index] = translation
+    distinct = {id(budget): budget for budget in budgets if budget is not None} # segments of a request share one budget
+    for budget in distinct.values():
+        budget.plans.append(plan.to_dict())
+    return results
+
+
+# Requests with the same model and target language are merged into one padded generate call
+_batcher = MicroBatcher(_translate_batch,
+                        max_batch_size=BATCH_MAX_SIZE,
+                        max_wait_ms=BATCH_MAX_WAIT_MS,
+                        max_queue_size=BATCH_QUEUE_SIZE,
+                        max_concurrent_batches=inference_pool.num_workers if inference_pool is not None else 1,
+                        name='translate-batcher')
+metrics_registry.gauge('translate_queue_depth', 'Texts waiting in the translation queue',
+                       callback=lambda: {(): _batcher.queue_size})
+
+
+# Results of translation and language detection for repeated texts
+_cache = ResultCache(max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES, ttl_seconds=CACHE_TTL_SECONDS,
+                     name='results')
+
+# Translations shared by all processes of the host and kept between restarts
+_memory = TranslationMemory(TM_DB_PATH, max_entries=TM_MAX_ENTRIES) if TM_ENABLED else None
+
+# Compiled glossaries (preloaded by id and inline ones of requests)
+_glossaries = GlossaryStore(GLOSSARIES_DIR, max_entries=GLOSSARY_CACHE_ENTRIES, max_terms=GLOSSARY_MAX_TERMS)
 
 
 def to_google_lang_code(code):
     return "no" if code in ["nb", "nn"] else code
 
+_detector = None
+_detector_lock = threading.Lock()
+
+
+def get_detector() -> LanguageDetector:
+    """Language detector, built on first use or by the warm-up (decoding the langid model takes seconds)"""
+    global _detector
+    if _detector is None:
+        with _detector_lock:
+            if _detector is None: # detection is limited to languages which at least one model translates
+                _detector = LanguageDetector(set().union(*SUPPORTED_LANGUAGES.values()), LANGID_TO_M2M100,
+                                             max_chars=DETECT_MAX_CHARS)
+    return _detector
+
+
+def warm_up():
+    """
+    Startup warm-up (runs in the background, see app.utils.startup): language detector, default model
+    and dummy generations. Worker processes load and warm up their models themselves, here we wait for them.
+    """
+    with startup.phase('detector'):
+        get_detector()
+    if inference_pool is not None:
+        with startup.phase('workers'):
+            if not inference_pool.wait_ready():
+                raise RuntimeError("No inference worker is ready")
+        return
+    with startup.phase('model'):
+        loaded = model_registry.get()
+    with startup.phase('warm_up'):
+        warm_up_model(loaded)
+    log_process_memory("Memory after warm-up", mmap_root(MODELS_CACHE_DIR))
+
+
+def detect_languages(texts):
+    """Determines languages of texts, returns (code M2M100, confidence) for every text"""
+    keys = [translation_key(SELECTED_MODEL, '', '', text) for text in texts] # detection shares the key space with translations
+    results = [_cache.get(key) for key in keys]
+    missed = [index for index, result in enumerate(results) if result is None]
+    if missed:
+        with stage('detect'):
+            detections = get_detector().detect_many([texts[index] for index in missed])
+        for index, result in zip(missed, detections):
+            results[index] = result
+            _cache.put(keys[index], result)
+    return results
+
 def detect_language(text):
     """Determines the language of the text and returns the code M2M100"""
-    lang, conf = langid.classify(text)
-    conf = 1 if abs(conf)<=100 else 0.85
-    return LANGID_TO_M2M100.get(lang, lang), conf  # Convert the code if necessary.
+    return detect_languages([text])[0]
+
+
+def _lookup(model_name, source_lang, target_lang, segment):
+    # Translation from the result cache or the translation memory, None if the model has to translate it
+    key = translation_key(model_name, source_lang, target_lang, segment)
+    translation = _cache.get(key)
+    if translation is None and _memory is not None:
+        translation = _memory.get(model_name, source_lang, target_lang, segment)
+        if translation is not None:
+            _cache.put(key, translation)
+    return translation
+
+
+def _store(model_name, source_lang, target_lang, segment, translation):
+    _cache.put(translation_key(model_name, source_lang, target_lang, segment), translation)
+    if _memory is not None:
+        _memory.put_async(model_name, source_lang, target_lang, segment, translation)
+
+
+_WAIT_POLL_SECONDS = 0.1 # how often a waiting request checks its deadline and whether the client is still there
+
+
+def _wait(futures, budget):
+    # Results of futures, no longer than until the deadline of the request or until its client disconnects;
+    # translations of the request that have not started yet are then cancelled
+    if budget is None:
+        return [future.result() for future in futures]
+    results = []
+    try:
+        for future in futures:
+            while True:
+                remaining = budget.remaining()
+                if remaining is not None and remaining <= 0:
+                    raise DeadlineExceededError("Deadline exceeded before the translation was finished")
+                if budget.cancelled():
+                    raise RequestCancelledError("Client disconnected")
+                try:
+                    results.append(future.result(timeout=_WAIT_POLL_SECONDS if remaining is None
+                                                 else min(_WAIT_POLL_SECONDS, remaining)))
+                    break
+                except FutureTimeoutError:
+                    continue
+    except (DeadlineExceededError, RequestCancelledError):
+        for future in futures:
+            future.cancel()
+        raise
+    return results
+
+
+def _submit_segments(segments, source_langs, target_lang, model_name, lane=INTERACTIVE, budget=None):
+    """
+    Looks segments up in the result cache and the translation memory and queues the rest for the model.
+    Returns (futures, finish): finish(results of futures) stores new translations and returns the translations
+    in the order of segments; for a tuple of target languages (fan-out) every translation is a list in their order.
+    Raises QueueFullError if the model queue is full.
+    """
+    target_langs = target_lang if isinstance(target_lang, tuple) else (target_lang,)
+    translations = [[_lookup(model_name, source_lang, lang, segment) for lang in target_langs]
+                    for segment, source_lang in zip(segments, source_langs)]
+
+    # Segments missing the same languages share a batcher key and land in the same padded generate call(s);
+    # a single missing language joins usual batches, several are decoded from one encoder pass
+    groups = defaultdict(list)
+    for index, row in enumerate(translations):
+        missing = tuple(lang for lang, translation in zip(target_langs, row) if translation is None)
+        if missing:
+            groups[missing].append(index)
+    futures, slots = [], []
+    for missing, indexes in groups.items():
+        futures.extend(_batcher.submit_many((model_name, missing if len(missing) > 1 else missing[0]),
+                                            [(segments[index], source_langs[index], budget) for index in indexes],
+                                            lane))
+        slots.extend((index, missing) for index in indexes)
+
+    def finish(results):
+        for (index, missing), result in zip(slots, results):
+            for lang, translation in zip(missing, result if len(missing) > 1 else [result]):
+                translations[index][target_langs.index(lang)] = translation
+                _store(model_name, source_langs[index], lang, segments[index], translation)
+        return translations if isinstance(target_lang, tuple) else [row[0] for row in translations]
+
+    return futures, finish
+
+
+def submit_texts(texts, detected_langs, target_lang, model_name, lane=INTERACTIVE, budget=None, protector=None):
+    """
+    Queues translation of texts (with already detected languages), see translate_texts.
+    Returns (futures, finish): finish(results of futures) returns translations in the order of texts.
+    Waiting for the futures is up to the caller (a request thread or an asyncio event loop).
+    With a Protector, glossary terms and protected patterns are masked with sentinels before segmentation
+    (the model and the caches only see the masked texts) and restored in every translation.
+    """
+    masks = None
+    if protector is not None:
+        masks = [protector.mask(item) for item in texts]
+        texts = [masked for masked, _ in masks]
+    plans = [split_text(item, detected_lang, MAX_SEGMENT_LENGTH)
+             for item, detected_lang in zip(texts, detected_langs)]
+    segments, source_langs = [], []
+    for (item_segments, _), detected_lang in zip(plans, detected_langs):
+        segments.extend(item_segments)
+        source_langs.extend([detected_lang] * len(item_segments))
+
+    futures, finish_segments = _submit_segments(segments, source_langs, target_lang, model_name, lane, budget)
+
+    def finish(results):
+        translated_segments = finish_segments(results)
+        translated_texts, position = [], 0
+        for item_segments, separators in plans:
+            item_translations = translated_segments[position:position + len(item_segments)]
+            if isinstance(target_lang, tuple):
+                translated_texts.append([join_text([row[column] for row in item_translations], separators, lang)
+                                         for column, lang in enumerate(target_lang)])
+            else:
+                translated_texts.append(join_text(item_translations, separators, target_lang))
+            position += len(item_segments)
+        if masks is not None: # protected spans (or their glossary translations) go back into every translation
+            for index, (_, spans) in enumerate(masks):
+                if isinstance(target_lang, tuple):
+                    translated_texts[index] = [Protector.restore(text, spans, lang)
+                                               for text, lang in zip(translated_texts[index], target_lang)]
+                else:
+                    translated_texts[index] = Protector.restore(translated_texts[index], spans, target_lang)
+        return translated_texts
+
+    return futures, finish
+
+
+def submit_documents(documents, detected_langs, target_lang, model_name, lane=INTERACTIVE, budget=None,
+                     protector=None):
+    """
+    Queues translation of HTML documents (see app.utils.markup): the text runs of all documents go to
+    submit_texts as one batch, markup never reaches the model.
+    Returns (futures, finish): finish(results of futures) returns the translated HTML in the order of documents.
+    """
+    runs, run_langs = [], []
+    for document, detected_lang in zip(documents, detected_langs):
+        runs.extend(document.texts)
+        run_langs.extend([detected_lang] * len(document.texts))
+    futures, finish_runs = submit_texts(runs, run_langs, target_lang, model_name, lane, budget, protector)
+
+    def finish(results):
+        translated_runs = finish_runs(results)
+        translated_documents, position = [], 0
+        for document in documents:
+            document_runs = translated_runs[position:position + len(document.texts)]
+            if isinstance(target_lang, tuple):
+                translated_documents.append([document.render([row[column] for row in document_runs])
+                                             for column in range(len(target_lang))])
+            else:
+                translated_documents.append(document.render(document_runs))
+            position += len(document.texts)
+        return translated_documents
+
+    return futures, finish
+
+
+def translate_texts(texts, detected_langs, target_lang, model_name, lane=INTERACTIVE, budget=None):
+    """
+    Translates texts (with already detected languages) and returns translations in the same order.
+    Long texts are split into sentences, all sentences are translated as one batch.
+    target_lang may be a tuple of languages: then every translation is a list in the order of target_lang.
+    Raises QueueFullError if the model queue is full, DeadlineExceededError if budget runs out and
+    RequestCancelledError if the client of budget disconnects.
+    """
+    futures, finish = submit_texts(texts, detected_langs, target_lang, model_name, lane, budget)
+    return finish(_wait(futures, budget))
+
+
+def _parse_translate_request(json_dict, multi_target=False):
+    """
+    Validates the body of /translate and /translate/stream and detects source languages.
+    Returns ((texts, target_lang, source_lang, detected_langs, model_name, documents), None) or (None, error response).
+    With multi_target "target" may be a list, target_lang is then a tuple of languages.
+    With "format": "html" documents holds the parsed HtmlDocument of every text (None for plain text);
+    detection and the length limit then apply to the text content without markup.
+    """
+    text, error_string = request_body_none_check(json_dict=json_dict, key_name="q")
+    if error_string != '':
+        return None, ResponseMessages.error_400(str(error_string))
+
+    target_lang, error_string = request_body_none_check(json_dict=json_dict, key_name="target")
+    if error_string != '':
+        return None, ResponseMessages.error_400(str(error_string))
+
+    try:
+        model_name = model_registry.resolve(json_dict.get("model")) # optional, like Google API v2
+    except ModelNotFoundError as e:
+        return None, ResponseMessages.error_400(str(e))
+    supported_languages = model_registry.languages(model_name)
+
+    # "target" may be a list of languages: every text is encoded once and translated into all of them
+    if isinstance(target_lang, list):
+        if not multi_target:
+            return None, ResponseMessages.error_400("Target language (target) must be a single language.")
+        target_lang = tuple(dict.fromkeys(target_lang))
+        if not target_lang or not all(isinstance(item, str) for item in target_lang):
+            return None, ResponseMessages.error_400("Target language (target) must be a string or a non-empty list of strings.")
+        if len(target_lang)>MAX_TARGET_LANGUAGES:
+            return None, ResponseMessages.error_400(f"Too many target languages: {len(target_lang)}. Maximum is {MAX_TARGET_LANGUAGES}.")
+    target_langs = target_lang if isinstance(target_lang, tuple) else (target_lang,)
+
+    # "q" may be a single string or a list of strings (Google API v2)
+    texts = text if isinstance(text, list) else [text]
+    if not texts or not all(isinstance(item, str) for item in texts):
+        return None, ResponseMessages.error_400("Input text (q) must be a string or a non-empty list of strings.")
+    if len(texts)>MAX_TEXT_SEGMENTS:
+        return None, ResponseMessages.error_400(f"Too many texts for translation: {len(texts)}. Maximum is {MAX_TEXT_SEGMENTS}.")
+
+    text_format = json_dict.get("format") or "text"
+    if text_format not in ("text", "html"):
+        return None, ResponseMessages.error_400(f"Unsupported format: {text_format}. Supported formats: text, html.")
+    documents = [parse_html(item) for item in texts] if text_format == "html" else None
+    contents = [document.text_content() for document in documents] if documents is not None else texts
+
+    for index, item in enumerate(contents):
+        if len(item)>MAX_TEXT_LENGTH:
+            position = f" #{index}" if isinstance(text, list) else ""
+            return None, ResponseMessages.error_400(f"Input text{position} for translation is more then {MAX_TEXT_LENGTH} symbols. Current length is {len(item)} symbols.")
+
+    # Known source language (optional, like Google API v2) skips detection
+    source_lang = json_dict.get("source")
+    if source_lang:
+        if not isinstance(source_lang, str) or source_lang not in supported_languages:
+            logger.error(f"Source language: {source_lang} ---> Target language: {target_lang}")
+            return None, ResponseMessages.error_400("Unsupported language pair")
+        detected_langs = [source_lang] * len(texts)
+    else:
+        detected_langs = [lang for lang, _ in detect_languages(contents)]
+    for detected_lang in detected_langs:
+        if (detected_lang not in supported_languages
+                or not all(lang in supported_languages for lang in target_langs)):
+            logger.error(f"Detected language: {detected_lang} ---> Target language: {', '.join(target_langs)}")
+            return None, ResponseMessages.error_400("Unsupported language pair")
+
+    logger.info(f"source: {', '.join(detected_langs)}")
+    return (texts, target_lang, source_lang, detected_langs, model_name, documents), None
+
+
+def _parse_protection(json_dict):
+    """
+    Protected spans of a /translate request: "glossary" (inline terms), "glossaryId" (preloaded glossary)
+    and "protect" (built-in patterns: url, email, placeholder, code).
+    Returns (Protector or None, None) or (None, error response).
+    """
+    inline, glossary_id, patterns = json_dict.get("glossary"), json_dict.get("glossaryId"), json_dict.get("protect")
+    if inline is None and glossary_id is None and patterns is None:
+        return None, None
+    if patterns is not None and (not isinstance(patterns, list) or not all(isinstance(item, str) for item in patterns)):
+        return None, ResponseMessages.error_400("Protected patterns (protect) must be a list of strings.")
+    try:
+        glossaries = []
+        if glossary_id is not None:
+            glossaries.append(_glossaries.get(glossary_id))
+        if inline is not None:
+            glossaries.append(_glossaries.inline(inline))
+        return Protector(glossaries, patterns or ()), None
+    except GlossaryError as e:
+        return None, ResponseMessages.error_400(str(e))
+
+
+def _google_translations(translated_texts, detected_langs, source_lang, target_langs=None):
+    """
+    Google API v2 compatible response body.
+    For several target languages translated_texts holds a list per text; the translations of a text follow
+    each other in the order of target_langs and carry "targetLanguage".
+    """
+    if target_langs is not None:
+        return {
+            "data": {
+                "translations": [
+                    {
+                        "translatedText": translated_text,
+                        "targetLanguage": target_lang,
+                        **({} if source_lang else  # Autodetect only
+                           {"detectedSourceLanguage": to_google_lang_code(detected_lang)})
+                    }
+                    for translations, detected_lang in zip(translated_texts, detected_langs)
+                    for translated_text, target_lang in zip(translations, target_langs)
+                ]
+            }
+        }
+    return {
+        "data": {
+            "translations": [
+                {
+                    "translatedText": translated_text,
+                    **({} if source_lang else  # Autodetect only
+                       {"detectedSourceLanguage": to_google_lang_code(detected_lang)})
+                }
+                for translated_text, detected_lang in zip(translated_texts, detected_langs)
+            ]
+        }
+    }
+
+
+class PendingTranslation:
+    """Texts of a /translate request queued for the model; complete() or fail() turns the outcome into a response"""
+
+    def __init__(self, futures, finish, budget, detected_langs, source_lang, target_lang, deadline_ms):
+        self.futures = futures
+        self.finish = finish
+        self.budget = budget
+        self.detected_langs = detected_langs
+        self.source_lang = source_lang
+        self.target_lang = target_lang
+        self.deadline_ms = deadline_ms
+
+    def complete(self, results):
+        try:
+            translated_texts = self.finish(results)
+            target_langs = self.target_lang if isinstance(self.target_lang, tuple) else None
+            body = _google_translations(translated_texts, self.detected_langs, self.source_lang, target_langs)
+            if DEBUG: # decoding plans of the batches that translated this request (cached texts have none)
+                body["debug"] = {"decoding": self.budget.plans, "deadline_ms": self.deadline_ms}
+            return jsonify(body)
+        except Exception as e:
+            return ResponseMessages.error_500(str(e))
+
+    def fail(self, error):
+        if isinstance(error, DeadlineExceededError):
+            return ResponseMessages.error_504(str(error))
+        if isinstance(error, RequestCancelledError):
+            logger.info(f"Translation abandoned: {error}")
+            return ResponseMessages.error_503(str(error)) # nobody reads it, but it is counted and logged
+        return ResponseMessages.error_500(str(error))
+
+
+def begin_translate():
+    """
+    First half of /translate: validates the request, takes cached translations and queues the other texts.
+    Returns (response, None) if the request is already answered (e.g. an error) or (None, PendingTranslation).
+    Used by the /translate view and by the asyncio server (app/asgi.py), which awaits the futures instead.
+    """
+    func_name = 'translate'
+
+    try:
+        with stage('json_parse'):
+            json_dict = request.get_json(force=True)
+    except Exception as e:
+        error_type = type(e).__name__
+        error_string = f'Error in {func_name}: {error_type}: {e}'
+        return ResponseMessages.error_400(str(error_string)), None
+
+    try:
+
+        if json_dict is not None:
+            parsed, error_response = _parse_translate_request(json_dict, multi_target=True)
+            if error_response is not None:
+                return error_response, None
+            texts, target_lang, source_lang, detected_langs, model_name, documents = parsed
+            protector, error_response = _parse_protection(json_dict)
+            if error_response is not None:
+                return error_response, None
+
+            # Optional latency budget of the request: fewer beams if needed, cut off when it is over
+            deadline_ms = request.headers.get("X-Deadline-Ms")
+            try:
+                deadline_ms = float(deadline_ms) if deadline_ms else None
+            except ValueError:
+                return ResponseMessages.error_400(f"Invalid X-Deadline-Ms header: {deadline_ms}"), None
+            budget = Budget(deadline_ms, request.environ.get("waitress.client_disconnected"))
+
+            # translation
+            try:
+                if documents is not None: # "format": "html" - only text runs are translated
+                    futures, finish = submit_documents(documents, detected_langs, target_lang, model_name,
+                                                       budget=budget, protector=protector)
+                else:
+                    futures, finish = submit_texts(texts, detected_langs, target_lang, model_name, budget=budget,
+                                                   protector=protector)
+            except QueueFullError as e:
+                return ResponseMessages.error_503(str(e), retry_after=_batcher.estimated_wait_seconds()), None
+
+            return None, PendingTranslation(futures, finish, budget, detected_langs, source_lang, target_lang,
+                                            deadline_ms)
+
+        else:
+            return ResponseMessages.error_400("No content"), None
+
+    except Exception as e:
+        return ResponseMessages.error_500(str(e)), None
 
 
 @translate_blueprint.route("/translate", methods=["POST"])
 def translate():
+    response, pending = begin_translate()
+    if pending is None:
+        return response
+    try:
+        results = _wait(pending.futures, pending.budget)
+    except Exception as e:
+        return pending.fail(e)
+    return pending.complete(results)
+
+
+def _stream_segment(segment, source_lang, target_lang, model_name):
+    # Pieces of one segment: a cached translation at once, otherwise as the model decodes it
+    cached = _cache.get(translation_key(model_name, source_lang, target_lang, segment))
+    if cached is not None:
+        yield cached
+    elif inference_pool is not None:
+        yield from inference_pool.stream((model_name, target_lang), (segment, source_lang))
+    else:
+        yield from stream_translate(model_registry.get(model_name), target_lang, segment, source_lang)
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _stream_events(texts, target_lang, source_lang, detected_langs, model_name):
+    """
+    Server-Sent Events of a streamed translation: "delta" {index, text} events carry pieces of translation
+    of text #index as they are decoded, the final "done" event is the Google API v2 response.
+    """
+    translated_texts = []
+    try:
+        for index, (item, detected_lang) in enumerate(zip(texts, detected_langs)):
+            segments, separators = split_text(item, detected_lang, MAX_SEGMENT_LENGTH)
+            separators = target_separators(separators, target_lang)
+            parts = []
+            for position, separator in enumerate(separators):
+                if separator:
+                    parts.append(separator)
+                    yield _sse("delta", {"index": index, "text": separator})
+                if position < len(segments):
+                    for piece in _stream_segment(segments[position], detected_lang, target_lang, model_name):
+                        parts.append(piece)
+                        yield _sse("delta", {"index": index, "text": piece})
+            translated_texts.append(''.join(parts))
+        yield _sse("done", _google_translations(translated_texts, detected_langs, source_lang))
+    except Exception as e:
+        logger.error(f"Streamed translation failed: {type(e).__name__}: {e}")
+        yield _sse("error", ResponseMessages._build_error_payload(ResponseMessages.ERROR_500, str(e)))
+
+
+@translate_blueprint.route("/translate/stream", methods=["POST"])
+def translate_stream():
+    """
+    Streaming variant of /translate for interactive clients (Server-Sent Events).
+    Segments are decoded greedily and sent as soon as words appear; results are not cached because
+    they may differ from the beam search results of /translate.
+    """
     func_name = inspect.currentframe().f_code.co_name
 
     try:
-        json_dict = request.get_json(force=True)
+        with stage('json_parse'):
+            json_dict = request.get_json(force=True)
     except Exception as e:
         error_type = type(e).__name__
         error_string = f'Error in {func_name}: {error_type}: {e}'
@@ -46,55 +616,19 @@ def translate():
     try:
 
         if json_dict is not None:
-            text, error_string = request_body_none_check(json_dict=json_dict, key_name="q")
-            if error_string != '':
-                return ResponseMessages.error_400(str(error_string))
-
-            target_lang, error_string = request_body_none_check(json_dict=json_dict, key_name="target")
-            if error_string != '':
-                return ResponseMessages.error_400(str(error_string))
+            parsed, error_response = _parse_translate_request(json_dict)
+            if error_response is not None:
+                return error_response
+            texts, target_lang, source_lang, detected_langs, model_name, documents = parsed
+            if documents is not None:
+                return ResponseMessages.error_400("Format html is not supported by /translate/stream.")
+            if any(json_dict.get(key) is not None for key in ("glossary", "glossaryId", "protect")):
+                return ResponseMessages.error_400("Glossaries and protected patterns are not supported by /translate/stream.")
 
-            if len(text)>MAX_TEXT_LENGTH:
-                return ResponseMessages.error_400(f"Input text for translation is more then {MAX_TEXT_LENGTH} symbols. Current length is {len(text)} symbols.")
-
-            detected_lang, _ = detect_language(text)
-            if (detected_lang not in SUPPORTED_LANGUAGES[SELECTED_MODEL]
-                    or target_lang not in SUPPORTED_LANGUAGES[SELECTED_MODEL]):
-                logger.error(f"Detected language: {detected_lang} ---> Target language: {target_lang}")
-                return ResponseMessages.error_400("Unsupported language pair")
-
-            # translation
-            logger.info(f"source: {detected_lang}")
-            _tokenizer.src_lang = detected_lang # Source language
-            inputs = _tokenizer(text, return_tensors="pt")
-            inputs = {k: v.to(_model.device) for k, v in inputs.items()}
-
-            max_length = 100 if _device == "cpu" else 200
-            num_beams = 3 if _device == "cpu" else None
-
-            with torch.no_grad():
-                outputs = _model.generate(
-                    **inputs,
-                    forced_bos_token_id=_tokenizer.lang_code_to_id[target_lang],   # Target language
-                    max_length=max_length,
-                    num_beams=num_beams,
-                    early_stopping=True,
-                    # top_k=30,    # We allow the model to choose from the 30 most likely options
-                    # top_p=0.95,  # Nucleus sampling (more creative)
-                    #repetition_penalty=1.2  # Avoiding repetitions
-                )
-
-            translated_text = _tokenizer.decode(outputs[0], skip_special_tokens=True)
-
-            # Google API v2 compatible format
-            return jsonify({
-                "data": {
-                    "translations": [{
-                        "translatedText": translated_text,
-                        "detectedSourceLanguage": to_google_lang_code(detected_lang)  # Autodetect
-                    }]
-                }
-            })
+            return Response(stream_with_context(_stream_events(texts, target_lang, source_lang, detected_langs,
+                                                               model_name)),
+                            mimetype='text/event-stream',
+                            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
         else:
             return ResponseMessages.error_400("No content")
@@ -107,7 +641,8 @@ def detect_route():
     func_name = inspect.currentframe().f_code.co_name
 
     try:
-        json_dict = request.get_json(force=True)
+        with stage('json_parse'):
+            json_dict = request.get_json(force=True)
     except Exception as e:
         error_type = type(e).__name__
         error_string = f'Error in {func_name}: {error_type}: {e}'
@@ -120,8 +655,15 @@ def detect_route():
             if error_string != '':
                 return ResponseMessages.error_400(str(error_string))
 
+            # "q" may be a single string or a list of strings (Google API v2), lists are classified in one pass
+            texts = text if isinstance(text, list) else [text]
+            if not texts or not all(isinstance(item, str) for item in texts):
+                return ResponseMessages.error_400("Input text (q) must be a string or a non-empty list of strings.")
+            if len(texts)>MAX_TEXT_SEGMENTS:
+                return ResponseMessages.error_400(f"Too many texts for detection: {len(texts)}. Maximum is {MAX_TEXT_SEGMENTS}.")
+
             try:
-                language, confidence = detect_language(text)
+                detections = detect_languages(texts)
             except Exception as e:
                 return jsonify({"error": str(e)}), 500
 
@@ -134,6 +676,7 @@ def detect_route():
                                 "confidence": confidence
                             }
                         ]
+                        for language, confidence in detections
                     ]
                 }
             })
@@ -144,15 +687,31 @@ def detect_route():
     except Exception as e:
         return ResponseMessages.error_500(str(e))
 
+@translate_blueprint.route("/cache/stats", methods=["GET"])
+def cache_stats():
+    """Returns hit/miss/eviction counters of the result cache, the translation memory size and glossaries"""
+    try:
+        stats = _cache.stats()
+        if _memory is not None:
+            stats["translation_memory"] = _memory.stats()
+        stats["glossaries"] = _glossaries.stats()
+        return jsonify({"data": stats})
+    except Exception as e:
+        return ResponseMessages.error_500(str(e))
+
 @translate_blueprint.route("/languages", methods=["GET"])
 def list_languages():
     """Returns a list of supported languages"""
     try:
+        try:
+            languages = model_registry.languages(request.args.get("model"))
+        except ModelNotFoundError as e:
+            return ResponseMessages.error_400(str(e))
         return jsonify({
             "data": {
                 "languages": [
                     {"code": code, "name": name}
-                    for code, name in SUPPORTED_LANGUAGES[SELECTED_MODEL].items()
+                    for code, name in languages.items()
                 ]
             }
         })
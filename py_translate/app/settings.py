@@ -13,6 +13,9 @@ UPLOAD_DIR = os.path.join(current_module_directory, 'tmp')     # dir for tempora
 ASSETS_DIR = os.path.join(current_module_directory, 'assets')  # dir for persistent files
 DOTENV_PATH = os.path.join(ASSETS_DIR, '.env')                 # environmental variables file
 MODELS_CACHE_DIR = os.path.join(current_module_directory, 'models_cache')
+TM_DIR = os.path.join(current_module_directory, 'translation_memory') # persistent translation memory
+TM_DB_PATH = os.path.join(TM_DIR, 'translation_memory.sqlite3')
+GLOSSARIES_DIR = os.path.join(current_module_directory, 'glossaries') # preloaded glossaries <id>.json
 
 APP_NAME = 'py_translate'
 APP_VER = {'ver': '0.0.1',
@@ -21,13 +24,19 @@ APP_VER = {'ver': '0.0.1',
 
 import logging
 from app.utils.module_logger import ModuleLogger
+from app.utils.decoding_policy import parse_length_ratios
 module_logger = ModuleLogger(module_name = APP_NAME, log_dir=LOGS_DIR, log_level=logging.DEBUG)
 logger = module_logger.get_logger()
 
 # Load env vars from .env
 load_dotenv(DOTENV_PATH)
 
-MAX_TEXT_LENGTH = 1000
+MAX_TEXT_LENGTH = 100000
+MAX_SEGMENT_LENGTH = 400 # long sentences are cut into chunks of this number of symbols before translation
+MAX_TEXT_SEGMENTS = 128 # max number of texts in one request ("q" as a list), same as Google Translate v2
+MAX_TARGET_LANGUAGES = 30 # max number of target languages in one request ("target" as a list)
+MAX_JOB_TEXTS = 1000000 # max number of texts in one bulk translation job
+DETECT_MAX_CHARS = 1000 # language detection looks at this prefix of a text only
 
 # Models configuration --------------------------------------------------------------------
 """
@@ -45,7 +54,21 @@ M2M100_1200 = "facebook/m2m100_1.2B"
 TRANSLATE_MODELS = set()
 TRANSLATE_MODELS.update([M2M100_418, M2M100_1200])
 
-SELECTED_MODEL = M2M100_418
+SELECTED_MODEL = M2M100_418 # default model, other models may be chosen by "model" field of request
+
+# Short names accepted in "model" field of request (Google Translate v2 uses "base" and "nmt")
+MODEL_ALIASES = {
+    "base": SELECTED_MODEL,
+    "nmt": SELECTED_MODEL,
+    "m2m100_418M": M2M100_418,
+    "m2m100_1.2B": M2M100_1200,
+}
+
+# Output limit of a segment: input tokens * OUTPUT_LENGTH_RATIO (or the ratio of its language pair, see
+# output_length_ratios in settings.ini) + OUTPUT_LENGTH_EXTRA, but not more than MAX_OUTPUT_TOKENS
+OUTPUT_LENGTH_RATIO = 2.0
+OUTPUT_LENGTH_EXTRA = 10
+MAX_OUTPUT_TOKENS = 512
 
 # Config variables reading from settings.ini ----------------------------------------------
 config = configparser.ConfigParser()
@@ -59,4 +82,66 @@ PORT = int ( config.get(APP_MODE, 'server_port') )
 tmp_str = config.get(APP_MODE, 'auth_mode').upper()
 AUTHORIZE = True if tmp_str=='TRUE' else False
 
+# Micro-batching of translations
+BATCH_MAX_SIZE = config.getint(APP_MODE, 'batch_max_size', fallback=8)
+BATCH_MAX_WAIT_MS = config.getint(APP_MODE, 'batch_max_wait_ms', fallback=10)
+BATCH_QUEUE_SIZE = config.getint(APP_MODE, 'batch_queue_size', fallback=256)
+
+# In-process cache of translation and language detection results
+CACHE_MAX_ENTRIES = config.getint(APP_MODE, 'cache_max_entries', fallback=10000)
+CACHE_MAX_BYTES = config.getint(APP_MODE, 'cache_max_mb', fallback=64) * 1024 * 1024
+CACHE_TTL_SECONDS = config.getfloat(APP_MODE, 'cache_ttl_seconds', fallback=0)
+
+# Persistent translation memory
+TM_ENABLED = config.getboolean(APP_MODE, 'tm_enabled', fallback=False)
+TM_MAX_ENTRIES = config.getint(APP_MODE, 'tm_max_entries', fallback=100000)
+
+# Residency of translation models (they are loaded on first use)
+MODELS_MAX_RESIDENT = config.getint(APP_MODE, 'models_max_resident', fallback=1)
+MODELS_MEMORY_BUDGET_BYTES = config.getint(APP_MODE, 'models_memory_budget_mb', fallback=0) * 1024 * 1024
+
+# Inference worker processes
+INFERENCE_WORKERS = config.getint(APP_MODE, 'inference_workers', fallback=0)
+INFERENCE_THREADS_PER_WORKER = config.getint(APP_MODE, 'inference_threads_per_worker', fallback=0)
+INFERENCE_TIMEOUT_SECONDS = config.getint(APP_MODE, 'inference_timeout_ms', fallback=300000) / 1000
+INFERENCE_TIMEOUT_MARGIN_SECONDS = config.getint(APP_MODE, 'inference_timeout_margin_ms', fallback=10000) / 1000
+
+# Inference engine: fp32, int8 or bf16 (see app/utils/engine.py), optionally with torch.compile
+ENGINE_MODE = config.get(APP_MODE, 'engine_mode', fallback='fp32').strip().lower()
+ENGINE_COMPILE = config.getboolean(APP_MODE, 'engine_compile', fallback=False)
+# Weights mapped read-only from a snapshot under MODELS_CACHE_DIR/mmap, shared by all processes of the host
+WEIGHTS_MMAP = config.getboolean(APP_MODE, 'weights_mmap', fallback=False)
+
+# Glossaries: compiled glossaries kept in memory, max number of terms of a glossary (0 - unlimited)
+GLOSSARY_CACHE_ENTRIES = config.getint(APP_MODE, 'glossary_cache_entries', fallback=100)
+GLOSSARY_MAX_TERMS = config.getint(APP_MODE, 'glossary_max_terms', fallback=100000)
+
+# Background warm-up at startup (language detector, default model, dummy generations)
+WARMUP = config.getboolean(APP_MODE, 'warmup', fallback=True)
+
+# Logging of request values: max length of a logged value and share of logged requests
+LOG_BODY_MAX_CHARS = config.getint(APP_MODE, 'log_body_max_chars', fallback=1000)
+LOG_BODY_SAMPLE_RATE = config.getfloat(APP_MODE, 'log_body_sample_rate', fallback=1.0)
+
+# Token ids of recently translated texts
+ENCODE_CACHE_ENTRIES = config.getint(APP_MODE, 'encode_cache_entries', fallback=20000)
+
+# Thread pool of the asyncio server (app/asgi.py)
+ASGI_THREADS = config.getint(APP_MODE, 'asgi_threads', fallback=16)
+
+# Admission control of translation requests (see app/middleware.py)
+ADMISSION_MAX_IN_FLIGHT = config.getint(APP_MODE, 'admission_max_in_flight', fallback=0)
+ADMISSION_MAX_WAITING = config.getint(APP_MODE, 'admission_max_waiting', fallback=0)
+ADMISSION_MAX_WAIT_SECONDS = config.getint(APP_MODE, 'admission_max_wait_ms', fallback=5000) / 1000
+
+# Decoding policy: beam width by load and deadline (X-Deadline-Ms), output limits by language pair
+DECODING_MAX_BEAMS = config.getint(APP_MODE, 'decoding_max_beams', fallback=3)
+DECODING_BUSY_PRESSURE = config.getfloat(APP_MODE, 'decoding_busy_pressure', fallback=0.25)
+DECODING_SATURATED_PRESSURE = config.getfloat(APP_MODE, 'decoding_saturated_pressure', fallback=0.75)
+OUTPUT_LENGTH_RATIOS = parse_length_ratios(config.get(APP_MODE, 'output_length_ratios', fallback=''))
+
+# Length buckets of batched generation: None - automatic, [] - no bucketing
+tmp_str = config.get(APP_MODE, 'length_buckets', fallback='auto').strip().lower()
+LENGTH_BUCKETS = None if tmp_str == 'auto' else sorted(int(value) for value in tmp_str.split(',') if value.strip())
+
 ResponseMessages.set_debug(DEBUG) # allow additional debug messages in responses
\ No newline at end of file
@@ -0,0 +1,112 @@
+import threading
+import time
+from collections import deque
+from typing import Callable, Optional
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is not admitted: status 429 (wait queue is full) or 503 (no capacity in time)."""
+
+    def __init__(self, message: str, status: int, retry_after: int = 1):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Bounds the number of requests doing translation work at the same time.
+
+    Up to max_in_flight requests run, up to max_waiting more wait for a free slot in arrival order.
+    A request is rejected at once with 429 when the wait queue is full, and with 503 when its expected
+    wait (position in the queue * average time in flight / max_in_flight) is longer than max_wait_seconds
+    or its own deadline. A waiting request gives up with 503 when max_wait_seconds pass, and leaves the
+    queue silently when cancelled() (e.g. the client disconnected) becomes true.
+    """
+
+    def __init__(self, max_in_flight: int, max_waiting: int = 0, max_wait_seconds: float = 10.0,
+                 poll_seconds: float = 0.1):
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_waiting = max(0, max_waiting)
+        self.max_wait_seconds = max_wait_seconds
+        self.poll_seconds = poll_seconds
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._waiting = deque()
+        self.avg_seconds = None # moving average of time in flight
+        self.admitted = 0
+        self.rejected = {"queue_full": 0, "too_slow": 0, "timeout": 0, "cancelled": 0}
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiting)
+
+    def _expected_wait(self, position: int) -> Optional[float]:
+        return None if self.avg_seconds is None else position * self.avg_seconds / self.max_in_flight
+
+    def _retry_after(self) -> int:
+        expected = self._expected_wait(len(self._waiting) + 1)
+        return max(1, int((expected or 1) + 0.999))
+
+    def _reject(self, reason: str, message: str, status: int):
+        self.rejected[reason] += 1
+        raise AdmissionRejected(message, status, self._retry_after())
+
+    def acquire(self, timeout: float = None, cancelled: Callable[[], bool] = None) -> bool:
+        """
+        Takes a slot, waiting up to max_wait_seconds (or timeout if it is shorter).
+        Returns False if the request was cancelled while waiting, raises AdmissionRejected if it is not admitted.
+        """
+        with self._cond:
+            if self._in_flight < self.max_in_flight and not self._waiting:
+                self._in_flight += 1
+                self.admitted += 1
+                return True
+            if len(self._waiting) >= self.max_waiting:
+                self._reject('queue_full', "Too many translation requests, try again later", 429)
+
+            limit = self.max_wait_seconds if timeout is None else min(self.max_wait_seconds, timeout)
+            expected = self._expected_wait(len(self._waiting) + 1)
+            if limit <= 0 or (expected is not None and expected > limit):
+                self._reject('too_slow', "Translation can not start in time, try again later", 503)
+
+            ticket = object()
+            self._waiting.append(ticket)
+            ends = time.monotonic() + limit
+            try:
+                while self._waiting[0] is not ticket or self._in_flight >= self.max_in_flight:
+                    left = ends - time.monotonic()
+                    if left <= 0:
+                        self._reject('timeout', "Timed out waiting for translation capacity", 503)
+                    if cancelled is not None and cancelled():
+                        self.rejected['cancelled'] += 1
+                        return False
+                    self._cond.wait(min(left, self.poll_seconds))
+                self._in_flight += 1
+                self.admitted += 1
+                return True
+            finally:
+                self._waiting.remove(ticket)
+                self._cond.notify_all() # the next request in the queue may be able to go
+
+    def release(self, seconds: float):
+        """Frees the slot of a request that was in flight for seconds"""
+        with self._cond:
+            self._in_flight -= 1
+            self.avg_seconds = seconds if self.avg_seconds is None else 0.8 * self.avg_seconds + 0.2 * seconds
+            self._cond.notify_all()
+
+    def status(self) -> dict:
+        with self._cond:
+            return {"in_flight": self._in_flight,
+                    "waiting": len(self._waiting),
+                    "max_in_flight": self.max_in_flight,
+                    "max_waiting": self.max_waiting,
+                    "max_wait_seconds": self.max_wait_seconds,
+                    "avg_seconds": None if self.avg_seconds is None else round(self.avg_seconds, 4),
+                    "admitted": self.admitted,
+                    "rejected": dict(self.rejected)}
@@ -0,0 +1,163 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Hashable, List
+
+import logging
+
+logger = logging.getLogger(__name__) # getting root logger
+if not logging.getLogger().hasHandlers():
+    print("ERROR: Root logger had no handlers. Logging unavailable.")
+
+
+# Priority lanes: a bulk batch is taken only when no interactive items are waiting
+INTERACTIVE = 0
+BULK = 1
+
+
+class QueueFullError(Exception):
+    """Raised when the batcher already holds max_queue_size pending items."""
+    pass
+
+
+class _Entry:
+    __slots__ = ('item', 'future', 'enqueued')
+
+    def __init__(self, item: Any):
+        self.item = item
+        self.future = Future()
+        self.enqueued = time.monotonic()
+
+
+class MicroBatcher:
+    """
+    Collects single items submitted from many request threads and processes them in groups.
+
+    Items are grouped by key (e.g. target language). A group is handed to process_batch(key, items)
+    as soon as it reaches max_batch_size or its oldest item waited max_wait_ms.
+    process_batch must return one result per item in the same order.
+    Up to max_concurrent_batches batches are processed at the same time (e.g. one per worker process);
+    while all of them are busy, new items keep accumulating into bigger batches.
+    Items of the BULK lane are processed only when the INTERACTIVE lane is empty.
+    A result that is an exception instance is raised for its own item only.
+    """
+
+    def __init__(self, process_batch: Callable[[Hashable, List[Any]], List[Any]],
+                 max_batch_size: int = 8, max_wait_ms: int = 10, max_queue_size: int = 0,
+                 max_concurrent_batches: int = 1, name: str = 'batcher'):
+        self.process_batch = process_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0, max_wait_ms) / 1000
+        self.max_queue_size = max_queue_size # 0 - unlimited
+        self.max_concurrent_batches = max(1, max_concurrent_batches)
+        self.name = name
+
+        self._cond = threading.Condition()
+        self._groups = OrderedDict() # (lane, key) -> list of _Entry, ordered by the age of the first entry
+        self._size = 0
+        self._thread = None
+        self._slots = threading.Semaphore(self.max_concurrent_batches)
+        self._executor = None
+        if self.max_concurrent_batches > 1:
+            self._executor = ThreadPoolExecutor(self.max_concurrent_batches, thread_name_prefix=name)
+        self.avg_batch_seconds = 0.0 # moving average of process_batch duration
+
+    @property
+    def queue_size(self) -> int:
+        return self._size
+
+    def pressure(self) -> float:
+        """Share of the queue in use (0..1); an unlimited queue counts as full at 4 rounds of full batches"""
+        capacity = self.max_queue_size or 4 * self.max_batch_size * self.max_concurrent_batches
+        return min(1.0, self._size / capacity)
+
+    def estimated_wait_seconds(self) -> int:
+        """Rough time until the current queue is processed (for Retry-After)"""
+        batches = self._size / (self.max_batch_size * self.max_concurrent_batches)
+        return max(1, int(batches * self.avg_batch_seconds + 0.999))
+
+    def submit(self, key: Hashable, item: Any, lane: int = INTERACTIVE) -> Future:
+        """Puts item into the queue. Result (or exception) is delivered through the returned Future."""
+        return self.submit_many(key, [item], lane)[0]
+
+    def submit_many(self, key: Hashable, items: List[Any], lane: int = INTERACTIVE) -> List[Future]:
+        """
+        Puts all items into the queue at once, so they are processed together (up to max_batch_size).
+        A request larger than max_queue_size is still accepted when the queue is empty.
+        """
+        entries = [_Entry(item) for item in items]
+        with self._cond:
+            if self.max_queue_size and self._size and self._size + len(entries) > self.max_queue_size:
+                raise QueueFullError(f"Translation queue is full ({self._size} pending items)")
+            self._groups.setdefault((lane, key), []).extend(entries)
+            self._size += len(entries)
+            self._start()
+            self._cond.notify()
+        return [entry.future for entry in entries]
+
+    def _start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def _next_batch(self):
+        # Called under lock. Returns ((lane, key), entries, 0) of a ready group or (None, None, seconds to wait)
+        lane = min(lane for lane, _ in self._groups)
+        groups = [(group_key, entries) for group_key, entries in self._groups.items() if group_key[0] == lane]
+        for group_key, entries in groups:
+            if len(entries) >= self.max_batch_size:
+                return group_key, entries, 0
+        group_key, entries = groups[0]
+        wait = entries[0].enqueued + self.max_wait - time.monotonic()
+        if wait <= 0:
+            return group_key, entries, 0
+        return None, None, wait
+
+    def _run(self):
+        while True:
+            self._slots.acquire() # wait for a free slot before taking the next batch
+            with self._cond:
+                while True:
+                    if not self._groups:
+                        self._cond.wait()
+                        continue
+                    group_key, entries, wait = self._next_batch()
+                    if entries is not None:
+                        break
+                    self._cond.wait(wait)
+
+                batch = entries[:self.max_batch_size]
+                del entries[:self.max_batch_size]
+                if not entries:
+                    del self._groups[group_key]
+                self._size -= len(batch)
+                key = group_key[1]
+
+            batch = [entry for entry in batch if entry.future.set_running_or_notify_cancel()]
+            if not batch:
+                self._slots.release()
+                continue
+
+            if self._executor is not None:
+                self._executor.submit(self._process, key, batch)
+            else:
+                self._process(key, batch)
+
+    def _process(self, key: Hashable, batch: List[_Entry]):
+        started = time.monotonic()
+        try:
+            results = self.process_batch(key, [entry.item for entry in batch])
+            for entry, result in zip(batch, results):
+                if isinstance(result, Exception):
+                    entry.future.set_exception(result)
+                else:
+                    entry.future.set_result(result)
+        except Exception as e:
+            logger.error(f"{self.name}: batch of {len(batch)} failed: {type(e).__name__}: {e}")
+            for entry in batch:
+                if not entry.future.done():
+                    entry.future.set_exception(e)
+        finally:
+            self.avg_batch_seconds = 0.8 * self.avg_batch_seconds + 0.2 * (time.monotonic() - started)
+            self._slots.release()
@@ -0,0 +1,136 @@
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+class DeadlineExceededError(Exception):
+    """Raised when a translation can not be finished within the deadline of its request."""
+    pass
+
+
+class RequestCancelledError(Exception):
+    """Raised when the client of a request has gone and its translation is abandoned."""
+    pass
+
+
+class Budget:
+    """
+    Deadline of one request (X-Deadline-Ms) and the decoding plans applied to its texts.
+    A request without a deadline has deadline None and is never cut off.
+    client_disconnected (e.g. waitress.client_disconnected of the WSGI environ) tells that nobody waits anymore.
+    """
+
+    def __init__(self, deadline_ms: float = None, client_disconnected: Callable[[], bool] = None):
+        self.deadline = time.monotonic() + deadline_ms / 1000 if deadline_ms else None
+        self.client_disconnected = client_disconnected
+        self.plans: List[dict] = [] # filled by the batches which translated texts of the request
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left until the deadline (may be negative), None without a deadline"""
+        return None if self.deadline is None else self.deadline - time.monotonic()
+
+    def expired(self) -> bool:
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def cancelled(self) -> bool:
+        return self.client_disconnected is not None and bool(self.client_disconnected())
+
+
+class DecodingPlan:
+    """Decoding parameters of one batch: beam width, time limit of generate and why they were chosen"""
+
+    def __init__(self, num_beams: int, max_time: float = None, reason: str = 'default'):
+        self.num_beams = num_beams
+        self.max_time = max_time # seconds, None - unlimited
+        self.reason = reason
+
+    def to_dict(self) -> dict:
+        return {"num_beams": self.num_beams,
+                "max_time_ms": None if self.max_time is None else round(1000 * self.max_time),
+                "reason": self.reason}
+
+
+class DecodingPolicy:
+    """
+    Chooses decoding parameters from the input, the deadlines of requests and the load of the service.
+
+    - Output limit of a text: input tokens * ratio of the language pair (or default_ratio) + extra,
+      but not more than max_tokens.
+    - Beam width: max_beams while the translation queue is short, one beam less when it is busy
+      (pressure >= busy_pressure) and greedy decoding when it is saturated (pressure >= saturated_pressure).
+      A batch with a deadline gets fewer beams if the estimated generate time does not fit into it;
+      the estimate is a moving average of observed seconds per (input symbol * beam) of the longest text.
+    - Time limit: if every text of a batch has a deadline, generate stops at the latest of them.
+    """
+
+    def __init__(self, max_beams: int = 3, length_ratios: Dict[Tuple[str, str], float] = None,
+                 default_ratio: float = 2.0, extra_tokens: int = 10, max_tokens: int = 512,
+                 busy_pressure: float = 0.25, saturated_pressure: float = 0.75):
+        self.max_beams = max(1, max_beams)
+        self.length_ratios = dict(length_ratios or {})
+        self.default_ratio = default_ratio
+        self.extra_tokens = extra_tokens
+        self.max_tokens = max_tokens
+        self.busy_pressure = busy_pressure
+        self.saturated_pressure = saturated_pressure
+        self._lock = threading.Lock()
+        self._unit_seconds = None # seconds per input symbol and beam
+
+    def max_new_tokens(self, input_tokens: int, source_lang: str = None, target_lang: str = None) -> int:
+        """Output limit of a text derived from its input length and the language pair"""
+        ratio = self.length_ratios.get((source_lang, target_lang), self.default_ratio)
+        return min(self.max_tokens, int(input_tokens * ratio) + self.extra_tokens)
+
+    def estimate(self, longest_chars: int, num_beams: int) -> Optional[float]:
+        """Expected seconds of a batch, None until the first batch is observed"""
+        unit = self._unit_seconds
+        return None if unit is None else unit * max(1, longest_chars) * num_beams
+
+    def observe(self, seconds: float, longest_chars: int, num_beams: int):
+        unit = seconds / (max(1, longest_chars) * num_beams)
+        with self._lock:
+            self._unit_seconds = unit if self._unit_seconds is None else 0.8 * self._unit_seconds + 0.2 * unit
+
+    def plan(self, remaining: List[Optional[float]], pressure: float, longest_chars: int) -> DecodingPlan:
+        """
+        Plan of a batch. remaining - seconds left for every text of the batch (None - no deadline),
+        pressure - share of the translation queue in use (0..1).
+        """
+        if pressure >= self.saturated_pressure:
+            num_beams, reason = 1, 'saturated'
+        elif pressure >= self.busy_pressure:
+            num_beams, reason = max(1, self.max_beams - 1), 'busy'
+        else:
+            num_beams, reason = self.max_beams, 'default'
+
+        deadlines = [seconds for seconds in remaining if seconds is not None]
+        if deadlines:
+            budget = min(deadlines)
+            while num_beams > 1:
+                estimate = self.estimate(longest_chars, num_beams)
+                if estimate is None or estimate <= budget:
+                    break
+                num_beams, reason = num_beams - 1, 'deadline'
+
+        # Nobody waits for the result after the last deadline, texts without a deadline must not be cut off
+        max_time = max(deadlines) if deadlines and len(deadlines) == len(remaining) else None
+        return DecodingPlan(num_beams, max_time, reason)
+
+    def status(self) -> dict:
+        return {"max_beams": self.max_beams,
+                "busy_pressure": self.busy_pressure,
+                "saturated_pressure": self.saturated_pressure,
+                "ms_per_symbol_and_beam": None if self._unit_seconds is None else round(1000 * self._unit_seconds, 4),
+                "length_ratios": {f"{source}-{target}": ratio for (source, target), ratio in self.length_ratios.items()}}
+
+
+def parse_length_ratios(value: str) -> Dict[Tuple[str, str], float]:
+    """'zh-en:1.5, en-ja:2.5' -> {('zh', 'en'): 1.5, ('en', 'ja'): 2.5}"""
+    ratios = {}
+    for item in value.split(','):
+        if not item.strip():
+            continue
+        pair, ratio = item.split(':')
+        source_lang, target_lang = pair.strip().split('-')
+        ratios[(source_lang, target_lang)] = float(ratio)
+    return ratios
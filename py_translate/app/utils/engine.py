@@ -0,0 +1,381 @@
+import argparse
+import contextlib
+import json
+import math
+import mmap
+import os
+import re
+import time
+from collections import Counter
+from typing import List, Tuple
+
+import logging
+
+logger = logging.getLogger(__name__) # getting root logger
+if not logging.getLogger().hasHandlers():
+    print("ERROR: Root logger had no handlers. Logging unavailable.")
+
+# Inference engine modes -----------------------------------------------------------------------------------------------
+FP32 = 'fp32'   # full precision (default)
+INT8 = 'int8'   # dynamic int8 quantization of Linear layers (CPU)
+BF16 = 'bf16'   # bfloat16 weights and autocast (CPU with avx512_bf16/amx, or CUDA)
+ENGINE_MODES = (FP32, INT8, BF16)
+
+
+def bf16_supported(device: str) -> bool:
+    import torch
+
+    if device == 'cuda':
+        return torch.cuda.is_bf16_supported()
+    check = getattr(torch.cpu, '_is_avx512_bf16_supported', None) # no public API for the CPU flag yet
+    if check is not None and check():
+        return True
+    try:
+        with open('/proc/cpuinfo', 'r') as file:
+            flags = file.read()
+        return 'avx512_bf16' in flags or 'amx_bf16' in flags
+    except OSError:
+        return False
+
+
+def _quantized_path(source: str, cache_dir: str) -> str:
+    safe_name = re.sub(r'[^A-Za-z0-9_.-]+', '--', source.strip('/\\'))
+    return os.path.join(cache_dir, 'quantized', f'{safe_name}.int8.pt')
+
+
+def mmap_root(cache_dir: str) -> str:
+    """Directory of the snapshots whose weights are memory mapped"""
+    return os.path.join(cache_dir, 'mmap')
+
+
+def _mmap_dir(source: str, cache_dir: str, engine_mode: str) -> str:
+    safe_name = re.sub(r'[^A-Za-z0-9_.-]+', '--', source.strip('/\\'))
+    return os.path.join(mmap_root(cache_dir), f'{safe_name}.{engine_mode}')
+
+
+_WEIGHTS_FILE = 'model.safetensors'
+_SAFETENSORS_DTYPES = {'F64': 'float64', 'F32': 'float32', 'F16': 'float16', 'BF16': 'bfloat16',
+                       'I64': 'int64', 'I32': 'int32', 'I16': 'int16', 'I8': 'int8', 'U8': 'uint8', 'BOOL': 'bool'}
+
+
+def save_mmap_snapshot(model, path: str):
+    """
+    Writes config, generation config and all tensors of the model (parameters and every buffer, tied
+    weights once, with their aliases in the metadata) to path as safetensors, for load_mmap_snapshot.
+    Files appear one by one with os.replace, the weights file last, so its presence means a complete snapshot.
+    """
+    from safetensors.torch import save_file
+
+    tensors, aliases, canonical = {}, {}, {}
+    named = list(model.named_parameters(remove_duplicate=False)) + list(model.named_buffers(remove_duplicate=False))
+    for name, tensor in named:
+        key = (tensor.data_ptr(), tuple(tensor.shape), tensor.dtype)
+        if key in canonical:
+            aliases[name] = canonical[key] # tied weights are stored once
+        else:
+            canonical[key] = name
+            tensors[name] = tensor.detach().contiguous()
+
+    tmp_dir = f'{path}.tmp{os.getpid()}'
+    os.makedirs(tmp_dir, exist_ok=True)
+    model.config.save_pretrained(tmp_dir)
+    if getattr(model, 'generation_config', None) is not None:
+        model.generation_config.save_pretrained(tmp_dir)
+    save_file(tensors, os.path.join(tmp_dir, _WEIGHTS_FILE), metadata={'aliases': json.dumps(aliases)})
+
+    os.makedirs(path, exist_ok=True)
+    names = sorted(os.listdir(tmp_dir), key=lambda name: name == _WEIGHTS_FILE)
+    for name in names:
+        os.replace(os.path.join(tmp_dir, name), os.path.join(path, name)) # other processes never see a half written file
+    os.rmdir(tmp_dir)
+
+
+def load_mmap_snapshot(path: str):
+    """
+    Builds the model of a snapshot on the meta device and points its parameters and buffers at a private
+    read-only mapping of the weights file: nothing is copied, pages come from the page cache and are
+    shared by every process of the host which maps the same file.
+    """
+    import torch
+    from transformers import AutoConfig, AutoModelForSeq2SeqLM, GenerationConfig
+
+    weights_path = os.path.join(path, _WEIGHTS_FILE)
+    with open(weights_path, 'rb') as file:
+        header_size = int.from_bytes(file.read(8), 'little')
+        header = json.loads(file.read(header_size))
+        mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_COPY) # MAP_PRIVATE, the file is never written
+    metadata = header.pop('__metadata__', None) or {}
+    data_start = 8 + header_size
+
+    tensors = {}
+    for name, info in header.items():
+        dtype = getattr(torch, _SAFETENSORS_DTYPES[info['dtype']])
+        begin, end = info['data_offsets']
+        count = (end - begin) // torch.empty((), dtype=dtype).element_size()
+        if count == 0:
+            tensors[name] = torch.empty(info['shape'], dtype=dtype)
+        else:
+            tensors[name] = torch.frombuffer(mapped, dtype=dtype, count=count, offset=data_start + begin).view(info['shape'])
+    for name, target in json.loads(metadata.get('aliases', '{}')).items():
+        tensors[name] = tensors[target]
+
+    config = AutoConfig.from_pretrained(path)
+    with torch.device('meta'):
+        model = AutoModelForSeq2SeqLM.from_config(config)
+    if os.path.exists(os.path.join(path, 'generation_config.json')):
+        model.generation_config = GenerationConfig.from_pretrained(path)
+
+    shared = {} # tensor -> Parameter, so tied weights stay one Parameter
+    for name, tensor in tensors.items():
+        module_name, _, attribute = name.rpartition('.')
+        module = model.get_submodule(module_name)
+        if attribute in module._parameters:
+            if id(tensor) not in shared:
+                shared[id(tensor)] = torch.nn.Parameter(tensor, requires_grad=False)
+            module._parameters[attribute] = shared[id(tensor)]
+        else:
+            module._buffers[attribute] = tensor
+    missing = [name for name, tensor in list(model.named_parameters()) + list(model.named_buffers()) if tensor.is_meta]
+    if missing:
+        raise ValueError(f"Snapshot {path} has no values for {', '.join(missing[:5])}")
+    return model
+
+
+def _load_mapped(source: str, cache_dir: str, engine_mode: str):
+    # Model mapped from its snapshot, which is written from the regular model on first use
+    import torch
+    from transformers import AutoModelForSeq2SeqLM
+
+    path = _mmap_dir(source, cache_dir, engine_mode)
+    if not os.path.exists(os.path.join(path, _WEIGHTS_FILE)):
+        model = AutoModelForSeq2SeqLM.from_pretrained(source, cache_dir=cache_dir)
+        if engine_mode == BF16:
+            model = model.to(torch.bfloat16)
+        save_mmap_snapshot(model, path)
+        logger.info(f"Model snapshot for memory mapping saved to {path}")
+        del model
+    model = load_mmap_snapshot(path)
+    logger.info(f"Model weights mapped from {path}")
+    return model
+
+
+def load_model(source: str, cache_dir: str, device: str, engine_mode: str = FP32, compile_model: bool = False,
+               weights_mmap: bool = False):
+    """
+    Loads a seq2seq model prepared for engine_mode. Returns (model, effective engine mode).
+
+    The int8 model is cached under cache_dir/quantized: on the next start an empty model is built from config,
+    quantized and filled from the cached state dict, so fp32 weights are never loaded again.
+    With weights_mmap (fp32 and bf16 on CPU) the weights are converted once into a safetensors snapshot
+    under cache_dir/mmap and mapped read-only, so all processes of the host share one copy in the page cache.
+    Unsupported modes fall back to fp32 with a warning.
+    """
+    import torch
+    from transformers import AutoConfig, AutoModelForSeq2SeqLM
+
+    if engine_mode not in ENGINE_MODES:
+        logger.warning(f"Unknown engine mode {engine_mode}, using {FP32}")
+        engine_mode = FP32
+    if engine_mode == INT8 and device != 'cpu':
+        logger.warning(f"Engine mode {INT8} is supported on CPU only, using {FP32}")
+        engine_mode = FP32
+    if engine_mode == BF16 and not bf16_supported(device):
+        logger.warning(f"Engine mode {BF16} is not supported by this {device.upper()}, using {FP32}")
+        engine_mode = FP32
+
+    if weights_mmap and (engine_mode == INT8 or device != 'cpu'):
+        logger.warning(f"Memory mapped weights are supported for {FP32} and {BF16} on CPU only, loading a private copy")
+        weights_mmap = False
+
+    if weights_mmap:
+        model = _load_mapped(source, cache_dir, engine_mode)
+    elif engine_mode == INT8:
+        quantized_path = _quantized_path(source, cache_dir)
+        if os.path.exists(quantized_path):
+            config = AutoConfig.from_pretrained(source, cache_dir=cache_dir)
+            model = AutoModelForSeq2SeqLM.from_config(config)
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+            model.load_state_dict(torch.load(quantized_path, map_location='cpu'))
+            logger.info(f"Quantized model loaded from {quantized_path}")
+        else:
+            model = AutoModelForSeq2SeqLM.from_pretrained(source, cache_dir=cache_dir)
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+            os.makedirs(os.path.dirname(quantized_path), exist_ok=True)
+            tmp_path = quantized_path + '.tmp'
+            torch.save(model.state_dict(), tmp_path)
+            os.replace(tmp_path, quantized_path) # other processes never see a half written file
+            logger.info(f"Quantized model saved to {quantized_path}")
+    else:
+        model = AutoModelForSeq2SeqLM.from_pretrained(source, cache_dir=cache_dir)
+        if engine_mode == BF16:
+            model = model.to(torch.bfloat16)
+    model = model.to(device)
+    model.eval()
+
+    if compile_model:
+        try:
+            model.forward = torch.compile(model.forward, dynamic=True) # generate() keeps its python loop
+        except Exception as e:
+            logger.warning(f"torch.compile is not available: {type(e).__name__}: {e}")
+
+    return model, engine_mode
+
+
+def autocast(loaded):
+    """Context manager for generate() of a LoadedModel: bf16 autocast or nothing"""
+    if getattr(loaded, 'engine_mode', FP32) != BF16:
+        return contextlib.nullcontext()
+    import torch
+    return torch.autocast(device_type=loaded.device, dtype=torch.bfloat16)
+
+
+def model_size_bytes(model) -> int:
+    """Size of weights, including packed int8 weights which are not parameters"""
+    import torch
+
+    size = 0
+    for value in model.state_dict().values():
+        values = value if isinstance(value, (tuple, list)) else (value,)
+        for tensor in values:
+            if isinstance(tensor, torch.Tensor):
+                size += tensor.numel() * tensor.element_size()
+    return size
+
+
+def _weights_bytes(directory: str) -> int:
+    # Size of the weight files of a checkpoint directory, safetensors preferred like transformers does
+    sizes = {'.safetensors': 0, '.bin': 0}
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return 0
+    for name in names:
+        extension = os.path.splitext(name)[1]
+        if extension in sizes:
+            sizes[extension] += os.path.getsize(os.path.join(directory, name)) # follows hub cache symlinks
+    return sizes['.safetensors'] or sizes['.bin']
+
+
+def estimate_size_bytes(source: str, cache_dir: str, engine_mode: str = FP32) -> int:
+    """
+    Expected size of the weights of a model which is not loaded yet, from the files it will be loaded from:
+    the cached int8 state dict, the memory mapped snapshot, or the checkpoint (local directory or hub cache).
+    0 when nothing is downloaded yet.
+    """
+    if engine_mode == INT8 and os.path.exists(_quantized_path(source, cache_dir)):
+        return os.path.getsize(_quantized_path(source, cache_dir))
+    snapshot = _weights_bytes(_mmap_dir(source, cache_dir, engine_mode))
+    if snapshot:
+        return snapshot
+    if os.path.isdir(source):
+        size = _weights_bytes(source)
+    else: # hub cache: <cache_dir>/models--<org>--<name>/snapshots/<revision>/
+        snapshots = os.path.join(cache_dir, 'models--' + source.replace('/', '--'), 'snapshots')
+        try:
+            revisions = os.listdir(snapshots)
+        except OSError:
+            revisions = []
+        size = max((_weights_bytes(os.path.join(snapshots, revision)) for revision in revisions), default=0)
+    return size // 2 if engine_mode == BF16 else size # checkpoints are fp32
+
+
+# Parity check: python -m app.utils.engine --mode int8 ----------------------------------------------------------------
+_PARITY_SAMPLES = [
+    ("en", "de", "The weather is nice today, so we are going for a walk in the park."),
+    ("en", "fr", "Please restart the application to apply the new settings."),
+    ("en", "ru", "Your order has been shipped and will arrive within three business days."),
+    ("de", "en", "Die Sitzung wurde wegen technischer Probleme auf morgen verschoben."),
+    ("fr", "en", "Le musée est fermé le lundi et ouvert tous les autres jours."),
+    ("ru", "en", "Мы благодарим вас за терпение и приносим извинения за задержку."),
+    ("es", "en", "El informe anual se publicará a finales de marzo."),
+    ("en", "zh", "Click the button below to download the latest version."),
+    ("uk", "en", "Бібліотека працює щодня з дев'ятої ранку до шостої вечора."),
+    ("en", "ja", "We could not find any results matching your search."),
+]
+
+
+def _ngrams(tokens: List[str], n: int) -> Counter:
+    return Counter(tuple(tokens[i:i + n]) for i in range(len(tokens) - n + 1))
+
+
+def _tokens(text: str) -> List[str]:
+    # Word tokens, CJK symbols one by one
+    return re.findall(r'[぀-ヿ㐀-鿿]|\w+|[^\w\s]', text.lower())
+
+
+def corpus_bleu(hypotheses: List[str], references: List[str], max_n: int = 4) -> float:
+    """Simple corpus BLEU (0..100) with uniform weights and brevity penalty, no smoothing tricks"""
+    matches, totals = [0] * max_n, [0] * max_n
+    hyp_length = ref_length = 0
+    for hypothesis, reference in zip(hypotheses, references):
+        hyp, ref = _tokens(hypothesis), _tokens(reference)
+        hyp_length, ref_length = hyp_length + len(hyp), ref_length + len(ref)
+        for n in range(1, max_n + 1):
+            hyp_ngrams, ref_ngrams = _ngrams(hyp, n), _ngrams(ref, n)
+            matches[n - 1] += sum(min(count, ref_ngrams[gram]) for gram, count in hyp_ngrams.items())
+            totals[n - 1] += max(0, len(hyp) - n + 1)
+    if not hyp_length or min(matches) == 0:
+        return 0.0
+    log_precision = sum(math.log(match / total) for match, total in zip(matches, totals)) / max_n
+    brevity = 1.0 if hyp_length > ref_length else math.exp(1 - ref_length / hyp_length)
+    return round(100 * brevity * math.exp(log_precision), 2)
+
+
+def _translate_all(loaded, samples: List[Tuple[str, str, str]]) -> Tuple[List[str], float]:
+    from app.utils.inference import translate_batch
+
+    started = time.perf_counter()
+    translations = [translate_batch(loaded, target, [(text, source)])[0] for source, target, text in samples]
+    return translations, time.perf_counter() - started
+
+
+def parity_check(source: str, cache_dir: str, engine_mode: str, compile_model: bool = False,
+                 samples: List[Tuple[str, str, str]] = None) -> dict:
+    """Translates samples with fp32 and with engine_mode, reports agreement (BLEU vs fp32) and speed"""
+    from app.utils.model_registry import LoadedModel, load_seq2seq
+
+    samples = samples or _PARITY_SAMPLES
+    report = {"model": source, "engine_mode": engine_mode, "samples": len(samples)}
+    outputs = {}
+    for mode, use_compile in ((FP32, False), (engine_mode, compile_model)):
+        started = time.perf_counter()
+        tokenizer, model, device, effective_mode = load_seq2seq(source, cache_dir, mode, use_compile)
+        loaded = LoadedModel(source, tokenizer, model, device, time.perf_counter() - started, effective_mode)
+        _translate_all(loaded, samples[:1]) # warm-up
+        translations, seconds = _translate_all(loaded, samples)
+        outputs[mode] = translations
+        report[mode] = {"effective_mode": effective_mode, "load_seconds": round(loaded.load_seconds, 2),
+                        "size_mb": round(loaded.size_bytes / 2**20, 1), "seconds": round(seconds, 3)}
+        del loaded, model
+
+    reference, candidate = outputs[FP32], outputs[engine_mode]
+    report["exact_match"] = round(sum(a == b for a, b in zip(reference, candidate)) / len(samples), 4)
+    report["bleu_vs_fp32"] = corpus_bleu(candidate, reference)
+    report["speedup"] = round(report[FP32]["seconds"] / report[engine_mode]["seconds"], 2) \
+        if report[engine_mode]["seconds"] else None
+    report["differences"] = [{"source": text, FP32: a, engine_mode: b}
+                             for (_, _, text), a, b in zip(samples, reference, candidate) if a != b]
+    return report
+
+
+def main(argv=None):
+    from app.settings import MODELS_CACHE_DIR, SELECTED_MODEL, ENGINE_MODE, ENGINE_COMPILE
+
+    parser = argparse.ArgumentParser(description='Compare an inference engine mode with fp32')
+    parser.add_argument('--mode', choices=ENGINE_MODES, default=ENGINE_MODE)
+    parser.add_argument('--compile', action='store_true', default=ENGINE_COMPILE, help='use torch.compile')
+    parser.add_argument('--model', default=SELECTED_MODEL)
+    parser.add_argument('--samples', help='NDJSON file with {"source", "target", "text"} lines')
+    args = parser.parse_args(argv)
+
+    samples = None
+    if args.samples:
+        with open(args.samples, 'r', encoding='utf-8') as file:
+            rows = [json.loads(line) for line in file if line.strip()]
+        samples = [(row["source"], row["target"], row["text"]) for row in rows]
+    report = parity_check(args.model, MODELS_CACHE_DIR, args.mode, args.compile, samples)
+    logger.info(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,290 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple, Union
+
+from app.utils.result_cache import ResultCache
+
+import logging
+
+logger = logging.getLogger(__name__) # getting root logger
+if not logging.getLogger().hasHandlers():
+    print("ERROR: Root logger had no handlers. Logging unavailable.")
+
+
+class GlossaryError(ValueError):
+    """Raised for a glossary in a wrong format, an unknown glossary id or an unknown protected pattern."""
+    pass
+
+
+class TermMatcher:
+    """
+    Aho-Corasick automaton of many terms: all occurrences are found in one pass over the text,
+    whatever the number of terms. Matches are leftmost-longest, do not overlap and do not cut words
+    (a term that starts or ends with a letter or digit must not continue a word of the text).
+    """
+
+    def __init__(self, terms: Iterable[str], case_sensitive: bool = True):
+        self.case_sensitive = case_sensitive
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._term: List[int] = [-1] # index of the term which ends in the state, -1 - none
+        self._link: List[int] = [0] # nearest state on the fail chain with a term (dictionary suffix link)
+        self.lengths: List[int] = []
+
+        for index, term in enumerate(terms):
+            state = 0
+            for char in self._fold(term):
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._term.append(-1)
+                    self._link.append(0)
+                state = next_state
+            self._term[state] = index
+            self.lengths.append(len(term))
+
+        queue = list(self._goto[0].values()) # breadth first: fail links of shorter prefixes are ready first
+        for state in queue:
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                fail = self._goto[fail].get(char, 0)
+                self._fail[next_state] = fail if fail != next_state else 0
+                self._link[next_state] = fail if self._term[fail] >= 0 else self._link[fail]
+
+    def _fold(self, text: str) -> str:
+        if self.case_sensitive:
+            return text
+        folded = text.lower()
+        if len(folded) == len(text):
+            return folded
+        return ''.join(char if len(char.lower()) != 1 else char.lower() for char in text) # offsets must not move
+
+    def find(self, text: str) -> List[Tuple[int, int, int]]:
+        """(start, end, term index) of the matches in text"""
+        goto, fail, term, link, lengths = self._goto, self._fail, self._term, self._link, self.lengths
+        longest: Dict[int, Tuple[int, int]] = {} # start -> (end, term index)
+        state = 0
+        for position, char in enumerate(self._fold(text)):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            found = state if term[state] >= 0 else link[state]
+            while found:
+                index = term[found]
+                start = position + 1 - lengths[index]
+                if _on_word_boundaries(text, start, position + 1) and (start not in longest
+                                                                      or longest[start][0] < position + 1):
+                    longest[start] = (position + 1, index)
+                found = link[found]
+
+        matches, covered = [], 0
+        for start in sorted(longest):
+            end, index = longest[start]
+            if start >= covered:
+                matches.append((start, end, index))
+                covered = end
+        return matches
+
+
+def _on_word_boundaries(text: str, start: int, end: int) -> bool:
+    if start > 0 and text[start].isalnum() and text[start - 1].isalnum():
+        return False
+    if end < len(text) and text[end - 1].isalnum() and text[end].isalnum():
+        return False
+    return True
+
+
+class Glossary:
+    """
+    Terms which must survive translation: kept as they are, or replaced by a fixed translation
+    (one for all target languages or one per language).
+
+    Formats (JSON): ["Acme Cloud", "SKU-1234"] - do not translate;
+    {"Acme Cloud": null, "checkout": {"de": "Kasse", "fr": "caisse"}, "Widget": "Widget"} - per term;
+    {"terms": <one of the above>, "caseSensitive": false} - with options.
+    """
+
+    def __init__(self, terms: Dict[str, Optional[Union[str, Dict[str, str]]]], case_sensitive: bool = True):
+        self.terms = list(terms)
+        self.translations = list(terms.values())
+        self.matcher = TermMatcher(self.terms, case_sensitive)
+
+    @classmethod
+    def from_json(cls, data, max_terms: int = 0) -> 'Glossary':
+        case_sensitive = True
+        if isinstance(data, dict) and 'terms' in data:
+            case_sensitive = data.get('caseSensitive', True)
+            if not isinstance(case_sensitive, bool):
+                raise GlossaryError("Glossary caseSensitive must be true or false.")
+            data = data['terms']
+        if isinstance(data, list):
+            data = dict.fromkeys(data)
+        if not isinstance(data, dict):
+            raise GlossaryError("Glossary must be a list of terms or an object of term: translation.")
+        if max_terms and len(data) > max_terms:
+            raise GlossaryError(f"Too many glossary terms: {len(data)}. Maximum is {max_terms}.")
+        for term, translation in data.items():
+            if not isinstance(term, str) or not term.strip():
+                raise GlossaryError("Glossary terms must be non-empty strings.")
+            if translation is not None and not isinstance(translation, str) and not (
+                    isinstance(translation, dict) and all(isinstance(value, str) for value in translation.values())):
+                raise GlossaryError(f"Translation of glossary term {term} must be a string or an object of language: string.")
+        return cls(data, case_sensitive)
+
+    def replacement(self, index: int, original: str, target_lang: str) -> str:
+        """Text of a matched term in the translation into target_lang"""
+        translation = self.translations[index]
+        if isinstance(translation, dict):
+            translation = translation.get(target_lang)
+        return translation or original
+
+
+# Spans protected without a glossary, chosen by "protect" of a request
+PROTECTED_PATTERNS = {
+    'url': r'\b(?:https?://|www\.)[^\s<>"]+[^\s<>".,;:!?)\]}\'»]',
+    'email': r'\b[\w.+-]+@[\w-]+(?:\.[\w-]+)+\b',
+    'placeholder': r'\{\{\s*[\w.]+\s*\}\}|\{[\w.]*\}|%\(\w+\)[sd]|%[sd]|\$\{\w+\}',
+    'code': r'\b(?=[A-Z0-9_-]*\d)[A-Z0-9]+(?:[-_][A-Z0-9]+)+\b', # SKU-like: ABC-1234, X2_500
+}
+
+# Masked spans are replaced by [index]; such strings in the source text are protected as well,
+# so every [index] in a translation is one of ours
+_SENTINEL = '[{}]'
+_SENTINEL_SOURCE_RE = r'\[\d+\]'
+_SENTINEL_RE = re.compile(r'\[\s*(\d+)\s*\]')
+
+_pattern_cache: Dict[FrozenSet[str], re.Pattern] = {}
+
+
+def _patterns_re(names: FrozenSet[str]) -> re.Pattern:
+    # One alternation of the chosen patterns (and of sentinel-like source text), compiled once per combination
+    compiled = _pattern_cache.get(names)
+    if compiled is None:
+        alternatives = [PROTECTED_PATTERNS[name] for name in sorted(names)] + [_SENTINEL_SOURCE_RE]
+        compiled = _pattern_cache[names] = re.compile('|'.join(f'(?:{pattern})' for pattern in alternatives))
+    return compiled
+
+
+class Protector:
+    """
+    Masks protected spans (glossary terms and patterns) of a text with sentinels before translation
+    and puts them (or their glossary translations) back into the translation.
+    """
+
+    def __init__(self, glossaries: List[Glossary] = (), patterns: Iterable[str] = ()):
+        self.glossaries = list(glossaries)
+        self.patterns = frozenset(patterns)
+        unknown = self.patterns - PROTECTED_PATTERNS.keys()
+        if unknown:
+            raise GlossaryError(f"Unknown protected pattern(s): {', '.join(sorted(unknown))}. "
+                                f"Supported: {', '.join(sorted(PROTECTED_PATTERNS))}.")
+        self._re = _patterns_re(self.patterns)
+
+    def mask(self, text: str) -> Tuple[str, list]:
+        """Returns (masked text, spans); a span is (original text, glossary or None, term index)"""
+        candidates = [(match.start(), match.end(), None, -1) for match in self._re.finditer(text)]
+        for glossary in self.glossaries:
+            candidates.extend((start, end, glossary, index) for start, end, index in glossary.matcher.find(text))
+        if not candidates:
+            return text, []
+
+        candidates.sort(key=lambda candidate: (candidate[0], candidate[0] - candidate[1])) # leftmost, then longest
+        parts, spans, position = [], [], 0
+        for start, end, glossary, index in candidates:
+            if start < position:
+                continue
+            parts.append(text[position:start])
+            parts.append(_SENTINEL.format(len(spans)))
+            spans.append((text[start:end], glossary, index))
+            position = end
+        parts.append(text[position:])
+        return ''.join(parts), spans
+
+    @staticmethod
+    def restore(translation: str, spans: list, target_lang: str) -> str:
+        """
+        Replaces sentinels of the translation by the protected spans; spans whose sentinel the model
+        dropped are appended at the end, so protected content is never lost.
+        """
+        if not spans:
+            return translation
+        used = set()
+
+        def span_text(index):
+            original, glossary, term_index = spans[index]
+            return original if glossary is None else glossary.replacement(term_index, original, target_lang)
+
+        def replace(match):
+            index = int(match.group(1))
+            if index >= len(spans):
+                return match.group(0)
+            used.add(index)
+            return span_text(index)
+
+        restored = _SENTINEL_RE.sub(replace, translation)
+        lost = [index for index in range(len(spans)) if index not in used]
+        if lost:
+            logger.warning(f"Translation lost {len(lost)} protected span(s), they are appended")
+            restored = ' '.join([restored] + [span_text(index) for index in lost])
+        return restored
+
+
+class GlossaryStore:
+    """
+    Compiled glossaries: preloaded ones are read from directory/<id>.json on first use (and again when
+    the file changes), inline glossaries of requests are cached by their content. Both live in an LRU
+    cache, so large term lists are parsed and compiled once.
+    """
+
+    _ID_RE = re.compile(r'^[A-Za-z0-9_.-]{1,100}$')
+
+    def __init__(self, directory: str, max_entries: int = 100, max_terms: int = 0):
+        self.directory = directory
+        self.max_terms = max_terms
+        self._cache = ResultCache(max_entries=max_entries, name='glossaries')
+        self._lock = threading.Lock() # one thread compiles a glossary, the others wait for it
+
+    def get(self, glossary_id: str) -> Glossary:
+        if not isinstance(glossary_id, str) or not self._ID_RE.match(glossary_id) or glossary_id.startswith('.'):
+            raise GlossaryError(f"Invalid glossary id: {glossary_id}")
+        path = os.path.join(self.directory, f'{glossary_id}.json')
+        try:
+            modified = os.path.getmtime(path)
+        except OSError:
+            raise GlossaryError(f"Unknown glossary: {glossary_id}")
+        key = ('id', glossary_id, modified)
+        glossary = self._cache.get(key)
+        if glossary is None:
+            with self._lock:
+                glossary = self._cache.get(key)
+                if glossary is None:
+                    try:
+                        with open(path, 'r', encoding='utf-8') as file:
+                            data = json.load(file)
+                    except (OSError, ValueError) as e:
+                        raise GlossaryError(f"Glossary {glossary_id} can not be read: {e}")
+                    glossary = Glossary.from_json(data, self.max_terms)
+                    self._cache.put(key, glossary)
+                    logger.info(f"Glossary {glossary_id} compiled: {len(glossary.terms)} term(s)")
+        return glossary
+
+    def inline(self, data) -> Glossary:
+        """Glossary given in a request, compiled once per distinct content"""
+        key = ('inline', hashlib.sha1(json.dumps(data, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest())
+        glossary = self._cache.get(key)
+        if glossary is None:
+            glossary = Glossary.from_json(data, self.max_terms)
+            self._cache.put(key, glossary)
+        return glossary
+
+    def stats(self) -> dict:
+        return self._cache.stats()
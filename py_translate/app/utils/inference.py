@@ -0,0 +1,362 @@
+import bisect
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Iterator, List
+from app.settings import (MAX_OUTPUT_TOKENS, OUTPUT_LENGTH_RATIO, OUTPUT_LENGTH_EXTRA, OUTPUT_LENGTH_RATIOS,
+                          LENGTH_BUCKETS, ENCODE_CACHE_ENTRIES,
+                          DECODING_MAX_BEAMS, DECODING_BUSY_PRESSURE, DECODING_SATURATED_PRESSURE)
+from app.utils.decoding_policy import DecodingPolicy, DecodingPlan, DeadlineExceededError
+from app.utils.engine import autocast
+from app.utils.result_cache import ResultCache
+from app.utils.metrics import registry as metrics_registry, TOKENS, BATCHES, PADDING_TOKENS, stage
+
+import logging
+
+logger = logging.getLogger(__name__) # getting root logger
+if not logging.getLogger().hasHandlers():
+    print("ERROR: Root logger had no handlers. Logging unavailable.")
+
+
+def max_new_tokens(input_tokens: int, source_lang: str = None, target_lang: str = None) -> int:
+    """Output limit of a segment derived from its input length and the language pair"""
+    return decoding_policy.max_new_tokens(input_tokens, source_lang, target_lang)
+
+
+class PaddingStats:
+    """
+    Counters of real and padded input tokens, padding efficiency = real / padded.
+    With export the counts also go to /metrics (the stats of the service; not warm-up or per-batch stats of workers).
+    """
+
+    def __init__(self, export: bool = False):
+        self.export = export
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.generate_calls = 0
+        self.real_tokens = 0
+        self.padded_tokens = 0
+        self.unbucketed_padded_tokens = 0 # padded tokens if every batch ran as one generate call
+
+    def add(self, batches: int, generate_calls: int, real: int, padded: int, unbucketed: int):
+        with self._lock:
+            self.batches += batches
+            self.generate_calls += generate_calls
+            self.real_tokens += real
+            self.padded_tokens += padded
+            self.unbucketed_padded_tokens += unbucketed
+        if self.export:
+            BATCHES.inc('batch', amount=batches)
+            BATCHES.inc('generate_call', amount=generate_calls)
+            PADDING_TOKENS.inc('real', amount=real)
+            PADDING_TOKENS.inc('padded', amount=padded)
+            PADDING_TOKENS.inc('unbucketed_padded', amount=unbucketed)
+
+    def raw(self) -> tuple:
+        return self.batches, self.generate_calls, self.real_tokens, self.padded_tokens, self.unbucketed_padded_tokens
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "generate_calls": self.generate_calls,
+                "real_tokens": self.real_tokens,
+                "padded_tokens": self.padded_tokens,
+                "padding_efficiency": round(self.real_tokens / self.padded_tokens, 4) if self.padded_tokens else 1.0,
+                "unbucketed_padding_efficiency": round(self.real_tokens / self.unbucketed_padded_tokens, 4)
+                if self.unbucketed_padded_tokens else 1.0,
+            }
+
+
+class LengthHistogram:
+    """Observed input token counts. Automatic bucket boundaries are quartiles of the traffic"""
+
+    DEFAULT_BOUNDARIES = [16, 32, 64, 128]
+
+    def __init__(self, min_samples: int = 200, refresh_every: int = 1000):
+        self._lock = threading.Lock()
+        self._counts = Counter()
+        self._total = 0
+        self._since_refresh = 0
+        self.min_samples = min_samples
+        self.refresh_every = refresh_every
+        self._boundaries = list(self.DEFAULT_BOUNDARIES)
+
+    def observe(self, lengths: List[int]):
+        with self._lock:
+            self._counts.update(lengths)
+            self._total += len(lengths)
+            self._since_refresh += len(lengths)
+            if self._total >= self.min_samples and self._since_refresh >= min(self.refresh_every, self._total):
+                self._since_refresh = 0
+                self._boundaries = self._quantiles([0.25, 0.5, 0.75])
+
+    def _quantiles(self, fractions: List[float]) -> List[int]:
+        boundaries, seen = [], 0
+        targets = [fraction * self._total for fraction in fractions]
+        for length in sorted(self._counts):
+            seen += self._counts[length]
+            while targets and seen >= targets[0]:
+                targets.pop(0)
+                if not boundaries or boundaries[-1] != length:
+                    boundaries.append(length)
+        return boundaries
+
+    def boundaries(self) -> List[int]:
+        return self._boundaries
+
+
+padding_stats = PaddingStats(export=True)
+length_histogram = LengthHistogram()
+
+
+def _padding_efficiency() -> dict:
+    snapshot = padding_stats.snapshot()
+    return {("bucketed",): snapshot["padding_efficiency"], ("unbucketed",): snapshot["unbucketed_padding_efficiency"]}
+
+
+metrics_registry.gauge('translate_padding_efficiency', 'Real / padded input tokens, with and without length buckets',
+                       ('bucketing',), callback=_padding_efficiency)
+
+# (model name, text) -> token ids without special tokens, shared by all source languages
+encoded_cache = ResultCache(max_entries=ENCODE_CACHE_ENTRIES, name='token_ids')
+
+decoding_policy = DecodingPolicy(max_beams=DECODING_MAX_BEAMS, length_ratios=OUTPUT_LENGTH_RATIOS,
+                                 default_ratio=OUTPUT_LENGTH_RATIO, extra_tokens=OUTPUT_LENGTH_EXTRA,
+                                 max_tokens=MAX_OUTPUT_TOKENS, busy_pressure=DECODING_BUSY_PRESSURE,
+                                 saturated_pressure=DECODING_SATURATED_PRESSURE)
+
+
+def bucket_boundaries() -> List[int]:
+    """Upper token counts of length buckets: from settings, or observed quartiles for 'auto'"""
+    return length_histogram.boundaries() if LENGTH_BUCKETS is None else LENGTH_BUCKETS
+
+
+def _buckets(lengths: List[int]) -> List[List[int]]:
+    # Positions of items grouped by length bucket
+    boundaries = bucket_boundaries()
+    groups = defaultdict(list)
+    for index, length in enumerate(lengths):
+        groups[bisect.bisect_left(boundaries, length)].append(index)
+    return [groups[bucket] for bucket in sorted(groups)]
+
+
+def encode_many(loaded, items) -> List[List[int]]:
+    """
+    Input ids of (text, source language) pairs of a LoadedModel: [source language token] + text ids + [eos].
+    Text ids come from encoded_cache, the missing ones are encoded with one tokenizer call.
+    """
+    tokenizer = loaded.tokenizer
+    keys = [(loaded.name, text) for text, _ in items]
+    pieces = [encoded_cache.get(key) for key in keys]
+    missed = [index for index, piece in enumerate(pieces) if piece is None]
+    if missed:
+        encoded = tokenizer([items[index][0] for index in missed], add_special_tokens=False)["input_ids"]
+        for index, ids in zip(missed, encoded):
+            pieces[index] = tuple(ids)
+            encoded_cache.put(keys[index], pieces[index])
+    return [[tokenizer.lang_code_to_id[source_lang], *piece, tokenizer.eos_token_id]
+            for piece, (_, source_lang) in zip(pieces, items)]
+
+
+def translate_batch(loaded, target_lang, items, stats: PaddingStats = padding_stats, plan: DecodingPlan = None):
+    """
+    Translates (text, source language) pairs of a LoadedModel into target_lang.
+    Texts are grouped into length buckets by their token counts and every bucket runs as its own
+    padded generate call, results are returned in the order of items.
+    target_lang may be a tuple of languages (fan-out): every text is encoded once and decoded into all of them,
+    the result of an item is then a list of translations in the order of target_lang.
+    plan (see DecodingPolicy) sets the beam width and the time limit of the whole batch;
+    the result of an item cut off by the time limit is a DeadlineExceededError (the other items keep their translations).
+    """
+    generate = _generate_fanout if isinstance(target_lang, tuple) else _generate
+    plan = plan or DecodingPlan(decoding_policy.max_beams)
+    deadline = None if plan.max_time is None else time.monotonic() + plan.max_time
+    with stage('tokenize'):
+        input_ids = encode_many(loaded, items)
+    lengths = [len(ids) for ids in input_ids]
+    TOKENS.inc('input', amount=sum(lengths))
+    length_histogram.observe(lengths)
+
+    buckets = _buckets(lengths)
+    translations = [None] * len(items)
+    padded = 0
+    for bucket in buckets:
+        max_time = None if deadline is None else deadline - time.monotonic()
+        if max_time is not None and max_time <= 0:
+            for index in bucket:
+                translations[index] = _cut_off_error()
+            continue
+        for index, translation in zip(bucket, generate(loaded, target_lang, [input_ids[index] for index in bucket],
+                                                       [items[index][1] for index in bucket],
+                                                       plan.num_beams, max_time)):
+            translations[index] = translation
+        padded += len(bucket) * max(lengths[index] for index in bucket)
+
+    stats.add(1, len(buckets), sum(lengths), padded, len(lengths) * max(lengths))
+    targets = ','.join(target_lang) if isinstance(target_lang, tuple) else target_lang
+    logger.debug(f"Batch translated: {len(items)} text(s) in {len(buckets)} bucket(s) ---> {targets} ({loaded.name})")
+    return translations
+
+
+# Texts of typical lengths (a phrase, a sentence, a paragraph) for warm-up generations
+_WARMUP_TEXTS = [
+    "Good morning!",
+    "The meeting has been moved to Thursday afternoon because the conference room is booked.",
+    "Our new service translates documents, web pages and messages between many languages. "
+    "It keeps the formatting of the original text, learns the terms of your company from a glossary "
+    "and answers within a second for most requests, even when many users work with it at the same time.",
+]
+
+
+def warm_up_model(loaded, source_lang: str = 'en', target_lang: str = 'de'):
+    """
+    Dummy generations of typical lengths with every beam width the decoding policy may choose,
+    so that the first real batches do not pay for memory allocator growth and kernel initialization.
+    """
+    items = [(text, source_lang) for text in _WARMUP_TEXTS]
+    for num_beams in sorted({1, max(1, decoding_policy.max_beams - 1), decoding_policy.max_beams}, reverse=True):
+        translate_batch(loaded, target_lang, items, PaddingStats(), DecodingPlan(num_beams)) # not counted in padding stats
+
+
+def _cut_off_rows(outputs, limits, full_length: int, eos_token_id) -> set:
+    """
+    Rows of a generate output stopped by max_time. outputs - generated ids (decoder start, target language, text...),
+    full_length - their length had generate run up to max_new_tokens. A shorter output means that generation stopped
+    early: because every row had finished, or because of max_time, which leaves some rows without eos
+    and below their own token limit. A row which reached its limit is complete, eos or not.
+    """
+    stopped_at = outputs.shape[1] - 2 # generated text tokens of the rows which did not finish
+    if outputs.shape[1] >= full_length:
+        return set()
+    return {row for row, (output, limit) in enumerate(zip(outputs, limits))
+            if stopped_at < limit and not bool((output[2:2 + limit] == eos_token_id).any())}
+
+
+def _cut_off_error() -> DeadlineExceededError:
+    return DeadlineExceededError("Deadline exceeded before the translation was finished")
+
+
+def _generate(loaded, target_lang, input_ids, source_langs, num_beams, max_time):
+    import torch
+
+    tokenizer = loaded.tokenizer
+    inputs = tokenizer.pad({"input_ids": input_ids}, padding=True, return_tensors="pt")
+    inputs = {k: v.to(loaded.model.device) for k, v in inputs.items()}
+
+    # Output limit of every segment is derived from its own input length and language pair
+    limits = [max_new_tokens(len(ids), source_lang, target_lang) for ids, source_lang in zip(input_ids, source_langs)]
+
+    with stage('generate'), torch.no_grad(), autocast(loaded):
+        outputs = loaded.model.generate(
+            **inputs,
+            forced_bos_token_id=tokenizer.lang_code_to_id[target_lang],   # Target language
+            max_new_tokens=max(limits),
+            num_beams=num_beams,
+            max_time=max_time,
+            early_stopping=True,
+            # top_k=30,    # We allow the model to choose from the 30 most likely options
+            # top_p=0.95,  # Nucleus sampling (more creative)
+            #repetition_penalty=1.2  # Avoiding repetitions
+        )
+
+    # outputs start with decoder_start_token and forced target language token (generated as the first new token)
+    cut_off = set() if max_time is None else _cut_off_rows(outputs, limits, 1 + max(limits), tokenizer.eos_token_id)
+    outputs = [output[:2 + limit] for output, limit in zip(outputs, limits)]
+    TOKENS.inc('output', amount=sum(int((output != tokenizer.pad_token_id).sum()) for output in outputs))
+    with stage('decode'):
+        decoded = tokenizer.batch_decode(outputs, skip_special_tokens=True)
+    return [_cut_off_error() if row in cut_off else text for row, text in enumerate(decoded)]
+
+
+def _generate_fanout(loaded, target_langs, input_ids, source_langs, num_beams, max_time):
+    # The encoder runs once per text; its output is repeated for every target language and all
+    # (text, target) rows are decoded together, each row starting with its own target language token.
+    import torch
+    from transformers.modeling_outputs import BaseModelOutput
+
+    tokenizer = loaded.tokenizer
+    model = loaded.model
+    inputs = tokenizer.pad({"input_ids": input_ids}, padding=True, return_tensors="pt")
+    inputs = {k: v.to(model.device) for k, v in inputs.items()}
+
+    row_limits = [max_new_tokens(len(ids), source_lang, target_lang)
+                  for ids, source_lang in zip(input_ids, source_langs) for target_lang in target_langs]
+    rows = torch.arange(len(input_ids), device=model.device).repeat_interleave(len(target_langs))
+    decoder_input_ids = torch.tensor(
+        [[model.config.decoder_start_token_id, tokenizer.lang_code_to_id[target_lang]] for target_lang in target_langs]
+        * len(input_ids), device=model.device)
+
+    with torch.no_grad(), autocast(loaded):
+        with stage('encode'):
+            hidden = model.get_encoder()(**inputs).last_hidden_state
+        with stage('generate'):
+            outputs = model.generate(
+                encoder_outputs=BaseModelOutput(last_hidden_state=hidden.index_select(0, rows)),
+                attention_mask=inputs["attention_mask"].index_select(0, rows),
+                decoder_input_ids=decoder_input_ids,   # decoder start + target language of every row
+                max_new_tokens=max(row_limits),
+                num_beams=num_beams,
+                max_time=max_time,
+                early_stopping=True,
+            )
+
+    # decoder start and target language are given, max_new_tokens are all text
+    cut_off = set() if max_time is None else _cut_off_rows(outputs, row_limits, 2 + max(row_limits),
+                                                           tokenizer.eos_token_id)
+    outputs = [output[:2 + limit] for output, limit in zip(outputs, row_limits)]
+    TOKENS.inc('output', amount=sum(int((output != tokenizer.pad_token_id).sum()) for output in outputs))
+    with stage('decode'):
+        decoded = tokenizer.batch_decode(outputs, skip_special_tokens=True)
+    width = len(target_langs)
+    return [_cut_off_error() if cut_off.intersection(range(position, position + width)) # a text is cut off in any language
+            else decoded[position:position + width] for position in range(0, len(decoded), width)]
+
+
+def stream_translate(loaded, target_lang: str, text: str, source_lang: str, num_beams: int = 1) -> Iterator[str]:
+    """
+    Translates one text and yields pieces of the translation as soon as they are decoded.
+    generate runs greedy (or small beam) decoding in a helper thread; closing the iterator stops it.
+    """
+    import torch
+    from transformers import StoppingCriteria, StoppingCriteriaList, TextIteratorStreamer
+
+    class _Cancelled(StoppingCriteria):
+        def __call__(self, input_ids, scores, **kwargs):
+            return torch.full((input_ids.shape[0],), cancelled.is_set(), dtype=torch.bool, device=input_ids.device)
+
+    tokenizer = loaded.tokenizer
+    input_ids = encode_many(loaded, [(text, source_lang)])[0]
+    inputs = torch.tensor([input_ids], device=loaded.model.device)
+    streamer = TextIteratorStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True)
+    cancelled = threading.Event()
+    errors = []
+
+    def run():
+        try:
+            with torch.no_grad(), autocast(loaded):
+                loaded.model.generate(
+                    input_ids=inputs,
+                    attention_mask=torch.ones_like(inputs),
+                    forced_bos_token_id=tokenizer.lang_code_to_id[target_lang],   # Target language
+                    max_new_tokens=max_new_tokens(len(input_ids), source_lang, target_lang),
+                    num_beams=num_beams,
+                    streamer=streamer,
+                    stopping_criteria=StoppingCriteriaList([_Cancelled()]),
+                )
+        except Exception as e:
+            errors.append(e)
+            streamer.end() # releases the reading side
+
+    thread = threading.Thread(target=run, name='stream-generate', daemon=True)
+    thread.start()
+    try:
+        for piece in streamer:
+            if piece:
+                yield piece
+    finally:
+        cancelled.set() # the client has gone or all text is read
+        thread.join()
+    if errors:
+        raise errors[0]
+    logger.debug(f"Streamed translation: {len(input_ids)} token(s) ---> {target_lang} ({loaded.name})")
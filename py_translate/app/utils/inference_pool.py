@@ -0,0 +1,315 @@
+import atexit
+import itertools
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Any, Dict, Hashable, Iterator, List
+
+from app.utils.decoding_policy import DeadlineExceededError
+from app.utils.inference import padding_stats
+from app.utils.metrics import registry as metrics_registry
+from app.utils.startup import format_phases
+
+import logging
+
+logger = logging.getLogger(__name__) # getting root logger
+if not logging.getLogger().hasHandlers():
+    print("ERROR: Root logger had no handlers. Logging unavailable.")
+
+
+class WorkerError(Exception):
+    """Raised in the web process when a worker failed to translate a batch or died while doing it."""
+    pass
+
+
+_END = None # end of the pieces of a streamed translation
+
+
+def _worker_main(index: int, threads: int, cores: List[int], tasks, results):
+    # Entry point of a worker process. Keeps its own copy of the models and handles one batch at a time.
+    if cores and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cores)
+
+    import torch
+    torch.set_num_threads(threads) # intra-op threads of this worker only use its own cores
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass
+
+    from app.routes.common.translate_models import model_registry
+    from app.utils.inference import translate_batch, stream_translate, warm_up_model, PaddingStats
+    from app.utils.engine import mmap_root
+    from app.utils.memory import log_process_memory
+    from app.settings import WARMUP, MODELS_CACHE_DIR
+
+    def send_metrics():
+        changes = metrics_registry.delta() # metrics of this process are merged into the web process
+        if changes:
+            results.put(('metrics', index, changes))
+
+    try:
+        phases = {} # startup of the worker, reported with 'ready'
+        started = time.monotonic()
+        loaded = model_registry.get() # default model is loaded (and warmed up) before the worker reports ready
+        phases['model'] = time.monotonic() - started
+        if WARMUP:
+            started = time.monotonic()
+            warm_up_model(loaded)
+            phases['warm_up'] = time.monotonic() - started
+        log_process_memory(f"Inference worker {index} memory", mmap_root(MODELS_CACHE_DIR))
+        results.put(('ready', index, phases))
+    except Exception as e:
+        results.put(('failed', index, f"{type(e).__name__}: {e}"))
+    send_metrics()
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        task_id, (model_name, target_lang), items, stream, plan = task
+        try:
+            if stream: # pieces of one text go back as they are decoded
+                (text, source_lang), = items
+                for piece in stream_translate(model_registry.get(model_name), target_lang, text, source_lang):
+                    results.put(('partial', task_id, piece))
+                results.put(('done', task_id, (None, None)))
+            else:
+                stats = PaddingStats()
+                translations = translate_batch(model_registry.get(model_name), target_lang, items, stats, plan)
+                results.put(('done', task_id, (translations, stats.raw())))
+        except DeadlineExceededError as e:
+            results.put(('error', task_id, e)) # delivered as it is, not as WorkerError
+        except Exception as e:
+            results.put(('error', task_id, f"{type(e).__name__}: {e}"))
+        send_metrics()
+
+
+class _Worker:
+    def __init__(self, index: int, cores: List[int]):
+        self.index = index
+        self.cores = cores
+        self.process = None
+        self.tasks = None
+        self.in_flight: Dict[int, Future] = {}
+        self.state = 'starting'
+        self.error = ''
+        self.startup: Dict[str, float] = {}
+        self.restarts = 0
+
+
+class InferencePool:
+    """
+    Pool of worker processes which run model.generate outside of the web server threads.
+
+    Every worker holds its own models and is pinned to its own share of CPU cores
+    (torch.set_num_threads + CPU affinity), so N workers use the whole box without oversubscribing.
+    Batches are sent through per-worker pipe queues to the worker with the fewest batches in flight.
+    A worker that dies, or does not answer a batch within its timeout, is restarted; batches it was
+    working on fail with WorkerError.
+    """
+
+    def __init__(self, num_workers: int, threads_per_worker: int = 0):
+        self.num_workers = max(1, num_workers)
+        cpu_count = os.cpu_count() or 1
+        self.threads_per_worker = threads_per_worker or max(1, cpu_count // self.num_workers)
+
+        self._context = multiprocessing.get_context('spawn') # fork is unsafe with torch thread pools
+        self._results = None
+        self._workers: List[_Worker] = []
+        for index in range(self.num_workers):
+            first = index * self.threads_per_worker
+            cores = [core % cpu_count for core in range(first, first + self.threads_per_worker)]
+            self._workers.append(_Worker(index, cores if self.num_workers * self.threads_per_worker <= cpu_count else []))
+
+        self._lock = threading.Lock()
+        self._task_ids = itertools.count()
+        self._streams: Dict[int, queue.Queue] = {} # task id -> pieces of a streamed translation
+        self._collector = None
+        self._stopping = False
+
+    def start(self):
+        with self._lock:
+            if self._collector is not None:
+                return
+            self._results = self._context.Queue()
+            for worker in self._workers:
+                self._spawn(worker)
+            self._collector = threading.Thread(target=self._collect, name='inference-collector', daemon=True)
+            self._collector.start()
+            atexit.register(self.stop)
+        logger.info(f"Inference pool started: {self.num_workers} worker(s) x {self.threads_per_worker} thread(s)")
+
+    def _spawn(self, worker: _Worker):
+        worker.tasks = self._context.Queue()
+        worker.state, worker.error = 'starting', ''
+        worker.process = self._context.Process(
+            target=_worker_main, name=f'inference-worker-{worker.index}', daemon=True,
+            args=(worker.index, self.threads_per_worker, worker.cores, worker.tasks, self._results))
+        worker.process.start()
+
+    def run(self, key: Hashable, items: List[Any], plan=None, timeout: float = None) -> List[Any]:
+        """
+        Translates one batch in a worker process and waits for the result. plan - DecodingPlan of the batch.
+        If there is no result in timeout seconds the worker is taken as hung: it is restarted and WorkerError is raised.
+        """
+        task_id, future = self._submit(key, items, plan=plan)
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            self._restart_hung(task_id, timeout)
+            return future.result() # failed by the restart, or finished just before it
+
+    def submit(self, key: Hashable, items: List[Any], plan=None) -> Future:
+        return self._submit(key, items, plan=plan)[1]
+
+    def _submit(self, key: Hashable, items: List[Any], stream: bool = False, plan=None):
+        self.start()
+        future = Future()
+        task_id = next(self._task_ids)
+        with self._lock:
+            alive = [worker for worker in self._workers if worker.state != 'failed'] or self._workers
+            worker = min(alive, key=lambda w: len(w.in_flight))
+            worker.in_flight[task_id] = future
+            if stream:
+                self._streams[task_id] = queue.Queue()
+        worker.tasks.put((task_id, key, items, stream, plan))
+        return task_id, future
+
+    def stream(self, key: Hashable, item: Any) -> Iterator[str]:
+        """
+        Translates one (text, source language) item in a worker and yields pieces of the translation
+        as they are decoded. A worker finishes the text even if the iterator is closed early.
+        """
+        task_id, future = self._submit(key, [item], stream=True)
+        pieces = self._streams[task_id]
+        try:
+            while True:
+                piece = pieces.get()
+                if piece is _END:
+                    future.result() # raises WorkerError
+                    return
+                yield piece
+        finally:
+            with self._lock:
+                self._streams.pop(task_id, None)
+
+    def _collect(self):
+        last_check = time.monotonic()
+        while True:
+            if time.monotonic() - last_check >= 1:
+                self._check_workers()
+                last_check = time.monotonic()
+            try:
+                kind, ident, payload = self._results.get(timeout=1)
+            except queue.Empty:
+                continue
+
+            if kind == 'metrics':
+                metrics_registry.merge(payload)
+                continue
+
+            with self._lock:
+                if kind == 'ready':
+                    worker = self._workers[ident]
+                    worker.state, worker.error, worker.startup = 'ready', '', payload
+                    logger.info(f"Inference worker {ident}: ready ({format_phases(payload)})")
+                    continue
+                if kind == 'failed':
+                    worker = self._workers[ident]
+                    worker.state, worker.error = 'failed', payload
+                    logger.info(f"Inference worker {ident}: failed {payload}")
+                    continue
+                if kind == 'partial':
+                    pieces = self._streams.get(ident)
+                    if pieces is not None:
+                        pieces.put(payload)
+                    continue
+                future = None
+                for worker in self._workers:
+                    future = worker.in_flight.pop(ident, None)
+                    if future is not None:
+                        break
+            if future is None:
+                continue
+            if kind == 'done':
+                translations, stats = payload
+                if stats is not None:
+                    padding_stats.add(*stats) # counters of all workers are collected in the web process
+                future.set_result(translations)
+            else:
+                future.set_exception(payload if isinstance(payload, Exception) else WorkerError(payload))
+            self._end_stream(ident)
+
+    def _end_stream(self, task_id: int):
+        pieces = self._streams.get(task_id)
+        if pieces is not None:
+            pieces.put(_END)
+
+    def _check_workers(self):
+        with self._lock:
+            for worker in self._workers:
+                if self._stopping or worker.process is None or worker.process.is_alive():
+                    continue
+                logger.error(f"Inference worker {worker.index} died (exit code {worker.process.exitcode}), restarting")
+                self._restart(worker, f"Inference worker {worker.index} died")
+
+    def _restart_hung(self, task_id: int, timeout: float):
+        with self._lock:
+            for worker in self._workers:
+                if task_id in worker.in_flight:
+                    logger.error(f"Inference worker {worker.index} did not answer in {timeout:.1f}s, restarting")
+                    worker.process.kill()
+                    worker.process.join(5)
+                    self._restart(worker, f"Inference worker {worker.index} did not answer in {timeout:.1f}s")
+                    return
+
+    def _restart(self, worker: _Worker, error: str):
+        # Fails the batches of the worker and starts a new process in its place (lock is held)
+        for task_id, future in worker.in_flight.items():
+            if not future.done():
+                future.set_exception(WorkerError(error))
+            self._end_stream(task_id)
+        worker.in_flight.clear()
+        worker.restarts += 1
+        self._spawn(worker)
+
+    def is_ready(self) -> bool:
+        return any(worker.state == 'ready' for worker in self._workers)
+
+    def wait_ready(self, timeout: float = None, poll_seconds: float = 0.2) -> bool:
+        """Waits until a worker is ready. False if every worker failed or timeout passed"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.is_ready():
+            if all(worker.state == 'failed' for worker in self._workers):
+                return False
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(poll_seconds)
+        return True
+
+    def status(self) -> dict:
+        with self._lock:
+            return {
+                "workers": [
+                    {"index": worker.index, "state": worker.state, "pid": worker.process.pid if worker.process else None,
+                     "in_flight": len(worker.in_flight), "restarts": worker.restarts, "cores": worker.cores,
+                     "startup": {name: round(seconds, 3) for name, seconds in worker.startup.items()},
+                     **({"error": worker.error} if worker.error else {})}
+                    for worker in self._workers
+                ],
+                "threads_per_worker": self.threads_per_worker,
+            }
+
+    def stop(self, timeout: float = 5):
+        self._stopping = True
+        for worker in self._workers:
+            if worker.process is not None and worker.process.is_alive():
+                worker.tasks.put(None)
+        deadline = time.monotonic() + timeout
+        for worker in self._workers:
+            if worker.process is not None:
+                worker.process.join(max(0, deadline - time.monotonic()))
@@ -0,0 +1,257 @@
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Callable, Dict, Iterator, List, Optional
+
+import logging
+
+logger = logging.getLogger(__name__) # getting root logger
+if not logging.getLogger().hasHandlers():
+    print("ERROR: Root logger had no handlers. Logging unavailable.")
+
+# Job states
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+_META_FILE = 'job.json'
+_INPUT_FILE = 'input.ndjson'
+_RESULTS_FILE = 'results.ndjson'
+
+
+class JobNotFoundError(Exception):
+    pass
+
+
+class Job:
+    """
+    Bulk translation job.
+
+    Identical input texts are translated once: unique[u] is the text at every position of indices[u].
+    Results of unique texts are appended to results.ndjson in the job directory, which is also the checkpoint.
+    """
+
+    def __init__(self, job_id: str, job_dir: str, target: str, model: str, texts: List[str],
+                 state: str = QUEUED, created: float = None, finished: float = None, error: str = ''):
+        self.id = job_id
+        self.dir = job_dir
+        self.target = target
+        self.model = model
+        self.texts = texts
+        self.state = state
+        self.created = created or time.time()
+        self.finished = finished
+        self.error = error
+
+        self.unique: List[str] = []
+        self.indices: List[List[int]] = [] # positions of every unique text in texts
+        positions: Dict[str, int] = {}
+        for index, text in enumerate(texts):
+            if text not in positions:
+                positions[text] = len(self.unique)
+                self.unique.append(text)
+                self.indices.append([])
+            self.indices[positions[text]].append(index)
+
+        self.done_count = 0 # number of unique texts with results
+        self.changed = threading.Condition()
+
+    @property
+    def results_path(self) -> str:
+        return os.path.join(self.dir, _RESULTS_FILE)
+
+    def save_meta(self):
+        meta = {"id": self.id, "target": self.target, "model": self.model, "state": self.state,
+                "created": self.created, "finished": self.finished, "error": self.error}
+        tmp_path = os.path.join(self.dir, _META_FILE + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(meta, file)
+        os.replace(tmp_path, os.path.join(self.dir, _META_FILE)) # atomic, a crash never leaves half a file
+
+    def status(self) -> dict:
+        return {
+            "jobId": self.id,
+            "state": self.state,
+            "target": self.target,
+            "model": self.model,
+            "total": len(self.texts),
+            "unique": len(self.unique),
+            "completed": self.done_count,
+            "progress": round(self.done_count / len(self.unique), 4) if self.unique else 1.0,
+            "created": self.created,
+            "finished": self.finished,
+            **({"error": self.error} if self.error else {}),
+        }
+
+
+class JobManager:
+    """
+    Runs bulk translation jobs in a background thread, one job at a time, in order of submission.
+
+    Every job is stored in its own directory (input, meta and results as NDJSON), so unfinished jobs
+    are resumed from their last checkpoint after a restart.
+    translate_chunk(texts, target, model) must return one result dict per text
+    (e.g. {"translatedText": ..., "detectedSourceLanguage": ...} or {"error": ...}).
+    """
+
+    def __init__(self, jobs_dir: str, translate_chunk: Callable[[List[str], str, str], List[dict]],
+                 chunk_size: int = 32):
+        self.jobs_dir = jobs_dir
+        self.translate_chunk = translate_chunk
+        self.chunk_size = max(1, chunk_size)
+
+        self._jobs: Dict[str, Job] = {}
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._thread = None
+
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        self._resume()
+
+    # ------------------------------------------------------------------------------------------------- api
+    def create(self, texts: List[str], target: str, model: str) -> Job:
+        job_id = uuid.uuid4().hex
+        job_dir = os.path.join(self.jobs_dir, job_id)
+        os.makedirs(job_dir)
+        with open(os.path.join(job_dir, _INPUT_FILE), 'w', encoding='utf-8') as file:
+            for text in texts:
+                file.write(json.dumps(text, ensure_ascii=False) + '\n')
+        job = Job(job_id, job_dir, target, model, texts)
+        job.save_meta()
+        self._enqueue(job)
+        logger.info(f"Job {job_id} created: {len(texts)} text(s), {len(job.unique)} unique ---> {target}")
+        return job
+
+    def get(self, job_id: str) -> Job:
+        job = self._jobs.get(job_id)
+        if job is None:
+            raise JobNotFoundError(f"Job {job_id} not found")
+        return job
+
+    def stream_results(self, job: Job, poll_seconds: float = 0.5) -> Iterator[str]:
+        """Yields NDJSON lines {index, ...result} as results appear, until the job is finished."""
+        position = 0
+        buffer = b''
+        while True:
+            with job.changed:
+                finished = job.state in (DONE, FAILED)
+            if os.path.exists(job.results_path):
+                with open(job.results_path, 'rb') as file:
+                    file.seek(position)
+                    chunk = file.read()
+                    position = file.tell()
+                buffer += chunk
+                *lines, buffer = buffer.split(b'\n') # the last part may be a line that is being written
+                for line in lines:
+                    if not line:
+                        continue
+                    record = json.loads(line)
+                    for index in job.indices[record.pop("u")]:
+                        yield json.dumps({"index": index, **record}, ensure_ascii=False) + '\n'
+            if finished:
+                if job.state == FAILED:
+                    yield json.dumps({"error": job.error or "Job failed"}) + '\n'
+                return
+            with job.changed:
+                job.changed.wait(poll_seconds)
+
+    # ----------------------------------------------------------------------------------------------- runner
+    def _enqueue(self, job: Job):
+        with self._cond:
+            self._jobs[job.id] = job
+            self._queue.append(job)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='job-runner', daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                job = self._queue.popleft()
+            try:
+                self._run_job(job)
+            except Exception as e:
+                logger.error(f"Job {job.id} failed: {type(e).__name__}: {e}")
+                self._set_state(job, FAILED, f"{type(e).__name__}: {e}")
+
+    def _run_job(self, job: Job):
+        done = self._load_done(job)
+        job.done_count = len(done)
+        self._set_state(job, RUNNING)
+
+        # Shorter texts first and similar lengths together: less padding in every batch
+        pending = sorted((index for index in range(len(job.unique)) if index not in done),
+                         key=lambda index: len(job.unique[index]))
+
+        with open(job.results_path, 'a', encoding='utf-8') as results:
+            for start in range(0, len(pending), self.chunk_size):
+                chunk = pending[start:start + self.chunk_size]
+                translated = self.translate_chunk([job.unique[index] for index in chunk], job.target, job.model)
+                for index, record in zip(chunk, translated):
+                    results.write(json.dumps({"u": index, **record}, ensure_ascii=False) + '\n')
+                results.flush() # checkpoint
+                with job.changed:
+                    job.done_count += len(chunk)
+                    job.changed.notify_all()
+
+        self._set_state(job, DONE)
+        logger.info(f"Job {job.id} finished: {len(job.unique)} unique text(s)")
+
+    def _set_state(self, job: Job, state: str, error: str = ''):
+        with job.changed:
+            job.state, job.error = state, error
+            if state in (DONE, FAILED):
+                job.finished = time.time()
+            job.save_meta()
+            job.changed.notify_all()
+
+    @staticmethod
+    def _load_done(job: Job) -> set:
+        done = set()
+        if not os.path.exists(job.results_path):
+            return done
+        with open(job.results_path, 'rb+') as file:
+            valid_size = 0
+            for line in file:
+                try:
+                    if not line.endswith(b'\n'):
+                        raise ValueError('incomplete line')
+                    done.add(json.loads(line)["u"])
+                    valid_size += len(line)
+                except (ValueError, KeyError):
+                    break # a line cut by a crash, everything after it is rewritten
+            file.truncate(valid_size)
+        return done
+
+    def _resume(self):
+        for job_id in sorted(os.listdir(self.jobs_dir)):
+            job = self._load(job_id)
+            if job is None:
+                continue
+            if job.state in (QUEUED, RUNNING):
+                logger.info(f"Job {job.id} resumed after restart")
+                job.state = QUEUED
+                self._enqueue(job)
+            else:
+                job.done_count = len(job.unique) if job.state == DONE else len(self._load_done(job))
+                self._jobs[job.id] = job
+
+    def _load(self, job_id: str) -> Optional[Job]:
+        job_dir = os.path.join(self.jobs_dir, job_id)
+        try:
+            with open(os.path.join(job_dir, _META_FILE), 'r', encoding='utf-8') as file:
+                meta = json.load(file)
+            with open(os.path.join(job_dir, _INPUT_FILE), 'r', encoding='utf-8') as file:
+                texts = [json.loads(line) for line in file if line.strip()]
+        except (OSError, ValueError) as e:
+            logger.error(f"Job {job_id} can't be loaded: {e}")
+            return None
+        return Job(meta["id"], job_dir, meta["target"], meta["model"], texts,
+                   state=meta["state"], created=meta["created"], finished=meta["finished"], error=meta["error"])
@@ -0,0 +1,140 @@
+import threading
+from typing import Dict, Iterable, List, Tuple
+
+import logging
+
+logger = logging.getLogger(__name__) # getting root logger
+if not logging.getLogger().hasHandlers():
+    print("ERROR: Root logger had no handlers. Logging unavailable.")
+
+# Scripts used by a single supported language: (first code point, last code point, language)
+_SCRIPT_RANGES = [
+    (0x0370, 0x03FF, "el"),  # Greek
+    (0x1F00, 0x1FFF, "el"),  # Greek extended
+    (0x0590, 0x05FF, "he"),  # Hebrew
+    (0x0980, 0x09FF, "bn"),  # Bengali
+    (0x0A00, 0x0A7F, "pa"),  # Gurmukhi
+    (0x0A80, 0x0AFF, "gu"),  # Gujarati
+    (0x0B80, 0x0BFF, "ta"),  # Tamil
+    (0x0C00, 0x0C7F, "te"),  # Telugu
+    (0x0C80, 0x0CFF, "kn"),  # Kannada
+    (0x0D00, 0x0D7F, "ml"),  # Malayalam
+    (0x0D80, 0x0DFF, "si"),  # Sinhala
+    (0x0E00, 0x0E7F, "th"),  # Thai
+    (0x0E80, 0x0EFF, "lo"),  # Lao
+    (0x1000, 0x109F, "my"),  # Myanmar
+    (0x10A0, 0x10FF, "ka"),  # Georgian
+    (0x1200, 0x139F, "am"),  # Ethiopic
+    (0x1780, 0x17FF, "km"),  # Khmer
+    (0x1100, 0x11FF, "ko"),  # Hangul jamo
+    (0x3130, 0x318F, "ko"),  # Hangul compatibility jamo
+    (0xAC00, 0xD7AF, "ko"),  # Hangul syllables
+    (0x3040, 0x30FF, "ja"),  # Hiragana and Katakana
+]
+_HAN_RANGES = [(0x3400, 0x4DBF), (0x4E00, 0x9FFF), (0xF900, 0xFAFF)]
+
+_SCRIPT_SHARE = 0.9 # share of letters in one script that decides the language without n-gram scoring
+_SHORTCUT_CONFIDENCE = 0.99
+
+
+def _script_language(ch: str):
+    code = ord(ch)
+    for first, last, lang in _SCRIPT_RANGES:
+        if first <= code <= last:
+            return lang
+    for first, last in _HAN_RANGES:
+        if first <= code <= last:
+            return 'han'
+    return None
+
+
+def bounded_prefix(text: str, max_chars: int) -> str:
+    """First max_chars symbols of text, cut at the last whitespace so a word is not broken"""
+    if max_chars <= 0 or len(text) <= max_chars:
+        return text
+    prefix = text[:max_chars]
+    cut = prefix.rfind(' ', max_chars // 2)
+    return prefix[:cut] if cut > 0 else prefix
+
+
+class LanguageDetector:
+    """
+    Language identification restricted to the languages of the translation models.
+
+    Detection looks only at a bounded prefix of a text. Texts written in a script used by one supported
+    language (Hangul, Thai, Georgian, ...) are resolved by counting code points; the rest are scored by the
+    langid naive Bayes model limited to the supported languages, which also makes scoring faster.
+    Confidence is the normalized probability of the best language.
+    """
+
+    def __init__(self, languages: Iterable[str], code_map: Dict[str, str] = None, max_chars: int = 1000):
+        import numpy as np
+        from langid.langid import LanguageIdentifier, model # heavy model is decoded once per process
+
+        self._np = np
+        self.languages = set(languages)
+        self.code_map = code_map or {}
+        self.max_chars = max_chars
+
+        self._identifier = LanguageIdentifier.from_modelstring(model, norm_probs=True)
+        known = set(self._identifier.nb_classes)
+        langid_codes = {code for code in known
+                        if self.code_map.get(code, code) in self.languages}
+        self._identifier.set_languages(sorted(langid_codes))
+        self._classes = [self.code_map.get(code, code) for code in self._identifier.nb_classes]
+        self._script_langs = {lang for _, _, lang in _SCRIPT_RANGES if lang in self.languages}
+        self._lock = threading.Lock() # instance2fv of langid is not documented as thread safe
+        logger.info(f"Language detector: {len(langid_codes)} langid classes, {len(self._script_langs)} script shortcuts")
+
+    def detect(self, text: str) -> Tuple[str, float]:
+        return self.detect_many([text])[0]
+
+    def detect_many(self, texts: List[str]) -> List[Tuple[str, float]]:
+        """Returns (M2M100 language code, confidence) for every text, scored as one matrix product"""
+        np = self._np
+        results: List[Tuple[str, float]] = [None] * len(texts)
+        pending, features = [], []
+        for index, text in enumerate(texts):
+            prefix = bounded_prefix(text, self.max_chars)
+            shortcut = self._script_shortcut(prefix)
+            if shortcut is not None:
+                results[index] = shortcut, _SHORTCUT_CONFIDENCE
+                continue
+            with self._lock:
+                features.append(self._identifier.instance2fv(prefix))
+            pending.append(index)
+
+        if pending:
+            identifier = self._identifier
+            scores = np.vstack(features).astype(np.float64) @ identifier.nb_ptc + identifier.nb_pc
+            scores -= scores.max(axis=1, keepdims=True) # softmax of log probabilities
+            probs = np.exp(scores)
+            probs /= probs.sum(axis=1, keepdims=True)
+            best = probs.argmax(axis=1)
+            for row, index in enumerate(pending):
+                results[index] = self._classes[best[row]], round(float(probs[row, best[row]]), 4)
+        return results
+
+    def _script_shortcut(self, text: str):
+        counts: Dict[str, int] = {}
+        letters = 0
+        for ch in text:
+            if not ch.isalpha():
+                continue
+            letters += 1
+            lang = _script_language(ch)
+            if lang is not None:
+                counts[lang] = counts.get(lang, 0) + 1
+        if not letters:
+            return None
+
+        # Kana with Han is Japanese; pure Han is left to the model (Chinese or Japanese kanji)
+        if counts.get('ja') and 'ja' in self.languages and \
+                (counts['ja'] + counts.get('han', 0)) / letters >= _SCRIPT_SHARE:
+            return 'ja'
+        counts.pop('han', None)
+        for lang, count in counts.items():
+            if lang in self._script_langs and count / letters >= _SCRIPT_SHARE:
+                return lang
+        return None
+
@@ -0,0 +1,160 @@
+import bisect
+import os
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Iterator, List, Optional
+
+import logging
+
+logger = logging.getLogger(__name__) # getting root logger
+if not logging.getLogger().hasHandlers():
+    print("ERROR: Root logger had no handlers. Logging unavailable.")
+
+# Records are written as "YYYY-MM-DD HH:MM:SS,mmm - LEVEL - logger.name - message",
+# lines without the timestamp (tracebacks) belong to the previous record.
+LEVELS = {'DEBUG': 10, 'INFO': 20, 'WARNING': 30, 'ERROR': 40, 'CRITICAL': 50}
+_TIMESTAMP_LENGTH = 23
+_SEPARATOR = b' - '
+_READ_SIZE = 1 << 20
+
+
+def _parse_head(line: bytes):
+    # (seconds of the day, level, logger name) of the first line of a record, None for continuation lines
+    if len(line) < _TIMESTAMP_LENGTH + 3 or line[4:5] != b'-' or line[10:11] != b' ' or not line[:4].isdigit():
+        return None
+    try:
+        seconds = int(line[11:13]) * 3600 + int(line[14:16]) * 60 + int(line[17:19]) + int(line[20:23]) / 1000
+        level, name = line[_TIMESTAMP_LENGTH + 3:].split(_SEPARATOR, 2)[:2]
+    except ValueError:
+        return None
+    return seconds, LEVELS.get(level.decode('ascii', 'replace'), 0), name.decode('utf-8', 'replace')
+
+
+class LogIndex:
+    """
+    Offset index of one daily log file: start offset, time, level and logger of every record.
+    Only the part of the file written since the previous call of update() is scanned.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.offsets = array('q')  # start of every record
+        self.times = array('d')    # seconds of the day
+        self.levels = array('b')
+        self.names = array('i')    # positions in self.logger_names
+        self.logger_names: List[str] = []
+        self._name_ids = {}
+        self.indexed_size = 0      # end of the last complete line
+        self._inode = None
+
+    def update(self) -> 'LogIndex':
+        with self._lock:
+            stat = os.stat(self.path)
+            if stat.st_ino != self._inode or stat.st_size < self.indexed_size: # file was replaced or truncated
+                self._reset()
+                self._inode = stat.st_ino
+            if stat.st_size == self.indexed_size:
+                return self
+            with open(self.path, 'rb') as file:
+                file.seek(self.indexed_size)
+                position = self.indexed_size
+                rest = b''
+                while True:
+                    chunk = file.read(_READ_SIZE)
+                    if not chunk:
+                        break
+                    lines = (rest + chunk).split(b'\n')
+                    rest = lines.pop() # incomplete line is indexed when it is finished
+                    for line in lines:
+                        self._add_line(line, position)
+                        position += len(line) + 1
+                self.indexed_size = position
+        return self
+
+    def _add_line(self, line: bytes, position: int):
+        head = _parse_head(line)
+        if head is None:
+            if not self.offsets: # text before the first record is a record of its own
+                self._append(position, 0, 0, '')
+            return
+        self._append(position, *head)
+
+    def _append(self, position: int, seconds: float, level: int, name: str):
+        name_id = self._name_ids.get(name)
+        if name_id is None:
+            name_id = self._name_ids[name] = len(self.logger_names)
+            self.logger_names.append(name)
+        self.offsets.append(position)
+        self.times.append(seconds)
+        self.levels.append(level)
+        self.names.append(name_id)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def end_of(self, record: int) -> int:
+        return self.offsets[record + 1] if record + 1 < len(self.offsets) else self.indexed_size
+
+    def select(self, min_level: int = 0, logger_prefix: str = '', since: float = None, until: float = None,
+               tail: int = 0) -> Iterator[int]:
+        """Record numbers matching the filters (in file order); with tail only the last ones, found from the end"""
+        count = len(self.offsets)
+        first = bisect.bisect_left(self.times, since, 0, count) if since is not None else 0
+        last = bisect.bisect_right(self.times, until, first, count) if until is not None else count
+        names = None
+        if logger_prefix:
+            names = {index for index, name in enumerate(self.logger_names)
+                     if name == logger_prefix or name.startswith(logger_prefix + '.')}
+
+        def matches(record):
+            return self.levels[record] >= min_level and (names is None or self.names[record] in names)
+
+        if tail:
+            found = []
+            for record in range(last - 1, first - 1, -1):
+                if matches(record):
+                    found.append(record)
+                    if len(found) == tail:
+                        break
+            return iter(reversed(found))
+        return (record for record in range(first, last) if matches(record))
+
+    def read(self, records: Iterator[int], substring: bytes = b'') -> Iterator[bytes]:
+        """Texts of records (bytes with line ends), optionally only those containing substring"""
+        with open(self.path, 'rb') as file:
+            for record in records:
+                start = self.offsets[record]
+                file.seek(start)
+                text = file.read(self.end_of(record) - start)
+                if not substring or substring in text:
+                    yield text
+
+
+_indexes: 'OrderedDict[str, LogIndex]' = OrderedDict()
+_indexes_lock = threading.Lock()
+_MAX_INDEXES = 8
+
+
+def get_index(path: str) -> LogIndex:
+    """Up to date index of a log file (indexes of recently used files stay in memory)"""
+    with _indexes_lock:
+        index = _indexes.pop(path, None) or LogIndex(path)
+        _indexes[path] = index
+        while len(_indexes) > _MAX_INDEXES:
+            _indexes.popitem(last=False)
+    return index.update()
+
+
+def parse_time_of_day(value: Optional[str]) -> Optional[float]:
+    """'HH:MM' or 'HH:MM:SS' -> seconds of the day. Raises ValueError"""
+    if not value:
+        return None
+    parts = [int(part) for part in value.split(':')]
+    if len(parts) not in (2, 3) or not (0 <= parts[0] < 24 and all(0 <= part < 60 for part in parts[1:])):
+        raise ValueError(f"Invalid time {value}, expected HH:MM or HH:MM:SS")
+    return parts[0] * 3600 + parts[1] * 60 + (parts[2] if len(parts) == 3 else 0)
@@ -0,0 +1,103 @@
+import html
+import re
+from typing import List, Optional
+
+# HTML is scanned once by one regex: every match is markup (tag, comment, doctype, ...), the text between
+# matches is text. Quoted attribute values may contain '>'.
+_MARKUP_RE = re.compile(
+    r'<!--.*?-->'
+    r'|<!\[CDATA\[.*?\]\]>'
+    r'|<[!?][^>]*>'
+    r'|</?[A-Za-z][^\s>/]*(?:"[^"]*"|\'[^\']*\'|[^\'">])*>',
+    re.S)
+_TAG_NAME_RE = re.compile(r'</?([A-Za-z][^\s>/]*)')
+_NO_TRANSLATE_RE = re.compile(r'\stranslate\s*=\s*["\']?no\b'
+                              r'|\sclass\s*=\s*(?:"[^"]*\bnotranslate\b|\'[^\']*\bnotranslate\b|notranslate\b)', re.I)
+_SPACE_RE = re.compile(r'[ \t\n\r\f]+') # HTML whitespace, non-breaking spaces are kept
+_EDGE_SPACE = ' \t\n\r\f\u00a0' # whitespace around a run stays outside it, so the model can not drop it
+
+_VOID_ELEMENTS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'param', 'source',
+                  'track', 'wbr'}
+_RAW_TEXT_ELEMENTS = {'script', 'style'} # content is not HTML, it is copied as it is
+_SKIPPED_ELEMENTS = {'code', 'kbd', 'samp', 'var'} # content is kept untranslated
+_PREFORMATTED_ELEMENTS = {'pre', 'textarea'} # whitespace of the text is significant
+
+
+def _escape(text: str) -> str:
+    return html.escape(text, quote=False).replace('\u00a0', '&nbsp;')
+
+
+class HtmlDocument:
+    """
+    HTML split into parts: markup (tags, comments, entities of untranslated text) is kept as it is,
+    text runs between tags are unescaped and go to the model (texts); render() puts the translations
+    back, escaped, between the original tags. Runs without letters are not translated.
+    """
+
+    def __init__(self, parts: List[Optional[str]], texts: List[str]):
+        self.parts = parts # markup as it was or None in place of a translated text run
+        self.texts = texts # text runs for translation, in the order of the None parts
+
+    def text_content(self) -> str:
+        """Text of the document without markup (for language detection and length limits)"""
+        return ' '.join(self.texts)
+
+    def render(self, translations: List[str]) -> str:
+        translated = iter(translations)
+        return ''.join(_escape(next(translated)) if part is None else part for part in self.parts)
+
+
+def parse_html(source: str) -> HtmlDocument:
+    """Splits HTML into markup and text runs, see HtmlDocument"""
+    parts: List[Optional[str]] = []
+    texts: List[str] = []
+    skipped = None # (tag name, depth) of a code or translate="no" element whose content is kept
+    preformatted = 0
+
+    def add_text(raw: str):
+        if not raw:
+            return
+        text = html.unescape(raw)
+        if skipped is not None or not any(char.isalpha() for char in text):
+            parts.append(raw)
+            return
+        stripped = text.strip(_EDGE_SPACE)
+        parts.append(_escape(text[:len(text) - len(text.lstrip(_EDGE_SPACE))]))
+        parts.append(None)
+        texts.append(stripped if preformatted else _SPACE_RE.sub(' ', stripped)) # line breaks of HTML are not paragraphs
+        parts.append(_escape(text[len(text.rstrip(_EDGE_SPACE)):]))
+
+    position = 0
+    length = len(source)
+    while position < length:
+        match = _MARKUP_RE.search(source, position)
+        if match is None:
+            add_text(source[position:])
+            break
+        add_text(source[position:match.start()])
+        tag = match.group(0)
+        parts.append(tag)
+        position = match.end()
+
+        name = _TAG_NAME_RE.match(tag)
+        if name is None: # comment, doctype, CDATA, processing instruction
+            continue
+        name = name.group(1).lower()
+        closing = tag.startswith('</')
+        if not closing and name in _RAW_TEXT_ELEMENTS:
+            end = re.compile(rf'</{name}\s*>', re.I).search(source, position)
+            stop = end.end() if end is not None else length
+            parts.append(source[position:stop])
+            position = stop
+            continue
+        if name in _VOID_ELEMENTS or tag.endswith('/>'):
+            continue
+        if name in _PREFORMATTED_ELEMENTS:
+            preformatted = max(0, preformatted + (-1 if closing else 1))
+        if skipped is not None:
+            if name == skipped[0]:
+                depth = skipped[1] + (-1 if closing else 1)
+                skipped = (name, depth) if depth > 0 else None
+        elif not closing and (name in _SKIPPED_ELEMENTS or _NO_TRANSLATE_RE.search(tag)):
+            skipped = (name, 1)
+    return HtmlDocument(parts, texts)
@@ -0,0 +1,56 @@
+import os
+from typing import Optional
+
+import logging
+
+logger = logging.getLogger(__name__) # getting root logger
+if not logging.getLogger().hasHandlers():
+    print("ERROR: Root logger had no handlers. Logging unavailable.")
+
+_FIELDS = ('Rss', 'Pss', 'Shared_Clean', 'Shared_Dirty', 'Private_Clean', 'Private_Dirty')
+
+
+def process_memory(pid: int = None, mapped_dir: str = None) -> Optional[dict]:
+    """
+    Resident memory of a process (default - this one) in MB from /proc/<pid>/smaps (Linux only, None elsewhere):
+    rss, unique (pages used by this process only), shared (pages also used by other processes, e.g. mapped
+    weights of other workers), pss (shared pages divided among their users). With mapped_dir also the
+    resident and shared part of the files mapped from it (memory mapped model weights).
+    """
+    path = f"/proc/{pid or 'self'}/smaps"
+    totals = dict.fromkeys(_FIELDS, 0)
+    mapped = dict.fromkeys(_FIELDS, 0)
+    in_mapped = False
+    try:
+        with open(path, 'r') as file:
+            for line in file:
+                fields = line.split(None, 5)
+                if '-' in fields[0]: # header of a mapping: address range, perms, offset, device, inode, pathname
+                    in_mapped = bool(mapped_dir) and len(fields) == 6 and fields[5].strip().startswith(mapped_dir)
+                    continue
+                name = fields[0].rstrip(':')
+                if name in totals:
+                    totals[name] += int(fields[1])
+                    if in_mapped:
+                        mapped[name] += int(fields[1])
+    except OSError:
+        return None
+
+    def mb(kb):
+        return round(kb / 1024, 1)
+
+    report = {"rss_mb": mb(totals['Rss']),
+              "unique_mb": mb(totals['Private_Clean'] + totals['Private_Dirty']),
+              "shared_mb": mb(totals['Shared_Clean'] + totals['Shared_Dirty']),
+              "pss_mb": mb(totals['Pss'])}
+    if mapped_dir:
+        report["mapped_weights"] = {"rss_mb": mb(mapped['Rss']),
+                                    "shared_mb": mb(mapped['Shared_Clean'] + mapped['Shared_Dirty'])}
+    return report
+
+
+def log_process_memory(prefix: str, mapped_dir: str = None):
+    report = process_memory(mapped_dir=mapped_dir)
+    if report is not None:
+        logger.info(f"{prefix}: pid {os.getpid()} rss {report['rss_mb']} MB, unique {report['unique_mb']} MB, "
+                    f"shared {report['shared_mb']} MB")
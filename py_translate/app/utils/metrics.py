@@ -0,0 +1,246 @@
+import bisect
+import contextlib
+import threading
+import time
+from typing import Callable, Dict, List, Tuple
+
+# Default histogram buckets (seconds): from sub-millisecond parsing to long generate calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra: str = '') -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _format(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """
+    Base of counters and histograms. Every thread updates its own shard without locks,
+    shards are summed when metrics are collected.
+    """
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, label_names: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._local = threading.local()
+        self._shards: List[dict] = []
+        self._shards_lock = threading.Lock() # taken once per thread
+        self._remote: dict = {} # deltas received from worker processes
+
+    def _shard(self) -> dict:
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = {}
+            with self._shards_lock:
+                self._shards.append(shard)
+            return shard
+
+    def collect(self) -> dict:
+        total = {}
+        for shard in list(self._shards) + [self._remote]:
+            for key, value in list(shard.items()):
+                total[key] = self._add(total.get(key), value)
+        return total
+
+    def merge(self, values: dict):
+        for key, value in values.items():
+            self._remote[key] = self._add(self._remote.get(key), value)
+
+    @staticmethod
+    def _add(total, value):
+        raise NotImplementedError
+
+    @staticmethod
+    def _subtract(value, previous):
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, *label_values, amount: float = 1):
+        shard = self._shard()
+        shard[label_values] = shard.get(label_values, 0) + amount
+
+    @staticmethod
+    def _add(total, value):
+        return value if total is None else total + value
+
+    @staticmethod
+    def _subtract(value, previous):
+        return value - (previous or 0)
+
+    def render(self) -> List[str]:
+        return [f'{self.name}{_labels(self.label_names, key)} {_format(value)}'
+                for key, value in sorted(self.collect().items())]
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, label_names: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *label_values):
+        shard = self._shard()
+        counts = shard.get(label_values)
+        if counts is None:
+            counts = shard[label_values] = [0] * (len(self.buckets) + 3) # buckets, +Inf, sum, count
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        counts[-2] += value
+        counts[-1] += 1
+
+    @contextlib.contextmanager
+    def time(self, *label_values):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *label_values)
+
+    @staticmethod
+    def _add(total, value):
+        return list(value) if total is None else [a + b for a, b in zip(total, value)]
+
+    @staticmethod
+    def _subtract(value, previous):
+        return list(value) if previous is None else [a - b for a, b in zip(value, previous)]
+
+    def render(self) -> List[str]:
+        lines = []
+        for key, counts in sorted(self.collect().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == '+Inf' else f'le="{_format(float(bound))}"'
+                lines.append(f'{self.name}_bucket{_labels(self.label_names, key, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.label_names, key)} {_format(float(counts[-2]))}')
+            lines.append(f'{self.name}_count{_labels(self.label_names, key)} {counts[-1]}')
+        return lines
+
+
+class Gauge:
+    """Last set value per label set, or values returned by a callback at collection time."""
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, label_names: Tuple[str, ...] = (),
+                 callback: Callable[[], Dict[tuple, float]] = None):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.callback = callback
+        self._values: Dict[tuple, float] = {}
+
+    def set(self, value: float, *label_values):
+        self._values[label_values] = value
+
+    def collect(self) -> dict:
+        values = dict(self._values)
+        if self.callback is not None:
+            values.update(self.callback())
+        return values
+
+    def merge(self, values: dict):
+        self._values.update(values)
+
+    def render(self) -> List[str]:
+        return [f'{self.name}{_labels(self.label_names, key)} {_format(value)}'
+                for key, value in sorted(self.collect().items())]
+
+
+class MetricsRegistry:
+    """Metrics of the process, rendered in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._shipped: Dict[str, dict] = {} # values already sent to the parent process (see delta)
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, label_names=()) -> Counter:
+        return self.register(Counter(name, documentation, label_names))
+
+    def histogram(self, name: str, documentation: str, label_names=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, label_names, buckets))
+
+    def gauge(self, name: str, documentation: str, label_names=(), callback=None) -> Gauge:
+        return self.register(Gauge(name, documentation, label_names, callback))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            try:
+                samples = metric.render()
+            except Exception: # a failing callback must not break the whole page
+                continue
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(samples)
+        return '\n'.join(lines) + '\n'
+
+    def delta(self) -> Dict[str, dict]:
+        """Changes since the previous call (worker processes send them to the web process)"""
+        changes = {}
+        for name, metric in self._metrics.items():
+            if isinstance(metric, Gauge) and metric.callback is not None:
+                continue # computed in the process that serves /metrics
+            current = metric.collect()
+            if isinstance(metric, Gauge):
+                changed = {key: value for key, value in current.items()
+                           if self._shipped.get(name, {}).get(key) != value}
+            else:
+                previous = self._shipped.get(name, {})
+                changed = {key: metric._subtract(value, previous.get(key)) for key, value in current.items()
+                           if value != previous.get(key)}
+            if changed:
+                changes[name] = changed
+            self._shipped[name] = current
+        return changes
+
+    def merge(self, changes: Dict[str, dict]):
+        for name, values in changes.items():
+            metric = self._metrics.get(name)
+            if metric is not None:
+                metric.merge(values)
+
+
+registry = MetricsRegistry()
+
+# Metrics of the service ------------------------------------------------------------------------------------------------
+REQUESTS = registry.counter('http_requests_total', 'HTTP requests by endpoint and status code', ('endpoint', 'code'))
+REQUEST_SECONDS = registry.histogram('http_request_duration_seconds', 'Time to produce a response', ('endpoint',))
+ERRORS = registry.counter('http_errors_total', 'Error responses by ResponseMessages code', ('code',))
+STAGE_SECONDS = registry.histogram('translate_stage_seconds',
+                                   'Time of processing stages: json_parse, detect, tokenize, generate, decode',
+                                   ('stage',))
+TOKENS = registry.counter('translate_tokens_total', 'Tokens of model input and output', ('direction',))
+BATCHES = registry.counter('translate_batches_total', 'Translated batches and the generate calls of their length buckets',
+                           ('kind',))
+PADDING_TOKENS = registry.counter('translate_padding_tokens_total',
+                                  'Model input tokens: real, padded (with length buckets) and unbucketed_padded '
+                                  '(had every batch run as one generate call); efficiency = real / padded', ('kind',))
+MODEL_LOAD_SECONDS = registry.gauge('model_load_seconds', 'Load time of the last load of a model', ('model',))
+
+
+def stage(name: str):
+    """Context manager that measures a processing stage"""
+    return STAGE_SECONDS.time(name)
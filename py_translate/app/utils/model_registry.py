@@ -0,0 +1,200 @@
+import threading
+import time
+from typing import Dict, Optional
+
+from app.utils.engine import FP32, estimate_size_bytes
+from app.utils.metrics import MODEL_LOAD_SECONDS
+
+import logging
+
+logger = logging.getLogger(__name__) # getting root logger
+if not logging.getLogger().hasHandlers():
+    print("ERROR: Root logger had no handlers. Logging unavailable.")
+
+# Model states reported by ModelRegistry.status()
+NOT_LOADED = 'not_loaded'
+LOADING = 'loading'
+READY = 'ready'
+FAILED = 'failed'
+
+
+class ModelNotFoundError(Exception):
+    """Raised for a model name that was never registered."""
+    pass
+
+
+class LoadedModel:
+    """Tokenizer and model that stay resident together."""
+
+    def __init__(self, name: str, tokenizer, model, device: str, load_seconds: float, engine_mode: str = FP32):
+        from app.utils.engine import model_size_bytes
+
+        self.name = name
+        self.tokenizer = tokenizer
+        self.model = model
+        self.device = device
+        self.load_seconds = load_seconds
+        self.engine_mode = engine_mode
+        self.size_bytes = model_size_bytes(model)
+        self.last_used = time.monotonic()
+
+
+class _ModelEntry:
+    def __init__(self, name: str, source: str, languages: dict):
+        self.name = name
+        self.source = source # hub id or local directory with save_pretrained() files
+        self.languages = languages
+        self.state = NOT_LOADED
+        self.error = ''
+        self.loaded: Optional[LoadedModel] = None
+        self.size_bytes = 0 # size of the last load, the estimate for the next one
+        self.lock = threading.Lock()
+
+
+def load_seq2seq(source: str, cache_dir: str, engine_mode: str = FP32, compile_model: bool = False,
+                 weights_mmap: bool = False):
+    """
+    Default loader: transformers tokenizer + seq2seq model prepared for engine_mode on the best available device
+    (with weights_mmap the weights are mapped from a snapshot shared by all processes of the host).
+    Returns (tokenizer, model, device, effective engine mode).
+    """
+    import torch
+    from transformers import AutoTokenizer # heavy imports are deferred until first load
+    from app.utils.engine import load_model
+
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    tokenizer = AutoTokenizer.from_pretrained(source, cache_dir=cache_dir)
+    model, engine_mode = load_model(source, cache_dir, device, engine_mode, compile_model, weights_mmap)
+    return tokenizer, model, device, engine_mode
+
+
+class ModelRegistry:
+    """
+    Registry of translation models which are loaded on first use.
+
+    At most max_resident models (and not more than memory_budget_bytes of weights, 0 - no limit)
+    are kept in memory; the least recently used models are unloaded before a new one is loaded, by the
+    estimated size of the new model, and again after the load if it turned out to be larger.
+    All models are loaded in the same engine mode (fp32, int8, bf16; optionally with torch.compile),
+    with weights_mmap their weights are memory mapped and shared with the other processes of the host.
+    """
+
+    def __init__(self, cache_dir: str, default_model: str, max_resident: int = 1,
+                 memory_budget_bytes: int = 0, engine_mode: str = FP32, engine_compile: bool = False,
+                 weights_mmap: bool = False, loader=load_seq2seq):
+        self.cache_dir = cache_dir
+        self.default_model = default_model
+        self.max_resident = max(1, max_resident)
+        self.memory_budget_bytes = memory_budget_bytes
+        self.engine_mode = engine_mode
+        self.engine_compile = engine_compile
+        self.weights_mmap = weights_mmap
+        self.loader = loader
+
+        self._models: Dict[str, _ModelEntry] = {}
+        self._aliases: Dict[str, str] = {}
+        self._lock = threading.Lock() # protects residency bookkeeping
+
+    def register(self, name: str, source: str = None, languages: dict = None, aliases=()):
+        """Registers a model under name. source defaults to name (hub id); it may be a local directory."""
+        self._models[name] = _ModelEntry(name, source or name, languages or {})
+        for alias in aliases:
+            self._aliases[alias] = name
+
+    def resolve(self, name: str = None) -> str:
+        """Returns registered model name for name/alias (default model for empty name)."""
+        if not name:
+            return self.default_model
+        name = self._aliases.get(name, name)
+        if name not in self._models:
+            raise ModelNotFoundError(f"Unknown model: {name}")
+        return name
+
+    def languages(self, name: str = None) -> dict:
+        return self._models[self.resolve(name)].languages
+
+    def is_loaded(self, name: str = None) -> bool:
+        return self._models[self.resolve(name)].state == READY
+
+    def get(self, name: str = None) -> LoadedModel:
+        """Returns the resident model, loading it (and unloading others) if necessary."""
+        entry = self._models[self.resolve(name)]
+        loaded = entry.loaded
+        if loaded is not None:
+            loaded.last_used = time.monotonic()
+            return loaded
+
+        with entry.lock: # only one thread loads a model, the others wait for it
+            if entry.loaded is None:
+                entry.state, entry.error = LOADING, ''
+                logger.info(f"Loading model {entry.name} from {entry.source}")
+                self._make_room(entry.name, self._estimate_size(entry))
+                started = time.monotonic()
+                try:
+                    tokenizer, model, device, engine_mode = self.loader(
+                        entry.source, self.cache_dir, self.engine_mode, self.engine_compile, self.weights_mmap)
+                except Exception as e:
+                    entry.state, entry.error = FAILED, f"{type(e).__name__}: {e}"
+                    logger.error(f"Model {entry.name} failed to load: {entry.error}")
+                    raise
+                loaded = LoadedModel(entry.name, tokenizer, model, device, time.monotonic() - started, engine_mode)
+                entry.size_bytes = loaded.size_bytes
+                self._make_room(entry.name, loaded.size_bytes) # in case the estimate was short
+                entry.loaded, entry.state = loaded, READY
+                MODEL_LOAD_SECONDS.set(round(loaded.load_seconds, 3), entry.name)
+                logger.info(f"Model {entry.name} loaded in {loaded.load_seconds:.1f}s "
+                            f"({loaded.size_bytes / 2**20:.0f} MB, device {device.upper()}, engine {engine_mode})")
+            entry.loaded.last_used = time.monotonic()
+            return entry.loaded
+
+    def _estimate_size(self, entry: _ModelEntry) -> int:
+        if entry.size_bytes:
+            return entry.size_bytes
+        try:
+            return estimate_size_bytes(entry.source, self.cache_dir, self.engine_mode)
+        except OSError:
+            return 0
+
+    def _make_room(self, name: str, size_bytes: int):
+        with self._lock:
+            resident = sorted((entry for entry in self._models.values()
+                               if entry.loaded is not None and entry.name != name),
+                              key=lambda entry: entry.loaded.last_used)
+            total = sum(entry.loaded.size_bytes for entry in resident) + size_bytes
+            while resident and (len(resident) + 1 > self.max_resident
+                                or (self.memory_budget_bytes and total > self.memory_budget_bytes)):
+                entry = resident.pop(0)
+                total -= entry.loaded.size_bytes
+                self._unload(entry)
+
+    def _unload(self, entry: _ModelEntry):
+        logger.info(f"Unloading model {entry.name} (least recently used)")
+        entry.loaded, entry.state = None, NOT_LOADED # memory is released when running batches drop their references
+
+    def unload(self, name: str):
+        with self._lock:
+            entry = self._models[self.resolve(name)]
+            if entry.loaded is not None:
+                self._unload(entry)
+
+    def status(self) -> dict:
+        models = {}
+        for entry in self._models.values():
+            info = {"state": entry.state, "source": entry.source}
+            if entry.loaded is not None:
+                info.update({"device": entry.loaded.device,
+                             "engine_mode": entry.loaded.engine_mode,
+                             "load_seconds": round(entry.loaded.load_seconds, 3),
+                             "size_mb": round(entry.loaded.size_bytes / 2**20, 1)})
+            if entry.error:
+                info["error"] = entry.error
+            models[entry.name] = info
+        return {
+            "default_model": self.default_model,
+            "max_resident": self.max_resident,
+            "memory_budget_mb": round(self.memory_budget_bytes / 2**20, 1),
+            "engine_mode": self.engine_mode,
+            "engine_compile": self.engine_compile,
+            "weights_mmap": self.weights_mmap,
+            "models": models,
+        }
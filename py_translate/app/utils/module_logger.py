@@ -1,8 +1,16 @@
+import atexit
+import copy
 import logging
 import os
+import queue
 import sys
 import re
-from datetime import datetime
+import threading
+from datetime import datetime, timedelta
+
+_ANSI_RE = re.compile(r'\x1b\[[0-9;]*[mK]')
+_ERROR_RE = re.compile(r'\b(error|exception)\b', re.IGNORECASE)
+
 
 class StreamToLogger:
     def __init__(self, logger, log_level=logging.INFO, is_stderr=False):
@@ -12,47 +20,117 @@ class StreamToLogger:
         self.linebuf = ''
 
     def write(self, buf):
-        # Remove ANSI control characters (e.g. \x1b[A\x1b[A)
-        buf_cleaned = re.sub(r'\x1b\[[0-9;]*[mK]', '', buf).strip()
-        buf_cleaned = "\n".join(filter(bool, buf_cleaned.splitlines()))
-
-        if not buf_cleaned:
+        # Remove ANSI control characters (e.g. \x1b[A\x1b[A), regex runs only if there are any
+        if '\x1b' in buf:
+            buf = _ANSI_RE.sub('', buf)
+        lines = [line.rstrip() for line in buf.splitlines() if line.strip()]
+        if not lines:
             return  # Skipping empty lines
 
         # Log stderr as ERROR only if the message looks like an error
-        if self.is_stderr:
-            level = logging.ERROR if re.search(r'\b(error|exception)\b', buf_cleaned, re.IGNORECASE) else self.log_level
-        else:
-            level = self.log_level
+        level = self.log_level
+        if self.is_stderr and _ERROR_RE.search(buf):
+            level = logging.ERROR
 
-        for line in buf_cleaned.splitlines():
-            self.logger.log(level, line.rstrip())
+        for line in lines:
+            self.logger.log(level, line)
 
     def flush(self):
         pass
 
 class DateRotatingFileHandler(logging.FileHandler):
+    """
+    File handler writing to <module_name>_<YYYY-MM-DD>.log. The date is compared with a cached midnight
+    boundary, and the stream is flushed by the caller (AsyncLogWriter) after a batch, not after every record.
+    """
     def __init__(self, log_dir, module_name, log_level=logging.DEBUG):
         self.log_dir = log_dir
         self.module_name = module_name
         self.current_date = datetime.now().strftime('%Y-%m-%d')
+        self.next_rollover = self._next_midnight()
         log_filename = f'{self.module_name}_{self.current_date}.log'
         log_filepath = os.path.join(self.log_dir, log_filename)
-        super().__init__(log_filepath)
+        super().__init__(log_filepath, encoding='utf-8')
         self.setLevel(log_level)
         # This formatter is responsible for logs that are written to files.
         self.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(name)s - %(message)s'))
 
+    @staticmethod
+    def _next_midnight() -> float:
+        tomorrow = datetime.now().date() + timedelta(days=1)
+        return datetime.combine(tomorrow, datetime.min.time()).timestamp()
+
     def emit(self, record):
-        new_date = datetime.now().strftime('%Y-%m-%d')
-        if new_date != self.current_date:
-            self.current_date = new_date
+        if record.created >= self.next_rollover:
+            self.current_date = datetime.fromtimestamp(record.created).strftime('%Y-%m-%d')
+            self.next_rollover = self._next_midnight()
             log_filename = f'{self.module_name}_{self.current_date}.log'
             log_filepath = os.path.join(self.log_dir, log_filename)
-            self.stream.close()
+            if self.stream is not None:
+                self.stream.close()
             self.baseFilename = log_filepath
             self.stream = self._open()
-        super().emit(record)
+        try:
+            if self.stream is None:
+                self.stream = self._open()
+            self.stream.write(self.format(record) + self.terminator) # no flush per record
+        except Exception:
+            self.handleError(record)
+
+class AsyncQueueHandler(logging.Handler):
+    """Handler of the root logger: puts records into the queue of AsyncLogWriter and returns at once."""
+    def __init__(self, records: queue.SimpleQueue):
+        super().__init__()
+        self.records = records
+
+    def emit(self, record):
+        try:
+            # like QueueHandler.prepare: arguments are merged now, the writer thread would see them changed later
+            message = record.getMessage()
+            record = copy.copy(record) # other handlers of the record still get the original
+            record.msg, record.args = message, None
+            if record.exc_info and not record.exc_text:
+                record.exc_text = logging.Formatter().formatException(record.exc_info) # traceback can't wait
+            record.exc_info = None
+            self.records.put(record)
+        except Exception:
+            self.handleError(record)
+
+class AsyncLogWriter:
+    """Background thread that takes records from the queue in batches, writes them and flushes once per batch."""
+    def __init__(self, handlers, max_batch=512):
+        self.handlers = handlers
+        self.max_batch = max_batch
+        self.records = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def _run(self):
+        while True:
+            batch = [self.records.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self.records.get_nowait())
+                except queue.Empty:
+                    break
+            for record in batch:
+                if record is None:
+                    self._flush()
+                    return
+                for handler in self.handlers:
+                    if record.levelno >= handler.level:
+                        handler.handle(record)
+            self._flush()
+
+    def _flush(self):
+        for handler in self.handlers:
+            handler.flush()
+
+    def stop(self, timeout=5):
+        if self._thread.is_alive():
+            self.records.put(None) # everything queued before is written first
+            self._thread.join(timeout)
 
 class ModuleLogger:
     def __init__(self, module_name, log_dir='logs', log_level=logging.DEBUG):
@@ -60,6 +138,7 @@ class ModuleLogger:
         self.log_dir = log_dir
         self.log_level = log_level
         self.logger = logging.getLogger(self.module_name)
+        self.writer = None
         self._setup_logger()
 
     def _setup_logger(self):
@@ -81,9 +160,9 @@ class ModuleLogger:
             formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(name)s - %(message)s')
             console_handler.setFormatter(formatter)
 
-            # Adding handlers to root logger
-            root_logger.addHandler(file_handler)
-            root_logger.addHandler(console_handler)
+            # Request threads only enqueue records, file and console are written by one background thread
+            self.writer = AsyncLogWriter([file_handler, console_handler])
+            root_logger.addHandler(AsyncQueueHandler(self.writer.records))
 
         # Redirect stdout to INFO, stderr — filter errors
         sys.stdout = StreamToLogger(root_logger, logging.INFO, is_stderr=False)
@@ -1,4 +1,7 @@
 import json
+import random
+import reprlib
+from app.settings import LOG_BODY_MAX_CHARS, LOG_BODY_SAMPLE_RATE
 
 import logging
 
@@ -6,11 +9,31 @@ logger = logging.getLogger(__name__) # getting root logger
 if not logging.getLogger().hasHandlers():
     print("ERROR: Root logger had no handlers. Logging unavailable.")
 
+_value_repr = reprlib.Repr() # lists are shortened before they are converted to text
+_value_repr.maxlist = 10
+_value_repr.maxstring = max(LOG_BODY_MAX_CHARS, 10)
+_value_repr.maxother = max(LOG_BODY_MAX_CHARS, 10)
+
+def loggable_value(value) -> str:
+    """
+    Value of a request for logging: cut to LOG_BODY_MAX_CHARS symbols,
+    and only for a LOG_BODY_SAMPLE_RATE share of calls (None if it should not be logged).
+    """
+    if LOG_BODY_MAX_CHARS <= 0 or (LOG_BODY_SAMPLE_RATE < 1 and random.random() >= LOG_BODY_SAMPLE_RATE):
+        return None
+    text = value if isinstance(value, str) else _value_repr.repr(value)
+    if len(text) > LOG_BODY_MAX_CHARS:
+        text = f"{text[:LOG_BODY_MAX_CHARS]}... ({len(text)} symbols)"
+    return text
+
 def request_body_none_check( json_dict:dict, key_name:str):
     # value = json_dict[key_name]       - triggers error if there is no key_name
     value = json_dict.get(key_name)
 
-    logger.info(f"{key_name}: {value}")
+    if logger.isEnabledFor(logging.INFO):
+        logged = loggable_value(value)
+        if logged is not None:
+            logger.info(f"{key_name}: {logged}")
     error_string = ''
 
     if value is None:
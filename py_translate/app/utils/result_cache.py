@@ -0,0 +1,161 @@
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Tuple
+
+from app.utils.metrics import registry as metrics_registry
+
+import logging
+
+logger = logging.getLogger(__name__) # getting root logger
+if not logging.getLogger().hasHandlers():
+    print("ERROR: Root logger had no handlers. Logging unavailable.")
+
+_MISSING = object()
+
+# Caches created with a name are exported to /metrics; counters of worker processes are merged into the web process,
+# entries and bytes are those of the web process
+CACHE_LOOKUPS = metrics_registry.counter('cache_lookups_total', 'Cache lookups by cache and result (hit, miss)',
+                                         ('cache', 'result'))
+CACHE_REMOVALS = metrics_registry.counter('cache_removals_total',
+                                          'Entries removed from caches: evicted (LRU) or expired', ('cache', 'reason'))
+_named_caches: Dict[str, 'ResultCache'] = {}
+
+
+def _cache_entries() -> dict:
+    return {(name,): len(cache) for name, cache in list(_named_caches.items())}
+
+
+def _cache_bytes() -> dict:
+    return {(name,): cache.size_bytes() for name, cache in list(_named_caches.items())}
+
+
+metrics_registry.gauge('cache_entries', 'Entries in caches', ('cache',), callback=_cache_entries)
+metrics_registry.gauge('cache_bytes', 'Estimated size of caches in bytes', ('cache',), callback=_cache_bytes)
+
+
+def normalize_text(text: str) -> str:
+    """Normalization used for cache keys: unicode NFC form without surrounding whitespace."""
+    return unicodedata.normalize('NFC', text).strip()
+
+
+def _estimate_size(value: Any) -> int:
+    # Rough size of key/value in bytes: strings by their utf-8 length, containers by their items
+    if isinstance(value, str):
+        return len(value.encode('utf-8', errors='ignore'))
+    if isinstance(value, (tuple, list)):
+        return sum(_estimate_size(item) for item in value) + 8 * len(value)
+    return 8
+
+
+class ResultCache:
+    """
+    Thread-safe in-process LRU cache with optional TTL.
+
+    The cache is bounded both by number of entries and by estimated size in bytes (0 - no limit).
+    Least recently used entries are evicted first. Entries older than ttl_seconds are treated as missing.
+    A cache with a name exports its hits, misses, removals and size to /metrics.
+    """
+
+    def __init__(self, max_entries: int = 10000, max_bytes: int = 0, ttl_seconds: float = 0, name: str = ''):
+        self.name = name
+        if name:
+            _named_caches[name] = self
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+
+        self._lock = threading.Lock()
+        self._data = OrderedDict() # key -> (value, size, created)
+        self._bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        if not self.enabled:
+            return default
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                self._count(CACHE_LOOKUPS, 'miss')
+                return default
+            value, size, created = entry
+            if self.ttl_seconds and time.monotonic() - created > self.ttl_seconds:
+                self._remove(key, size)
+                self.expirations += 1
+                self.misses += 1
+                self._count(CACHE_REMOVALS, 'expired')
+                self._count(CACHE_LOOKUPS, 'miss')
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            self._count(CACHE_LOOKUPS, 'hit')
+            return value
+
+    def put(self, key: Hashable, value: Any):
+        if not self.enabled:
+            return
+        size = _estimate_size(key) + _estimate_size(value)
+        if self.max_bytes and size > self.max_bytes:
+            return # would evict everything else
+        with self._lock:
+            old = self._data.pop(key, _MISSING)
+            if old is not _MISSING:
+                self._bytes -= old[1]
+            self._data[key] = (value, size, time.monotonic())
+            self._bytes += size
+            while (len(self._data) > self.max_entries
+                   or (self.max_bytes and self._bytes > self.max_bytes)):
+                _, (_, evicted_size, _) = self._data.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+                self._count(CACHE_REMOVALS, 'evicted')
+
+    def _count(self, metric, kind: str):
+        if self.name:
+            metric.inc(self.name, kind)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def size_bytes(self) -> int:
+        return self._bytes
+
+    def _remove(self, key: Hashable, size: int):
+        del self._data[key]
+        self._bytes -= size
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+def translation_key(model: str, source_lang: str, target_lang: str, text: str) -> Tuple[str, str, str, str]:
+    """Cache key of a translation. Language detection results use empty source and target."""
+    return model, source_lang, target_lang, normalize_text(text)
@@ -0,0 +1,149 @@
+import re
+from typing import List, Tuple
+
+# Sentence segmentation for languages of SUPPORTED_LANGUAGES_M2M100 ----------------------------------------------------
+# Text is split into paragraphs (by line breaks) and paragraphs into sentences.
+# The whitespace between segments is kept aside, so translated segments can be joined back without changing the layout.
+
+# Terminal punctuation followed by whitespace (scripts that separate words with spaces)
+_SPACED_TERMINALS = '.!?…' + '؟' + '।॥' + '።'
+# Terminal punctuation that ends a sentence even without a following space
+_STANDALONE_TERMINALS = '。！？' + '။' + '។៕' + '۔' + '෴'
+# Closing quotes and brackets that belong to the sentence before the boundary
+_CLOSERS = '"\'»”’)]}」』）'
+
+_PARAGRAPH_RE = re.compile(r'(\s*\n\s*)')
+_SENTENCE_RE = re.compile(
+    rf'[{re.escape(_SPACED_TERMINALS)}]+[{re.escape(_CLOSERS)}]*(?P<spaced>\s+)'
+    rf'|[{re.escape(_STANDALONE_TERMINALS)}]+[{re.escape(_CLOSERS)}]*(?P<standalone>\s*)'
+)
+_LONG_BREAK_RE = re.compile(r'[,;:،、，；]\s+|\s+')
+
+# Short words which end with a dot but don't end a sentence
+_ABBREVIATIONS = {
+    'mr', 'mrs', 'ms', 'dr', 'prof', 'st', 'vs', 'etc', 'e.g', 'i.e', 'nr', 'jr', 'sr', 'inc', 'ltd',
+    'z.b', 'bzw', 'usw', 'ca', 'bd', 'т.е', 'т.д', 'г', 'гг', 'им', 'др',
+}
+
+# Scripts without sentence punctuation in common use: a single space separates phrases and clauses as well,
+# so only a wider gap (2+ spaces) is taken as a sentence boundary
+_SPACE_SEPARATED_SENTENCES = {'th', 'lo'}
+_WIDE_SPACE_RE = re.compile(r'(\s{2,})')
+
+# Languages which write sentences (and words) without spaces between them
+_UNSPACED_LANGUAGES = {'zh', 'ja', 'th', 'lo', 'my', 'km'}
+
+
+def _is_abbreviation(text: str, end: int) -> bool:
+    # end - position of the terminal dot
+    start = end
+    while start > 0 and not text[start - 1].isspace():
+        start -= 1
+    word = text[start:end].lower()
+    return len(word) == 1 or word in _ABBREVIATIONS
+
+
+def _split_sentences(paragraph: str) -> Tuple[List[str], List[str]]:
+    segments, separators = [], []
+    position = 0
+    for match in _SENTENCE_RE.finditer(paragraph):
+        if match.group('spaced') is not None:
+            boundary = match.start('spaced')
+            after = match.end()
+            # "Mr. Smith", "e.g. this", "3. item" or a lowercase continuation - not a sentence end
+            if after < len(paragraph) and paragraph[after].islower():
+                continue
+            if paragraph[match.start()] == '.' and _is_abbreviation(paragraph, match.start()):
+                continue
+        else:
+            boundary = match.start('standalone')
+            after = match.end()
+        if after >= len(paragraph) or boundary <= position:
+            continue
+        segments.append(paragraph[position:boundary])
+        separators.append(paragraph[boundary:after])
+        position = after
+    segments.append(paragraph[position:])
+    return segments, separators
+
+
+def _split_long(segment: str, max_length: int) -> Tuple[List[str], List[str]]:
+    # Splits a segment longer than max_length at the last comma/space before the limit
+    segments, separators = [], []
+    while len(segment) > max_length:
+        cut, cut_end = -1, -1
+        for match in _LONG_BREAK_RE.finditer(segment, 0, max_length):
+            if match.start() > 0:
+                cut, cut_end = match.start() + (1 if not match.group(0)[0].isspace() else 0), match.end()
+        if cut <= 0:
+            cut = cut_end = max_length # a single endless word
+        segments.append(segment[:cut])
+        separators.append(segment[cut:cut_end])
+        segment = segment[cut_end:]
+    segments.append(segment)
+    return segments, separators
+
+
+def split_text(text: str, lang: str = '', max_length: int = 0) -> Tuple[List[str], List[str]]:
+    """
+    Splits text into translatable segments (sentences, limited by max_length symbols if set).
+    Returns (segments, separators) where separators has one item more than segments and
+        text == separators[0] + segments[0] + separators[1] + ... + segments[-1] + separators[-1]
+    Whitespace-only text gives no segments at all.
+    """
+    segments, separators = [], []
+    pending = '' # whitespace collected before the next segment
+
+    for index, part in enumerate(_PARAGRAPH_RE.split(text)):
+        if index % 2 == 1 or not part.strip(): # paragraph separator or empty paragraph
+            pending += part
+            continue
+
+        stripped = part.strip()
+        pending += part[:len(part) - len(part.lstrip())]
+        trailing = part[len(part.rstrip()):]
+
+        if lang in _SPACE_SEPARATED_SENTENCES:
+            parts = _WIDE_SPACE_RE.split(stripped)
+            sentences, gaps = parts[::2], parts[1::2]
+        else:
+            sentences, gaps = _split_sentences(stripped)
+
+        for sentence_index, sentence in enumerate(sentences):
+            pieces, piece_gaps = _split_long(sentence, max_length) if max_length else ([sentence], [])
+            for piece_index, piece in enumerate(pieces):
+                if not piece.strip():
+                    pending += piece
+                else:
+                    separators.append(pending)
+                    segments.append(piece)
+                    pending = ''
+                if piece_index < len(piece_gaps):
+                    pending += piece_gaps[piece_index]
+            if sentence_index < len(gaps):
+                pending += gaps[sentence_index]
+        pending += trailing
+
+    separators.append(pending)
+    return segments, separators
+
+
+def target_separators(separators: List[str], target_lang: str = '') -> List[str]:
+    """
+    Separators of split_text for the translation into target_lang: sentences of zh, ja, th, ... follow each
+    other without a space, a translation into a language which puts spaces between words gets a single space there.
+    """
+    if not target_lang or target_lang in _UNSPACED_LANGUAGES:
+        return separators
+    inner = [separator or ' ' for separator in separators[1:-1]]
+    return separators[:1] + inner + separators[-1:] if len(separators) > 1 else separators
+
+
+def join_text(segments: List[str], separators: List[str], target_lang: str = '') -> str:
+    """Reverse operation for split_text (with translated segments), see target_separators for target_lang."""
+    separators = target_separators(separators, target_lang)
+    parts = [separators[0]]
+    for segment, separator in zip(segments, separators[1:]):
+        parts.append(segment)
+        parts.append(separator)
+    return ''.join(parts)
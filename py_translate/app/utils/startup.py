@@ -0,0 +1,97 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict
+
+from app.utils.metrics import registry as metrics_registry
+
+import logging
+
+logger = logging.getLogger(__name__) # getting root logger
+if not logging.getLogger().hasHandlers():
+    print("ERROR: Root logger had no handlers. Logging unavailable.")
+
+STARTUP_SECONDS = metrics_registry.gauge('startup_seconds', 'Duration of startup phases of the web process', ('phase',))
+
+# States of the warm-up reported by Startup.status()
+STARTING = 'starting'
+WARMING_UP = 'warming_up'
+READY = 'ready'
+FAILED = 'failed'
+
+
+def format_phases(phases: Dict[str, float]) -> str:
+    """{'model': 12.31, 'warm_up': 1.5} -> 'model 12.31s, warm_up 1.50s'"""
+    return ', '.join(f"{name} {seconds:.2f}s" for name, seconds in phases.items())
+
+
+class Startup:
+    """
+    Startup of the web process: time of every phase (imports, language detector, model load, warm-up
+    generations) and the warm-up itself, which runs in a background thread so that the server binds its
+    port at once and answers / while the heavy parts are loaded. Phases are measured from the import of
+    this module, which app.app imports right after the settings.
+    """
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.phases: Dict[str, float] = {}
+        self.state = STARTING
+        self.error = ''
+        self._thread = None
+
+    def _set(self, name: str, seconds: float):
+        self.phases[name] = seconds
+        STARTUP_SECONDS.set(round(seconds, 3), name)
+
+    def record(self, name: str):
+        """Records a phase which began with the process (e.g. imports)"""
+        self._set(name, time.monotonic() - self.started)
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._set(name, time.monotonic() - started)
+
+    def warm_up(self, steps: Callable[[], None]):
+        """Runs steps (which time their own phases) in a background thread"""
+        self.state = WARMING_UP
+        self._thread = threading.Thread(target=self._warm_up, args=(steps,), name='warm-up', daemon=True)
+        self._thread.start()
+
+    def _warm_up(self, steps: Callable[[], None]):
+        try:
+            steps()
+            self.state = READY
+        except Exception as e:
+            self.state, self.error = FAILED, f"{type(e).__name__}: {e}"
+            logger.error(f"Warm-up failed: {self.error}") # the models are loaded again on first use
+        self.finish()
+
+    def finish(self):
+        """Records the total time and logs the breakdown"""
+        if self.state == STARTING:
+            self.state = READY # nothing to warm up
+        self.record('total')
+        logger.info(f"Startup {self.state}: {format_phases(self.phases)}")
+
+    def wait(self, timeout: float = None) -> bool:
+        """Waits for the end of the warm-up, True if it is over"""
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return not self.is_warming_up()
+
+    def is_warming_up(self) -> bool:
+        return self.state in (STARTING, WARMING_UP)
+
+    def status(self) -> dict:
+        status = {"state": self.state, "phases": {name: round(seconds, 3) for name, seconds in self.phases.items()}}
+        if self.error:
+            status["error"] = self.error
+        return status
+
+
+startup = Startup()
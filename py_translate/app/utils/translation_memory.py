@@ -0,0 +1,250 @@
+import argparse
+import atexit
+import hashlib
+import json
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from typing import Iterable, Optional
+
+from app.utils.result_cache import normalize_text
+
+import logging
+
+logger = logging.getLogger(__name__) # getting root logger
+if not logging.getLogger().hasHandlers():
+    print("ERROR: Root logger had no handlers. Logging unavailable.")
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS memory (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    source TEXT NOT NULL,
+    target TEXT NOT NULL,
+    text TEXT NOT NULL,
+    translation TEXT NOT NULL,
+    created REAL NOT NULL,
+    used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS memory_used ON memory (used);
+'''
+
+
+def memory_key(model: str, source_lang: str, target_lang: str, text: str) -> str:
+    """Hash of (model, source, target, normalized text) used as primary key of the store."""
+    raw = '\x1f'.join((model, source_lang, target_lang, normalize_text(text)))
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+class TranslationMemory:
+    """
+    Persistent translation memory in a SQLite file shared by all server processes of the host.
+
+    The database runs in WAL mode, so readers of one process never block writers of another.
+    Reads are synchronous, writes are queued and committed in batches by a background thread.
+    When the store grows above max_entries, least recently used entries are removed (compaction).
+    """
+
+    def __init__(self, db_path: str, max_entries: int = 1000000, busy_timeout_ms: int = 5000,
+                 write_batch_size: int = 256):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.busy_timeout_ms = busy_timeout_ms
+        self.write_batch_size = write_batch_size
+
+        self._local = threading.local() # sqlite connections can't be shared between threads
+        self._queue = queue.Queue()
+        self._writer = None
+        self._writer_lock = threading.Lock()
+        self._writes_since_compaction = 0
+
+        db_dir = os.path.dirname(os.path.abspath(db_path))
+        if not os.path.exists(db_dir):
+            os.makedirs(db_dir, exist_ok=True)
+        with self._connection() as connection:
+            connection.executescript(_SCHEMA)
+        atexit.register(self.flush) # don't lose queued translations on shutdown
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.db_path, timeout=self.busy_timeout_ms / 1000)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(f'PRAGMA busy_timeout={int(self.busy_timeout_ms)}')
+            self._local.connection = connection
+        return connection
+
+    # ---------------------------------------------------------------------------------------------- read
+    def get(self, model: str, source_lang: str, target_lang: str, text: str) -> Optional[str]:
+        key = memory_key(model, source_lang, target_lang, text)
+        try:
+            row = self._connection().execute('SELECT translation FROM memory WHERE key = ?', (key,)).fetchone()
+        except sqlite3.Error as e:
+            logger.error(f"Translation memory read error: {e}")
+            return None
+        if row is None:
+            return None
+        self._queue.put(('touch', key)) # LRU bookkeeping is done by the writer
+        self._start_writer()
+        return row[0]
+
+    # --------------------------------------------------------------------------------------------- write
+    def put_async(self, model: str, source_lang: str, target_lang: str, text: str, translation: str):
+        """Queues a new translation. It becomes visible to all processes after the writer commits it."""
+        key = memory_key(model, source_lang, target_lang, text)
+        self._queue.put(('put', (key, model, source_lang, target_lang, normalize_text(text), translation)))
+        self._start_writer()
+
+    def put_many(self, rows: Iterable[dict]) -> int:
+        """Synchronously writes rows with keys model, source, target, text, translation. Returns count."""
+        now = time.time()
+        records = [
+            (memory_key(row['model'], row['source'], row['target'], row['text']),
+             row['model'], row['source'], row['target'], normalize_text(row['text']), row['translation'], now, now)
+            for row in rows
+        ]
+        connection = self._connection()
+        with connection:
+            connection.executemany('INSERT OR REPLACE INTO memory VALUES (?, ?, ?, ?, ?, ?, ?, ?)', records)
+        return len(records)
+
+    def _start_writer(self):
+        if self._writer is None or not self._writer.is_alive():
+            with self._writer_lock:
+                if self._writer is None or not self._writer.is_alive():
+                    self._writer = threading.Thread(target=self._write_loop, name='translation-memory-writer', daemon=True)
+                    self._writer.start()
+
+    def _write_loop(self):
+        while True:
+            operations = [self._queue.get()]
+            while len(operations) < self.write_batch_size:
+                try:
+                    operations.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write(operations)
+            except sqlite3.Error as e:
+                logger.error(f"Translation memory write error ({len(operations)} operations dropped): {e}")
+            finally:
+                for _ in operations:
+                    self._queue.task_done()
+
+    def _write(self, operations):
+        now = time.time()
+        puts = [record + (now, now) for kind, record in operations if kind == 'put']
+        touches = [(now, key) for kind, key in operations if kind == 'touch']
+        connection = self._connection()
+        with connection:
+            if puts:
+                connection.executemany('INSERT OR REPLACE INTO memory VALUES (?, ?, ?, ?, ?, ?, ?, ?)', puts)
+            if touches:
+                connection.executemany('UPDATE memory SET used = ? WHERE key = ?', touches)
+
+        self._writes_since_compaction += len(puts)
+        if self.max_entries and self._writes_since_compaction >= max(1, self.max_entries // 100):
+            self._writes_since_compaction = 0
+            self.compact()
+
+    # ----------------------------------------------------------------------------------------- maintenance
+    def compact(self, vacuum: bool = False) -> int:
+        """Removes least recently used entries above 90% of max_entries. Returns number of removed rows."""
+        connection = self._connection()
+        with connection:
+            count = connection.execute('SELECT COUNT(*) FROM memory').fetchone()[0]
+            if not self.max_entries or count <= self.max_entries:
+                removed = 0
+            else:
+                removed = count - int(self.max_entries * 0.9)
+                connection.execute('DELETE FROM memory WHERE key IN '
+                                   '(SELECT key FROM memory ORDER BY used LIMIT ?)', (removed,))
+                logger.info(f"Translation memory compacted: {removed} of {count} entries removed")
+        if vacuum:
+            connection.execute('VACUUM')
+        return removed
+
+    def flush(self, timeout: float = 10):
+        """Waits until all queued writes are committed."""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def stats(self) -> dict:
+        connection = self._connection()
+        count = connection.execute('SELECT COUNT(*) FROM memory').fetchone()[0]
+        return {
+            "path": self.db_path,
+            "entries": count,
+            "max_entries": self.max_entries,
+            "bytes": os.path.getsize(self.db_path) if os.path.exists(self.db_path) else 0,
+            "pending_writes": self._queue.qsize(),
+        }
+
+    def export_ndjson(self, file) -> int:
+        """Writes all entries as NDJSON lines {model, source, target, text, translation}. Returns count."""
+        count = 0
+        rows = self._connection().execute('SELECT model, source, target, text, translation FROM memory ORDER BY used DESC')
+        for model, source, target, text, translation in rows:
+            file.write(json.dumps({"model": model, "source": source, "target": target,
+                                   "text": text, "translation": translation}, ensure_ascii=False) + '\n')
+            count += 1
+        return count
+
+    def import_ndjson(self, file, batch_size: int = 10000) -> int:
+        """Reads NDJSON lines produced by export_ndjson. Returns count of imported entries."""
+        count, rows = 0, []
+        for line in file:
+            line = line.strip()
+            if not line:
+                continue
+            rows.append(json.loads(line))
+            if len(rows) >= batch_size:
+                count += self.put_many(rows)
+                rows = []
+        if rows:
+            count += self.put_many(rows)
+        return count
+
+
+# Warm-up CLI: python -m app.utils.translation_memory {stats|export|import|compact} [file] -------------------------------
+def main(argv=None):
+    from app.settings import TM_DB_PATH, TM_MAX_ENTRIES
+
+    parser = argparse.ArgumentParser(description='Translation memory maintenance')
+    parser.add_argument('command', choices=['stats', 'export', 'import', 'compact'])
+    parser.add_argument('file', nargs='?', help='NDJSON file for export/import (default: stdout/stdin)')
+    parser.add_argument('--db', default=TM_DB_PATH, help='path to the SQLite store')
+    parser.add_argument('--max-entries', type=int, default=TM_MAX_ENTRIES)
+    args = parser.parse_args(argv)
+
+    memory = TranslationMemory(args.db, max_entries=args.max_entries)
+
+    if args.command == 'stats':
+        logger.info(json.dumps(memory.stats()))
+    elif args.command == 'compact':
+        removed = memory.compact(vacuum=True)
+        logger.info(f"Compaction finished: {removed} entries removed")
+    elif args.command == 'export':
+        if args.file:
+            with open(args.file, 'w', encoding='utf-8') as file:
+                count = memory.export_ndjson(file)
+        else:
+            count = memory.export_ndjson(sys.__stdout__)
+        logger.info(f"Exported {count} entries from {args.db}")
+    elif args.command == 'import':
+        if args.file:
+            with open(args.file, 'r', encoding='utf-8') as file:
+                count = memory.import_ndjson(file)
+        else:
+            count = memory.import_ndjson(sys.__stdin__)
+        memory.compact()
+        logger.info(f"Imported {count} entries into {args.db}")
+
+
+if __name__ == '__main__':
+    main()
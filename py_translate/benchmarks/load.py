@@ -0,0 +1,199 @@
+"""Load generator: concurrent clients against the Flask test client or a real HTTP server."""
+import http.client
+import json
+import os
+import random
+import threading
+import time
+from typing import Dict, List
+
+# Sentences of different lengths and languages; a counter is appended to make every text unique
+CORPUS = [
+    ("en", "Hello, how are you?"),
+    ("en", "The weather is nice today, so we are going for a walk in the park."),
+    ("en", "Please restart the application to apply the new settings and check the logs for errors."),
+    ("de", "Die Sitzung wurde wegen technischer Probleme auf morgen verschoben."),
+    ("fr", "Le musée est fermé le lundi et ouvert tous les autres jours de la semaine."),
+    ("ru", "Мы благодарим вас за терпение и приносим извинения за задержку."),
+    ("es", "El informe anual se publicará a finales de marzo."),
+    ("uk", "Бібліотека працює щодня з дев'ятої ранку до шостої вечора."),
+    ("en", "Short text."),
+    ("en", " ".join(["This paragraph is long enough to be split into several sentences."] * 6)),
+]
+TARGETS = ["de", "fr", "es", "ru", "en"]
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def make_request(endpoint: str, rng: random.Random, number: int, unique: bool):
+    """(method, path, JSON body) of a request to endpoint"""
+    source, text = rng.choice(CORPUS)
+    if unique:
+        text = f"{text} #{number}"
+    if endpoint == '/translate':
+        target = rng.choice([lang for lang in TARGETS if lang != source])
+        return 'POST', endpoint, {"q": text, "target": target}
+    if endpoint == '/detect':
+        return 'POST', endpoint, {"q": text}
+    return 'GET', endpoint, None
+
+
+class TestClientTarget:
+    """Requests through the Flask test client (no network, server code only)"""
+    name = 'test_client'
+
+    def __init__(self, app):
+        self.app = app
+
+    def session(self):
+        client = self.app.test_client()
+
+        def send(method, path, body):
+            response = client.open(path, method=method, json=body)
+            return response.status_code, response.get_data()
+        return send
+
+    def get(self, path):
+        response = self.app.test_client().get(path)
+        return response.status_code, response.get_data(as_text=True)
+
+
+class HttpTarget:
+    """Requests to a real server (waitress) over keep-alive HTTP connections, one per client thread"""
+    name = 'http'
+
+    def __init__(self, host: str, port: int, headers: Dict[str, str] = None):
+        self.host = host
+        self.port = port
+        self.headers = headers or {}
+
+    def session(self):
+        connection = http.client.HTTPConnection(self.host, self.port, timeout=60)
+
+        def send(method, path, body):
+            payload = json.dumps(body).encode('utf-8') if body is not None else None
+            headers = dict(self.headers, **({"Content-Type": "application/json"} if payload else {}))
+            connection.request(method, path, body=payload, headers=headers)
+            response = connection.getresponse()
+            return response.status, response.read()
+        return send
+
+    def get(self, path):
+        status, data = self.session()('GET', path, None)
+        return status, data.decode('utf-8')
+
+
+class ResourceSampler:
+    """RSS and CPU usage of a process sampled over time (Linux /proc)"""
+
+    def __init__(self, pid: int = None, interval: float = 0.5):
+        self.pid = pid or os.getpid()
+        self.interval = interval
+        self.samples = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._ticks = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+
+    def _read(self):
+        try:
+            with open(f'/proc/{self.pid}/stat') as file:
+                fields = file.read().rsplit(')', 1)[1].split()
+            with open(f'/proc/{self.pid}/status') as file:
+                rss_kb = next(int(line.split()[1]) for line in file if line.startswith('VmRSS:'))
+        except (OSError, StopIteration, IndexError):
+            return None
+        return (int(fields[11]) + int(fields[12])) / self._ticks, rss_kb / 1024 # utime + stime, RSS MB
+
+    def _run(self):
+        started, previous = time.monotonic(), self._read()
+        while not self._stop.wait(self.interval):
+            current = self._read()
+            if current is None or previous is None:
+                continue
+            self.samples.append({"t": round(time.monotonic() - started, 2),
+                                 "rss_mb": round(current[1], 1),
+                                 "cpu_percent": round(100 * (current[0] - previous[0]) / self.interval, 1)})
+            previous = current
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def summary(self) -> dict:
+        if not self.samples:
+            return {}
+        return {"rss_mb_max": max(sample["rss_mb"] for sample in self.samples),
+                "cpu_percent_avg": round(sum(sample["cpu_percent"] for sample in self.samples) / len(self.samples), 1),
+                "timeline": self.samples}
+
+
+def _tokens_total(target) -> float:
+    # Input + output tokens counted by the service itself (see /metrics)
+    status, text = target.get('/metrics')
+    if status != 200:
+        return 0.0
+    return sum(float(line.rsplit(' ', 1)[1]) for line in text.splitlines()
+               if line.startswith('translate_tokens_total{'))
+
+
+def run_load(target, endpoint: str, concurrency: int, requests: int, seed: int = 1, unique: bool = True,
+             sampler_pid: int = None) -> dict:
+    """Sends `requests` requests from `concurrency` client threads, returns latency and throughput figures"""
+    latencies, errors = [], {}
+    counter = iter(range(requests))
+    lock = threading.Lock()
+
+    def client(index):
+        rng = random.Random(seed * 1000 + index)
+        send = target.session()
+        while True:
+            with lock:
+                number = next(counter, None)
+            if number is None:
+                return
+            method, path, body = make_request(endpoint, rng, number, unique)
+            started = time.perf_counter()
+            try:
+                status, _ = send(method, path, body)
+            except Exception as e:
+                status = type(e).__name__
+                send = target.session()
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                if status != 200:
+                    errors[str(status)] = errors.get(str(status), 0) + 1
+
+    tokens_before = _tokens_total(target)
+    threads = [threading.Thread(target=client, args=(index,)) for index in range(concurrency)]
+    with ResourceSampler(sampler_pid) as sampler:
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        duration = time.perf_counter() - started
+    tokens = _tokens_total(target) - tokens_before
+
+    return {
+        "target": target.name,
+        "endpoint": endpoint,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors,
+        "seconds": round(duration, 3),
+        "requests_per_second": round(len(latencies) / duration, 1) if duration else 0.0,
+        "tokens_per_second": round(tokens / duration, 1) if duration else 0.0,
+        "latency_ms": {name: round(1000 * percentile(latencies, fraction), 2)
+                       for name, fraction in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99))},
+        "resources": sampler.summary(),
+    }
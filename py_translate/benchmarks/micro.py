@@ -0,0 +1,55 @@
+"""Microbenchmarks of hot helpers: language detection, tokenization and response serialization."""
+import json
+import time
+from typing import Callable
+
+from benchmarks.load import CORPUS
+
+
+def measure(function: Callable[[], object], min_seconds: float = 0.5, min_calls: int = 10) -> dict:
+    """Calls function repeatedly for at least min_seconds and returns mean/best time per call in microseconds"""
+    function() # warm-up
+    timings = []
+    started = time.perf_counter()
+    while len(timings) < min_calls or time.perf_counter() - started < min_seconds:
+        call_started = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - call_started)
+    return {"calls": len(timings),
+            "mean_us": round(1e6 * sum(timings) / len(timings), 2),
+            "best_us": round(1e6 * min(timings), 2)}
+
+
+def run_micro(app, min_seconds: float = 0.5) -> dict:
+    from app.routes import translate
+    from app.routes.common.responses import ResponseMessages
+    from app.routes.common.translate_models import model_registry
+    from app.utils.inference import encode_many, encoded_cache
+
+    texts = [text for _, text in CORPUS]
+    long_text = ' '.join(texts * 20)
+    loaded = model_registry.get() # the stub (or the real model, if the benchmark runs with it)
+    results = {}
+
+    # Detection itself, without the result cache
+    results["detect_short"] = measure(lambda: translate.get_detector().detect(texts[0]), min_seconds)
+    results["detect_long"] = measure(lambda: translate.get_detector().detect(long_text), min_seconds)
+    results["detect_batch_10"] = measure(lambda: translate.get_detector().detect_many(texts), min_seconds)
+
+    # Tokenization as the service does it: one tokenizer call for the texts missing in the token ids cache
+    items = [(text, 'en') for text in texts]
+
+    def encode_cold():
+        encoded_cache.clear()
+        return encode_many(loaded, items)
+
+    results["tokenize_batch_10_cold"] = measure(encode_cold, min_seconds)
+    results["tokenize_batch_10_cached"] = measure(lambda: encode_many(loaded, items), min_seconds)
+
+    with app.test_request_context():
+        results["error_response_400"] = measure(lambda: ResponseMessages.error_400("Unsupported language pair"),
+                                                min_seconds)
+        body = {"data": {"translations": [{"translatedText": text, "detectedSourceLanguage": "en"}
+                                          for text in texts]}}
+        results["translations_json"] = measure(lambda: json.dumps(body, ensure_ascii=False), min_seconds)
+    return results
@@ -0,0 +1,162 @@
+"""
+Benchmark of the translation service with the stub model (runs offline).
+
+    python -m benchmarks.run                              # test client + waitress, compare with baseline
+    python -m benchmarks.run --target http --concurrency 1,16,64 --requests 2000
+    python -m benchmarks.run --save-baseline              # accept current results as the new baseline
+
+Results are written as JSON (--output); numbers that are worse than the baseline by more than
+--tolerance are listed as regressions and the exit code is 1.
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from benchmarks.load import HttpTarget, TestClientTarget, run_load
+from benchmarks.micro import run_micro
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATH = os.path.join(BENCHMARKS_DIR, 'baseline.json')
+
+
+def _write(text: str):
+    sys.__stdout__.write(text + '\n') # sys.stdout is redirected to the log by the service
+    sys.__stdout__.flush()
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _start_server(port: int, args) -> subprocess.Popen:
+    command = [sys.executable, '-m', 'benchmarks.stub_server', '--port', str(port), '--threads', str(args.threads),
+               '--base-ms', str(args.base_ms), '--token-ms', str(args.token_ms)]
+    server = subprocess.Popen(command, cwd=os.path.dirname(BENCHMARKS_DIR),
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    target = HttpTarget('127.0.0.1', port)
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        try:
+            if target.get('/')[0] == 200:
+                return server
+        except OSError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError("Benchmark server did not start")
+
+
+def _key(result: dict) -> str:
+    return f"{result['target']} {result['endpoint']} c={result['concurrency']}"
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Regressions: lower throughput, higher p95 latency or slower microbenchmarks than the baseline"""
+    regressions = []
+    old_load = {_key(result): result for result in baseline.get("load", [])}
+    for result in results.get("load", []):
+        old = old_load.get(_key(result))
+        if old is None:
+            continue
+        if result["requests_per_second"] < old["requests_per_second"] * (1 - tolerance):
+            regressions.append(f"{_key(result)}: {result['requests_per_second']} req/s "
+                               f"(baseline {old['requests_per_second']})")
+        if result["latency_ms"]["p95"] > old["latency_ms"]["p95"] * (1 + tolerance):
+            regressions.append(f"{_key(result)}: p95 {result['latency_ms']['p95']} ms "
+                               f"(baseline {old['latency_ms']['p95']})")
+    for name, result in results.get("micro", {}).items():
+        old = baseline.get("micro", {}).get(name)
+        if old is not None and result["mean_us"] > old["mean_us"] * (1 + tolerance):
+            regressions.append(f"micro {name}: {result['mean_us']} us (baseline {old['mean_us']})")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the translation service with the stub model')
+    parser.add_argument('--target', choices=['test_client', 'http', 'both'], default='both')
+    parser.add_argument('--endpoints', default='/translate,/detect,/languages')
+    parser.add_argument('--concurrency', default='1,8,32', help='comma separated numbers of client threads')
+    parser.add_argument('--requests', type=int, default=300, help='requests per endpoint and concurrency')
+    parser.add_argument('--threads', type=int, default=8, help='waitress worker threads')
+    parser.add_argument('--base-ms', type=float, default=5, help='stub cost of a generate call')
+    parser.add_argument('--token-ms', type=float, default=0.2, help='stub cost of a generated token of a row')
+    parser.add_argument('--repeat-texts', action='store_true', help='reuse texts (measures the result cache)')
+    parser.add_argument('--no-micro', action='store_true', help='skip microbenchmarks')
+    parser.add_argument('--output', help='file for the JSON results')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed share of degradation')
+    args = parser.parse_args(argv)
+
+    from benchmarks.stub_model import install
+    install(base_ms=args.base_ms, token_ms=args.token_ms) # before app.app starts the warm-up
+    from app.app import app
+    from app.utils.startup import startup
+    startup.wait() # steady state is measured, not the warm-up
+
+    endpoints = [endpoint.strip() for endpoint in args.endpoints.split(',') if endpoint.strip()]
+    levels = [int(level) for level in args.concurrency.split(',')]
+    results = {"settings": {key: value for key, value in vars(args).items()
+                            if key in ('requests', 'threads', 'base_ms', 'token_ms', 'repeat_texts')},
+               "load": []}
+
+    targets = []
+    if args.target in ('test_client', 'both'):
+        targets.append((TestClientTarget(app), None))
+    server = None
+    if args.target in ('http', 'both'):
+        port = _free_port()
+        server = _start_server(port, args)
+        targets.append((HttpTarget('127.0.0.1', port), server.pid))
+
+    try:
+        for target, pid in targets:
+            for endpoint in endpoints:
+                for concurrency in levels:
+                    result = run_load(target, endpoint, concurrency, args.requests,
+                                      unique=not args.repeat_texts, sampler_pid=pid)
+                    results["load"].append(result)
+                    _write(f"{_key(result):40} {result['requests_per_second']:>9} req/s "
+                           f"{result['tokens_per_second']:>10} tok/s  p50 {result['latency_ms']['p50']:>8} ms  "
+                           f"p95 {result['latency_ms']['p95']:>8} ms  p99 {result['latency_ms']['p99']:>8} ms"
+                           f"{'  errors ' + json.dumps(result['errors']) if result['errors'] else ''}")
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(10)
+
+    if not args.no_micro:
+        results["micro"] = run_micro(app)
+        for name, result in results["micro"].items():
+            _write(f"micro {name:30} {result['mean_us']:>12} us (best {result['best_us']} us)")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+
+    if args.save_baseline:
+        baseline = dict(results, load=[{key: value for key, value in result.items() if key != 'resources'}
+                                       for result in results["load"]])
+        with open(args.baseline, 'w', encoding='utf-8') as file:
+            json.dump(baseline, file, indent=2)
+        _write(f"Baseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        _write("No baseline to compare with (use --save-baseline)")
+        return 0
+    with open(args.baseline, 'r', encoding='utf-8') as file:
+        regressions = compare(results, json.load(file), args.tolerance)
+    for regression in regressions:
+        _write(f"REGRESSION {regression}")
+    _write(f"{len(regressions)} regression(s) against {args.baseline}")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,134 @@
+"""
+Deterministic stand-in for facebook/m2m100_418M, so benchmarks run offline (e.g. in CI).
+
+The "translation" is the source text itself (word by word), generation sleeps for a fixed time per
+batch plus a time per generated token of every row, so batching, padding and queueing behave like
+with the real model while the results stay reproducible.
+"""
+import threading
+import time
+from types import SimpleNamespace
+
+import torch
+
+BOS, PAD, EOS, UNK = 0, 1, 2, 3
+_FIRST_WORD_ID = 1000
+
+
+class StubTokenizer:
+    """Word level tokenizer with the parts of the M2M100 tokenizer interface that the service uses."""
+
+    def __init__(self, languages):
+        self.lang_code_to_id = {lang: 4 + index for index, lang in enumerate(sorted(languages))}
+        self.pad_token_id = PAD
+        self.eos_token_id = EOS
+        self.src_lang = 'en'
+        self._ids = {}
+        self._words = {}
+        self._lock = threading.Lock()
+
+    def get_lang_id(self, lang):
+        return self.lang_code_to_id[lang]
+
+    def _word_id(self, word):
+        word_id = self._ids.get(word)
+        if word_id is None:
+            with self._lock:
+                word_id = self._ids.setdefault(word, _FIRST_WORD_ID + len(self._ids))
+                self._words[word_id] = word
+        return word_id
+
+    def __call__(self, text, add_special_tokens=True, **kwargs):
+        if isinstance(text, list):
+            return {"input_ids": [self(item, add_special_tokens)["input_ids"] for item in text]}
+        ids = [self._word_id(word) for word in text.split()]
+        if add_special_tokens:
+            ids = [self.lang_code_to_id[self.src_lang]] + ids + [EOS]
+        return {"input_ids": ids}
+
+    def pad(self, encoded, padding=True, return_tensors="pt"):
+        rows = encoded["input_ids"]
+        width = max(len(row) for row in rows)
+        return {
+            "input_ids": torch.tensor([row + [PAD] * (width - len(row)) for row in rows]),
+            "attention_mask": torch.tensor([[1] * len(row) + [0] * (width - len(row)) for row in rows]),
+        }
+
+    def decode(self, ids, skip_special_tokens=True, **kwargs):
+        if isinstance(ids, torch.Tensor):
+            ids = ids.tolist()
+        return ' '.join(self._words[token] for token in ids if token >= _FIRST_WORD_ID)
+
+    def batch_decode(self, sequences, skip_special_tokens=True, **kwargs):
+        return [self.decode(sequence, skip_special_tokens) for sequence in sequences]
+
+
+class StubModel(torch.nn.Module):
+    """Copies source words to the output; costs base_ms per call plus token_ms per generated token and row."""
+
+    def __init__(self, base_ms: float, token_ms: float):
+        super().__init__()
+        self.weight = torch.nn.Parameter(torch.zeros(1)) # gives the model a size and a device
+        self.config = SimpleNamespace(decoder_start_token_id=EOS)
+        self.base_ms = base_ms
+        self.token_ms = token_ms
+
+    @property
+    def device(self):
+        return self.weight.device
+
+    def get_encoder(self):
+        # "Hidden states" are the input ids themselves, so decoding from encoder_outputs copies the source
+        return lambda input_ids=None, attention_mask=None: SimpleNamespace(last_hidden_state=input_ids.unsqueeze(-1))
+
+    def generate(self, input_ids=None, attention_mask=None, forced_bos_token_id=None, max_new_tokens=20,
+                 streamer=None, stopping_criteria=None, encoder_outputs=None, decoder_input_ids=None, **kwargs):
+        if encoder_outputs is not None: # fan-out: every row has its own target language token
+            input_ids = encoder_outputs.last_hidden_state[..., 0]
+            lang_ids = decoder_input_ids[:, 1].tolist()
+        else:
+            lang_ids = [forced_bos_token_id] * len(input_ids)
+        rows = []
+        for row, lang_id in zip(input_ids.tolist(), lang_ids):
+            words = [token for token in row if token >= _FIRST_WORD_ID][:max(0, max_new_tokens - 2)]
+            rows.append([EOS, lang_id] + words + [EOS])
+        width = max(len(row) for row in rows)
+
+        if streamer is not None:
+            streamer.put(torch.tensor([[EOS]])) # decoder start is the "prompt" of the streamer
+            for token in rows[0][1:]:
+                time.sleep(self.token_ms / 1000)
+                streamer.put(torch.tensor([token]))
+                if stopping_criteria is not None and any(bool(criteria(input_ids, None).all())
+                                                         for criteria in stopping_criteria):
+                    break
+            streamer.end()
+        else:
+            time.sleep((self.base_ms + self.token_ms * width * len(rows)) / 1000)
+        return torch.tensor([row + [PAD] * (width - len(row)) for row in rows])
+
+
+class StubLoader:
+    """Loader for ModelRegistry (see load_seq2seq) that returns the stub model"""
+
+    def __init__(self, languages, base_ms: float = 5, token_ms: float = 0.2, load_seconds: float = 0):
+        self.languages = languages
+        self.base_ms = base_ms
+        self.token_ms = token_ms
+        self.load_seconds = load_seconds
+
+    def __call__(self, source, cache_dir, engine_mode='fp32', compile_model=False, weights_mmap=False):
+        time.sleep(self.load_seconds)
+        return StubTokenizer(self.languages), StubModel(self.base_ms, self.token_ms).eval(), 'cpu', engine_mode
+
+
+def install(base_ms: float = 5, token_ms: float = 0.2, load_seconds: float = 0):
+    """Replaces the model loader of the service with the stub. Must run before the first translation."""
+    from app.routes.common import translate_models
+    from app.routes import translate
+
+    if translate_models.inference_pool is not None:
+        raise RuntimeError("The stub model runs inside the web process only: set inference_workers = 0")
+    languages = set().union(*translate_models.SUPPORTED_LANGUAGES.values())
+    translate_models.model_registry.loader = StubLoader(languages, base_ms, token_ms, load_seconds)
+    translate._memory = None # stub output must never reach the persistent translation memory
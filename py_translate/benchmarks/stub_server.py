@@ -0,0 +1,27 @@
+"""Waitress server of the service with the stub model: python -m benchmarks.stub_server --port 5099"""
+import argparse
+
+from benchmarks.stub_model import install
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve the translation service with the stub model')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5099)
+    parser.add_argument('--threads', type=int, default=8, help='waitress worker threads')
+    parser.add_argument('--base-ms', type=float, default=5, help='stub cost of a generate call')
+    parser.add_argument('--token-ms', type=float, default=0.2, help='stub cost of a generated token of a row')
+    args = parser.parse_args(argv)
+
+    from waitress import serve
+
+    install(base_ms=args.base_ms, token_ms=args.token_ms) # before app.app starts the warm-up
+    from app.app import app
+    from app.utils.startup import startup
+    startup.wait()
+    serve(app, host=args.host, port=args.port, threads=args.threads,
+          channel_request_lookahead=1) # lets requests notice disconnected clients
+
+
+if __name__ == '__main__':
+    main()
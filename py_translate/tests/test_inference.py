@@ -0,0 +1,82 @@
+import unittest
+
+import torch
+
+from benchmarks.stub_model import StubModel, StubTokenizer, EOS, PAD
+from app.utils.decoding_policy import DecodingPlan, DeadlineExceededError
+from app.utils.inference import translate_batch, decoding_policy, PaddingStats
+from app.utils.model_registry import LoadedModel
+
+
+class _TimeLimitedModel(StubModel):
+    """
+    Stub whose output is the source words repeated `repeat` times (up to max_new_tokens, like a model that
+    runs into its length limit) and which, like generate(max_time=...), stops after cut_tokens text tokens
+    when a time limit is given.
+    """
+
+    def __init__(self, repeat: int = 1, cut_tokens: int = None):
+        super().__init__(0, 0)
+        self.repeat = repeat
+        self.cut_tokens = cut_tokens
+
+    def generate(self, input_ids=None, attention_mask=None, forced_bos_token_id=None, max_new_tokens=20,
+                 encoder_outputs=None, decoder_input_ids=None, max_time=None, **kwargs):
+        if encoder_outputs is not None: # decoder start and target language are given
+            input_ids = encoder_outputs.last_hidden_state[..., 0]
+            lang_ids = decoder_input_ids[:, 1].tolist()
+            room = max_new_tokens
+        else: # the target language is the first generated token
+            lang_ids = [forced_bos_token_id] * len(input_ids)
+            room = max_new_tokens - 1
+        if max_time is not None and self.cut_tokens is not None:
+            room = min(room, self.cut_tokens)
+        rows = []
+        for row, lang_id in zip(input_ids.tolist(), lang_ids):
+            words = [token for token in row if token >= 1000] * self.repeat
+            rows.append([EOS, lang_id] + (words + [EOS])[:room])
+        width = max(len(row) for row in rows)
+        return torch.tensor([row + [PAD] * (width - len(row)) for row in rows])
+
+
+_tokenizer = StubTokenizer(['de', 'en', 'fr']) # one for all tests: token ids are cached by model name and text
+
+
+def _loaded(model) -> LoadedModel:
+    return LoadedModel('stub', _tokenizer, model.eval(), 'cpu', 0.0)
+
+
+_SHORT = ("Hi", 'en')
+_LONG = (' '.join(f"word{index}" for index in range(12)), 'en')
+
+
+class TranslateBatchDeadlineTest(unittest.TestCase):
+
+    def test_row_at_token_limit_is_not_cut_off(self):
+        loaded = _loaded(_TimeLimitedModel(repeat=10)) # every row runs into max_new_tokens without eos
+        plan = DecodingPlan(1, max_time=60.0)
+        for target in ('de', ('de', 'fr')):
+            results = translate_batch(loaded, target, [_SHORT, _LONG], PaddingStats(), plan)
+            for result in results:
+                self.assertNotIsInstance(result, Exception, target)
+
+    def test_only_cut_off_rows_fail(self):
+        loaded = _loaded(_TimeLimitedModel(cut_tokens=3))
+        plan = DecodingPlan(1, max_time=1.0)
+        for target in ('de', ('de', 'fr')):
+            short, long = translate_batch(loaded, target, [_SHORT, _LONG], PaddingStats(), plan)
+            self.assertEqual(short, 'Hi' if target == 'de' else ['Hi', 'Hi'])
+            self.assertIsInstance(long, DeadlineExceededError)
+
+    def test_row_without_deadline_is_not_cut_off(self):
+        # a deadline row and a no-deadline row in one batch: the batch gets no time limit
+        plan = decoding_policy.plan([0.5, None], 0.0, len(_LONG[0]))
+        self.assertIsNone(plan.max_time)
+        loaded = _loaded(_TimeLimitedModel(cut_tokens=3))
+        short, long = translate_batch(loaded, 'de', [_SHORT, _LONG], PaddingStats(), plan)
+        self.assertEqual(short, 'Hi')
+        self.assertEqual(long, _LONG[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
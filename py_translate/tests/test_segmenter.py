@@ -0,0 +1,21 @@
+import unittest
+
+from app.utils.segmenter import split_text, join_text
+
+
+class JoinTextTest(unittest.TestCase):
+
+    def test_unspaced_source_gets_spaces_in_spaced_target(self):
+        segments, separators = split_text('你好。你好吗？', 'zh')
+        self.assertEqual(join_text(['Hello.', 'How are you?'], separators, 'en'), 'Hello. How are you?')
+        self.assertEqual(join_text(['こんにちは。', 'お元気ですか？'], separators, 'ja'), 'こんにちは。お元気ですか？')
+
+    def test_source_layout_is_kept(self):
+        text = ' First one. Second one.\n\nThird one. '
+        segments, separators = split_text(text, 'en')
+        self.assertEqual(join_text(segments, separators, 'de'), text)
+        self.assertEqual(join_text(segments, separators), text)
+
+
+if __name__ == '__main__':
+    unittest.main()